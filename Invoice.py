@@ -4,25 +4,54 @@ from tkinter import StringVar
 from tkinter.ttk import Combobox
 import re
 import os
-import json
+import queue
+import time
 from decimal import Decimal, InvalidOperation
-from reportlab.lib.pagesizes import letter, landscape
-from reportlab.pdfgen import canvas # type: ignore
-from reportlab.lib.utils import ImageReader
-from reportlab.platypus import Table, TableStyle
-from reportlab.lib import colors
+import threading
 import traceback
+from invoice_core import InvoiceRenderer, warm_up
+from invoice_descriptions import DescriptionIndex
+from invoice_items import LineItem, LineItems
+from invoice_totals import format_cents
+from invoice_parser import TxtInvoiceReader, format_errors
+from invoice_preview import HEADER_LINES, InvoicePreview, item_cells
+from invoice_store import IMPORT_PATTERN, PAGE_SIZE, InvoiceStore
+
+# edits closer together than this are shown in one preview refresh
+PREVIEW_DELAY_MS = 150
+# past this many row edits one full redraw of the preview is cheaper than replaying them
+PREVIEW_MAX_OPS = 200
+# pause in typing before the description dropdown is re-filtered
+SUGGEST_DELAY_MS = 100
+# how often the UI checks a running export for progress
+EXPORT_POLL_MS = 100
+
+
+# the desktop layout: the shared engine with a narrower Total column; invoices are
+# exported again after each edit, so unchanged pages come from the page cache
+PDF_RENDERER = InvoiceRenderer(col_widths=(380, 100, 100, 100), watermark_path="watermark.png", cache_pages=True)
+
+
+class ExportCancelled(Exception):
+    pass
+
 
 class InvoiceApp(tk.Tk):
     def __init__(self):
         super().__init__()
         self.title("Custom Kitchen Cabinets")
         self.geometry("900x700")
-        self.items = []
+        self.items = LineItems()
         self.selected_item_index = None
+        self.preview = InvoicePreview()
+        self._preview_job = None
+        self._preview_shown = False
+        self._export = None
 
         self.default_invoice_dir = r"C:\\Invoices"
         os.makedirs(self.default_invoice_dir, exist_ok=True)
+        self.store = InvoiceStore(os.path.join(self.default_invoice_dir, "invoices.sqlite3"))
+        self.invoice_id = None  # store id of the invoice being edited, None until saved
 
         tk.Label(self, text="Customer Name:").grid(row=0, column=0, sticky="e")
         self.customer_name = tk.Entry(self, width=40)
@@ -60,7 +89,7 @@ class InvoiceApp(tk.Tk):
         self.tax_rate_var = StringVar(value="0.0")
         self.tax_rate_entry = tk.Entry(self, textvariable=self.tax_rate_var, width=10)
         self.tax_rate_entry.grid(row=4, column=1, sticky="w")
-        self.tax_rate_var.trace_add("write", lambda *args: self.generate_invoice())
+        self.tax_rate_var.trace_add("write", lambda *args: self.schedule_preview())
 
         #tk.Button(self, text="Generate Invoice", command=self.generate_invoice).grid(row=4, column=0, pady=15, columnspan=9)
 
@@ -70,37 +99,64 @@ class InvoiceApp(tk.Tk):
         tk.Button(self, text="Export as PDF", command=self.export_as_pdf).grid(row=6, column=1, pady=10, sticky="e")
         tk.Button(self, text="Save For Later", command=self.save_invoice_data).grid(row=6, column=4, pady=10, sticky="w")
 
+        self.export_progress = ttk.Progressbar(self, mode="determinate", length=200)
+        self.export_progress.grid(row=7, column=0, columnspan=2, padx=10, sticky="ew")
+        self.cancel_export_button = tk.Button(self, text="Cancel Export", command=self.cancel_export, state="disabled")
+        self.cancel_export_button.grid(row=7, column=2, padx=5)
+        self.export_status = StringVar()
+        tk.Label(self, textvariable=self.export_status).grid(row=7, column=3, columnspan=6, sticky="w")
+
         #for history
         self.desc_var = StringVar()
         self.item_desc = Combobox(self, textvariable=self.desc_var, width=20)
         self.item_desc.grid(row=2, column=1, sticky="w")
-        self.item_desc['values'] = []  # This will hold history
-        self.desc_history = set()
+        self.item_desc['values'] = []  # filled from the description history as the user types
+        self.item_desc.bind("<KeyRelease>", self.on_desc_typed)
+        self.item_desc.bind("<<ComboboxSelected>>", lambda e: self.suggest_price())
+        self.item_desc.bind("<FocusOut>", lambda e: self.suggest_price())
+        self._suggest_job = None
         self.history_file = os.path.join(self.default_invoice_dir, "desc_history.json")
         self.load_description_history()
         self.protocol("WM_DELETE_WINDOW", self.on_close)
+        # ReportLab is only needed for export; load it once the window is up
+        self.after_idle(lambda: threading.Thread(target=warm_up, args=("watermark.png",), daemon=True).start())
+        self.after_idle(self.import_legacy_invoices)
 
     def load_description_history(self):
         try:
-            if os.path.exists(self.history_file):
-                with open(self.history_file, "r") as f:
-                    history = json.load(f)
-                    self.desc_history = set(history)
-                    self.item_desc['values'] = sorted(self.desc_history)
+            self.descriptions = DescriptionIndex(self.store.path)
+            # one-off: earlier versions kept the history in desc_history.json
+            if not len(self.descriptions) and os.path.exists(self.history_file):
+                self.descriptions.import_json(self.history_file)
+            self.item_desc['values'] = self.descriptions.suggest()
         except Exception as e:
             traceback.print_exc()
             messagebox.showwarning("History Load Error", f"Could not load description history.\n{e}")
+            self.descriptions = DescriptionIndex(":memory:")
 
-    def save_description_history(self):
-        try:
-            with open(self.history_file, "w") as f:
-                json.dump(sorted(self.desc_history), f, indent=2)
-        except Exception as e:
-            traceback.print_exc()
-            messagebox.showwarning("History Save Error", f"Could not save description history.\n{e}")
+    def on_desc_typed(self, event):
+        if event.keysym in ("Up", "Down", "Return", "Escape", "Tab"):
+            return
+        if self._suggest_job is not None:
+            self.after_cancel(self._suggest_job)
+        self._suggest_job = self.after(SUGGEST_DELAY_MS, self.update_suggestions)
+
+    def update_suggestions(self):
+        self._suggest_job = None
+        self.item_desc['values'] = self.descriptions.suggest(self.desc_var.get())
+
+    def suggest_price(self):
+        # prefill the unit price last used with this description, unless one was typed
+        price = self.descriptions.last_price(self.desc_var.get())
+        if price is not None and not self.item_price.get():
+            self.item_price.insert(0, f"{price:.2f}")
 
     def on_close(self):
-        self.save_description_history()
+        if self._export is not None:
+            if not messagebox.askyesno("Export in Progress", "A PDF export is still running. Quit anyway?"):
+                return
+            self._export.cancel()
+        self.descriptions.close()
         self.destroy()
 
     @staticmethod
@@ -111,11 +167,6 @@ class InvoiceApp(tk.Tk):
         name = self.sanitize_filename(self.customer_name.get())
         address = self.sanitize_filename(self.customer_address.get())
         return f"{name}_{address}_Invoice.{ext}"
-
-    def get_inprogress_filename(self, ext="json"):
-        name = self.sanitize_filename(self.customer_name.get())
-        address = self.sanitize_filename(self.customer_address.get())
-        return f"InProgress_{name}_{address}_Invoice.{ext}"
     
     def load_dummy_data(self):
         file_path = filedialog.askopenfilename(
@@ -124,38 +175,26 @@ class InvoiceApp(tk.Tk):
         if not file_path:
             return
         try:
-            with open(file_path, "r") as f:
-                lines = f.readlines()
             self.items.clear()
+            self.invoice_id = None
             self.tree.delete(*self.tree.get_children())
-
-            items_section = False
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                if line.startswith("Customer Name:"):
-                    self.customer_name.delete(0, tk.END)
-                    self.customer_name.insert(0, line.replace("Customer Name:", "").strip())
-                elif line.startswith("Customer Address:"):
-                    self.customer_address.delete(0, tk.END)
-                    self.customer_address.insert(0, line.replace("Customer Address:", "").strip())
-                elif line.startswith("Items:"):
-                    items_section = True
-                elif items_section:
-                    parts = line.split(",")
-                    if len(parts) == 3:
-                        desc, qty, price = parts
-                        try:
-                            qty = int(qty.strip())
-                            price = float(price.strip())
-                            total = qty * price
-                            item = {'desc': desc.strip(), 'qty': qty, 'price': price, 'total': total}
-                            self.items.append(item)
-                            self.tree.insert('', 'end', values=(item['desc'], item['qty'], f"{item['price']:.2f}", f"{item['total']:.2f}"))
-                        except Exception:
-                            continue
-            self.generate_invoice()
+            self.preview.reset(self.items)
+
+            with open(file_path, "rb") as f:
+                reader = TxtInvoiceReader(f)
+                for item in reader:
+                    self.items.add(item)
+                    self.preview.append(item)
+                    self.tree.insert('', 'end', values=item_cells(item)[0])
+            if reader.customer_name:
+                self.customer_name.delete(0, tk.END)
+                self.customer_name.insert(0, reader.customer_name)
+            if reader.customer_address:
+                self.customer_address.delete(0, tk.END)
+                self.customer_address.insert(0, reader.customer_address)
+            if reader.errors:
+                messagebox.showwarning("Load Dummy Data", "Skipped invalid lines:\n" + format_errors(reader.errors))
+            self.schedule_preview()
         except Exception as e:
             traceback.print_exc()
             messagebox.showerror("Load Dummy Data Error", str(e))
@@ -170,24 +209,26 @@ class InvoiceApp(tk.Tk):
             price = Decimal(self.item_price.get())
             if qty < 1 or price < 0:
                 raise ValueError
+            item = LineItem.parse(desc, qty, price)
         except (ValueError, InvalidOperation):
             messagebox.showerror("Input Error", "Please enter valid quantity and price.")
             return
 
-        total = qty * price
-        item = {'desc': desc, 'qty': qty, 'price': float(price), 'total': float(total)}
-        self.items.append(item)
-        self.tree.insert('', 'end', values=(desc, qty, f"{price:.2f}", f"{total:.2f}"))
+        self.items.add(item)
+        self.preview.append(item)
+        self.tree.insert('', 'end', values=item_cells(item)[0])
         self.item_desc.delete(0, tk.END)
         self.item_qty.delete(0, tk.END)
         self.item_price.delete(0, tk.END)
 
-        if desc not in self.desc_history:
-            self.desc_history.add(desc)
-            self.item_desc['values'] = sorted(self.desc_history)
-            self.save_description_history()
+        try:
+            self.descriptions.record(desc, float(price))
+        except Exception as e:
+            traceback.print_exc()
+            messagebox.showwarning("History Save Error", f"Could not save description history.\n{e}")
+        self.item_desc['values'] = self.descriptions.suggest()
         
-        self.generate_invoice()
+        self.schedule_preview()
 
     def delete_selected_item(self):
         selected = self.tree.selection()
@@ -199,7 +240,8 @@ class InvoiceApp(tk.Tk):
             self.tree.delete(item_id)
             if index < len(self.items):
                 del self.items[index]
-        self.generate_invoice()
+                self.preview.delete(index)
+        self.schedule_preview()
 
     def on_tree_double_click(self, event):
         region = self.tree.identify("region", event.x, event.y)
@@ -222,110 +264,134 @@ class InvoiceApp(tk.Tk):
 
         def save_edit(event=None):
             new_value = entry.get()
+            item = self.items[item_index]
+            # rebuild the row through LineItem.parse, so an edit is checked like a new item
+            qty, price = item.qty, Decimal(item.price).scaleb(-2)
             try:
                 if col_index == 1:
-                    new_qty = int(new_value)
-                    self.items[item_index]['qty'] = new_qty
+                    qty = int(new_value)
                 elif col_index == 2:
-                    new_price = Decimal(new_value)
-                    self.items[item_index]['price'] = float(new_price)
-            except (ValueError, InvalidOperation):
+                    price = Decimal(new_value)
+                if qty < 1 or price < 0:
+                    raise ValueError
+                item = LineItem.parse(item.desc, qty, price)
+                self.items[item_index] = item
+            except (ValueError, InvalidOperation, OverflowError):
                 messagebox.showerror("Input Error", "Please enter a valid number.")
                 entry.destroy()
                 return
-            self.items[item_index]['total'] = self.items[item_index]['qty'] * self.items[item_index]['price']
-            self.tree.item(row_id, values=(
-                self.items[item_index]['desc'],
-                self.items[item_index]['qty'],
-                f"{self.items[item_index]['price']:.2f}",
-                f"{self.items[item_index]['total']:.2f}"
-            ))
+            self.tree.item(row_id, values=item_cells(item)[0])
+            self.preview.update(item_index, item)
             entry.destroy()
-            self.generate_invoice()
+            self.schedule_preview()
 
         entry.bind("<Return>", save_edit)
         entry.bind("<FocusOut>", lambda e: entry.destroy())
 
+    def tax_rate(self):
+        """Tax rate field as a Decimal percent; 0 while it does not hold a number."""
+        try:
+            tax_rate = Decimal(self.tax_rate_var.get())
+            if not tax_rate.is_finite():
+                raise InvalidOperation
+        except InvalidOperation:
+            tax_rate = Decimal(0)
+        return tax_rate
+
+    def schedule_preview(self):
+        """Refresh the preview once input has been quiet for PREVIEW_DELAY_MS."""
+        if self._preview_job is not None:
+            self.after_cancel(self._preview_job)
+        self._preview_job = self.after(PREVIEW_DELAY_MS, self.generate_invoice)
+
     def generate_invoice(self):
-            name = self.customer_name.get()
-            address = self.customer_address.get()
-            if not name or not address or not self.items:
-                return
+        # Apply the row edits recorded in self.preview since the last refresh and
+        # rewrite the header/footer; the whole text is only rebuilt when needed.
+        if self._preview_job is not None:
+            self.after_cancel(self._preview_job)
+            self._preview_job = None
+        ops = self.preview.take_ops()
+        name = self.customer_name.get()
+        address = self.customer_address.get()
+        if not name or not address or not self.items:
+            self._preview_shown = False
+            return
 
-            try:
-                tax_rate = float(self.tax_rate_var.get()) / 100.0
-            except ValueError:
-                tax_rate = 0.0
-
-            invoice = f"INVOICE\nCustomer: {name}\nAddress: {address}\n\n"
-            invoice += "Items:\n"
-            invoice += "{:<20} {:<10} {:<12} {:<10}\n".format('Description', 'Quantity', 'Unit Price', 'Total')
-            invoice += "-"*60 + "\n"
-            subtotal = 0
-            for item in self.items:
-                invoice += "{:<20} {:<10} {:<12.2f} {:<10.2f}\n".format(item['desc'], item['qty'], item['price'], item['total'])
-                subtotal += item['total']
-
-            tax_amount = subtotal * tax_rate
-            grand_total = subtotal + tax_amount
-
-            invoice += "-"*60 + "\n"
-            invoice += f"Subtotal: ${subtotal:.2f}\n"
-            invoice += f"Tax ({self.tax_rate_var.get()}%): ${tax_amount:.2f}\n"
-            invoice += f"Grand Total: ${grand_total:.2f}\n"
-
-            self.invoice_text.delete('1.0', tk.END)
-            self.invoice_text.insert(tk.END, invoice)
+        tax_rate = self.tax_rate()
+        tax_label = self.tax_rate_var.get()
+
+        text = self.invoice_text
+        # edit_modified() is also set when the user typed into the preview
+        if (not self._preview_shown or text.edit_modified() or len(ops) > PREVIEW_MAX_OPS
+                or any(op == "reset" for op, _, _ in ops)):
+            text.delete('1.0', tk.END)
+            text.insert(tk.END, self.preview.text(name, address, tax_rate, tax_label))
+        else:
+            first = HEADER_LINES + 1
+            for op, index, line in ops:
+                pos = f"{first + index}.0"
+                if op == "insert":
+                    text.insert(pos, line + "\n")
+                elif op == "update":
+                    text.delete(pos, f"{pos} lineend")
+                    text.insert(pos, line)
+                else:
+                    text.delete(pos, f"{first + index + 1}.0")
+            self._replace_preview_lines(1, self.preview.header_lines(name, address))
+            self._replace_preview_lines(first + len(self.preview.rows), self.preview.footer_lines(tax_rate, tax_label))
+        text.edit_modified(False)
+        self._preview_shown = True
+
+    def _replace_preview_lines(self, first, lines):
+        self.invoice_text.delete(f"{first}.0", f"{first + len(lines)}.0")
+        self.invoice_text.insert(f"{first}.0", "\n".join(lines) + "\n")
 
     def save_invoice_data(self):
         try:
-            file_path = filedialog.asksaveasfilename(
-                defaultextension=".json",
-                filetypes=[("JSON files", "*.json")],
-                initialfile=self.get_inprogress_filename(),
-                initialdir=self.default_invoice_dir
-            )
-            if not file_path:
-                return
-            with open(file_path, "w") as f:
-                json.dump({
-                    "customer_name": self.customer_name.get(),
-                    "customer_address": self.customer_address.get(),
-                    "items": self.items
-                }, f, indent=2)
-            messagebox.showinfo("Invoice Saved", f"Invoice data saved to {file_path}")
+            self.invoice_id = self.store.save(self.customer_name.get(), self.customer_address.get(),
+                                              self.items, self.tax_rate(), self.invoice_id)
+            messagebox.showinfo("Invoice Saved", "Invoice saved. Reopen it with Load Invoice.")
         except Exception as e:
             traceback.print_exc()
             messagebox.showerror("Save Error", str(e))
 
     def load_invoice_data(self):
+        InvoiceBrowser(self)
+
+    def open_invoice(self, invoice):
+        """Show a saved invoice (InvoiceStore.get) for editing; Save For Later then updates it."""
+        items = LineItems(invoice["items"])
+        self.preview.reset(items)
+        self.items = items
+        self.invoice_id = invoice["id"]
+        self.customer_name.delete(0, tk.END)
+        self.customer_name.insert(0, invoice["customer_name"])
+        self.customer_address.delete(0, tk.END)
+        self.customer_address.insert(0, invoice["customer_address"])
+        self.tax_rate_var.set(str(invoice["tax_rate"]))
+        self.tree.delete(*self.tree.get_children())
+        for item in self.items:
+            self.tree.insert('', 'end', values=item_cells(item)[0])
+        self.schedule_preview()
+
+    def import_legacy_invoices(self):
+        # one-off: earlier versions saved each invoice as its own JSON file
+        if self.store.count():
+            return
         try:
-            file_path = filedialog.askopenfilename(
-                defaultextension=".json",
-                filetypes=[("JSON files", "*.json")],
-                initialdir=self.default_invoice_dir
-            )
-            if not file_path:
-                return
-            with open(file_path, "r") as f:
-                data = json.load(f)
-            self.customer_name.delete(0, tk.END)
-            self.customer_name.insert(0, data.get("customer_name", ""))
-            self.customer_address.delete(0, tk.END)
-            self.customer_address.insert(0, data.get("customer_address", ""))
-            self.items = data.get("items", [])
-            self.tree.delete(*self.tree.get_children())
-            for item in self.items:
-                self.tree.insert('', 'end', values=(item['desc'], item['qty'], f"{item['price']:.2f}", f"{item['total']:.2f}"))
-            self.generate_invoice()
-        except Exception as e:
+            self.store.import_json_files(self.default_invoice_dir)
+        except Exception:
             traceback.print_exc()
-            messagebox.showerror("Load Error", str(e))
 
     def export_as_pdf(self, file_path=None, show_message=True):
-        from reportlab.platypus import Table, TableStyle
-        from reportlab.lib import colors
-
+        """
+        Render the invoice to a PDF on a background thread; progress shows under
+        the preview and the invoice can be edited meanwhile (the export works
+        on a snapshot). return: file_path being written, or None
+        """
+        if self._export is not None:
+            messagebox.showinfo("Export in Progress", "Wait for the current export to finish or cancel it.")
+            return None
         default_name = self.get_invoice_filename()
         initialdir = self.default_invoice_dir if os.path.exists(self.default_invoice_dir) else os.getcwd()
         if not file_path:
@@ -334,115 +400,180 @@ class InvoiceApp(tk.Tk):
             )
         if not file_path:
             return None
+        self._export = PdfExport(file_path, self.customer_name.get(), self.customer_address.get(),
+                                 LineItems(self.items), self.tax_rate())
+        self._export.start()
+        self.cancel_export_button.configure(state="normal")
+        self.export_progress.configure(value=0)
+        self.export_status.set("Exporting...")
+        self.after(EXPORT_POLL_MS, self.poll_export)
+        return file_path
+
+    def cancel_export(self):
+        if self._export is not None:
+            self._export.cancel()
+            self.export_status.set("Cancelling...")
+
+    def poll_export(self):
+        export = self._export
         try:
-            c = canvas.Canvas(file_path, pagesize=landscape(letter))
-            width, height = landscape(letter)
-
-            watermark_path = "watermark.png"
-            def draw_watermark():
-                if os.path.exists(watermark_path):
-                    img = ImageReader(watermark_path)
-                    img_width, img_height = img.getSize()
-                    scale = min(width / img_width, height / img_height) * 0.7
-                    wm_width = img_width * scale
-                    wm_height = img_height * scale
-                    wm_x = (width - wm_width) / 2
-                    wm_y = (height - wm_height) / 2
-                    c.saveState()
-                    c.translate(wm_x, wm_y)
-                    c.setFillAlpha(0.15)
-                    c.drawImage(img, 0, 0, width=wm_width, height=wm_height, mask='auto')
-                    c.restoreState()
-
-            # Prepare table data
-            data = [['Description', 'Quantity', 'Unit Price', 'Total']]
-            for item in self.items:
-                data.append([
-                    str(item['desc']),
-                    str(item['qty']),
-                    f"${item['price']:.2f}",
-                    f"${item['total']:.2f}"
-                ])
-            data.append(['', '', 'Grand Total:', f"${sum(item['total'] for item in self.items):,.2f}"])
-
-            table_col_widths = [380, 100, 100, 100]
-            row_height = 24
-
-            # First page: headers and business info
-            y_start_first = height - 120
-            bottom_margin = 20
-            max_rows_first = int((y_start_first - bottom_margin) / row_height)
-
-            # Later pages: only table, start higher
-            y_start_other = height - 10
-            max_rows_other = int((y_start_other - bottom_margin) / row_height)
-
-            data_body = data[1:-1]
-            header = data[0]
-            grand_total = data[-1]
-
-            i = 0
-            first_page = True
-            while i < len(data_body):
-                c.setFont("Helvetica", 12)
-
-                if first_page:
-                    draw_watermark()
-                    c.setFont("Times-Italic", 40)
-                    company_name = "Custom Kitchen Cabinets"
-                    company_name_width = c.stringWidth(company_name, "Times-Italic", 40)
-                    c.drawString((width - company_name_width) / 2, height - 175, company_name)
-
-                    c.setFont("Helvetica-Bold", 20)
-                    invoice_text = "INVOICE"
-                    invoice_width = c.stringWidth(invoice_text, "Helvetica-Bold", 30)
-                    c.drawString((width - invoice_width) / 2, height - 60, invoice_text)
-
-                    c.setFont("Helvetica", 14)
-                    c.drawString(60, height - 110, f"Customer: {self.customer_name.get()}")
-                    c.drawString(60, height - 130, f"Address: {self.customer_address.get()}")
-
-                    y_start = y_start_first
-                    max_rows = max_rows_first
+            while True:
+                kind, a, b = export.queue.get_nowait()
+                if kind == "progress":
+                    self.export_progress.configure(maximum=b, value=a)
+                    self.export_status.set(f"Exporting page {a} of {b}")
                 else:
-                    draw_watermark()
-                    y_start = y_start_other
-                    max_rows = max_rows_other
-
-                table_rows = data_body[i:i + (max_rows - 2)]
-                page_data = [header] + table_rows
-                is_last_page = (i + (max_rows - 2)) >= len(data_body)
-                if is_last_page:
-                    page_data.append(grand_total)
-                table = Table(page_data, colWidths=table_col_widths, hAlign='CENTER')
-                grand_total_row = len(page_data) - 1 if is_last_page else None
-                style = [
-                    ('GRID', (0,0), (-1,-1), 1, colors.black),
-                    ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
-                    ('ALIGN', (1,1), (-1,-2 if is_last_page else -1), 'RIGHT'),
-                    ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-                ]
-                if grand_total_row is not None:
-                    style.append(('FONTNAME', (0,grand_total_row), (-1,grand_total_row), 'Helvetica-Bold'))
-                    style.append(('BACKGROUND', (0,grand_total_row), (-1,grand_total_row), colors.whitesmoke))
-                table.setStyle(TableStyle(style))
-                table_height = row_height * len(page_data)
-                table.wrapOn(c, width, height)
-                total_table_width = sum(table_col_widths)
-                x_center = (width - total_table_width) / 2
-                table.drawOn(c, x_center, y_start - table_height)
-
-                i += (max_rows - 2)
-                first_page = False
-                if not is_last_page:
-                    c.showPage()
-                    
-
-            c.save()
-            return file_path
+                    self.finish_export(kind, a)
+                    return
+        except queue.Empty:
+            pass
+        self.after(EXPORT_POLL_MS, self.poll_export)
+
+    def finish_export(self, kind, detail):
+        self._export = None
+        self.cancel_export_button.configure(state="disabled")
+        self.export_progress.configure(value=0)
+        if kind == "done":
+            self.export_status.set(f"Saved {detail}")
+        elif kind == "cancelled":
+            self.export_status.set("Export cancelled")
+        else:
+            self.export_status.set("Export failed")
+            messagebox.showerror("PDF Export Error: Close PDF", detail)
+
+
+class InvoiceBrowser(tk.Toplevel):
+    """
+    Load Invoice dialog: saved invoices newest first, filtered as you type by
+    the start of the customer name or address, PAGE_SIZE rows at a time.
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.app = app
+        self.title("Load Invoice")
+        self.transient(app)
+        self._search_job = None
+        self.offset = 0
+
+        tk.Label(self, text="Search:").grid(row=0, column=0, padx=5, pady=5, sticky="e")
+        self.search_var = StringVar()
+        search_entry = tk.Entry(self, textvariable=self.search_var, width=40)
+        search_entry.grid(row=0, column=1, columnspan=3, pady=5, sticky="w")
+        search_entry.focus_set()
+        self.search_var.trace_add("write", lambda *args: self.schedule_search())
+
+        self.tree = ttk.Treeview(self, columns=('Customer', 'Address', 'Date', 'Total', 'Items'), show='headings', height=15)
+        for col, width in (('Customer', 200), ('Address', 220), ('Date', 120), ('Total', 90), ('Items', 50)):
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=width, anchor="e" if col in ('Total', 'Items') else "w")
+        self.tree.grid(row=1, column=0, columnspan=4, padx=5, sticky="nsew")
+        self.tree.bind("<Double-1>", lambda e: self.open_selected())
+
+        self.status = StringVar()
+        tk.Label(self, textvariable=self.status).grid(row=2, column=0, columnspan=2, padx=5, sticky="w")
+        self.more_button = tk.Button(self, text="More", command=self.load_more)
+        self.more_button.grid(row=2, column=2, pady=5)
+        tk.Button(self, text="Open", command=self.open_selected).grid(row=2, column=3, pady=5)
+        tk.Button(self, text="Import JSON Files...", command=self.import_files).grid(row=3, column=0, columnspan=2, padx=5, pady=5, sticky="w")
+        self.search()
+
+    def schedule_search(self):
+        if self._search_job is not None:
+            self.after_cancel(self._search_job)
+        self._search_job = self.after(PREVIEW_DELAY_MS, self.search)
+
+    def search(self):
+        self._search_job = None
+        self.tree.delete(*self.tree.get_children())
+        self.offset = 0
+        self.matches = self.app.store.count(self.search_var.get().strip())
+        self.load_more()
+
+    def load_more(self):
+        rows = self.app.store.search(self.search_var.get().strip(), limit=PAGE_SIZE, offset=self.offset)
+        for inv in rows:
+            date = time.strftime("%Y-%m-%d %H:%M", time.localtime(inv["created"]))
+            self.tree.insert('', 'end', iid=str(inv["id"]), values=(
+                inv["customer_name"], inv["customer_address"], date, format_cents(inv["total"]), inv["item_count"]))
+        self.offset += len(rows)
+        self.status.set(f"{self.offset} of {self.matches} invoices")
+        self.more_button.configure(state="normal" if self.offset < self.matches else "disabled")
+
+    def open_selected(self):
+        selected = self.tree.selection()
+        if not selected:
+            return
+        invoice = self.app.store.get(int(selected[0]))
+        if invoice is None:
+            messagebox.showerror("Load Error", "That invoice no longer exists.", parent=self)
+            self.search()
+            return
+        try:
+            self.app.open_invoice(invoice)
         except Exception as e:
-            messagebox.showerror("PDF Export Error: Close PDF", str(e))
-            return None
+            traceback.print_exc()
+            messagebox.showerror("Load Error", str(e), parent=self)
+            return
+        self.destroy()
+
+    def import_files(self):
+        directory = filedialog.askdirectory(initialdir=self.app.default_invoice_dir, parent=self)
+        if not directory:
+            return
+        imported, errors = self.app.store.import_json_files(directory)
+        message = f"Imported {imported} invoices from {IMPORT_PATTERN} files."
+        if errors:
+            message += "\n\nSkipped:\n" + "\n".join(f"{os.path.basename(p)}: {m}" for p, m in errors[:10])
+        messagebox.showinfo("Import", message, parent=self)
+        self.search()
+
+
+class PdfExport:
+    """
+    Runs write_invoice_pdf on a daemon thread. Messages for the UI arrive on
+    queue as (kind, a, b): ("progress", pages_done, pages_total), then one of
+    ("done", file_path, None), ("cancelled", None, None) or ("error", message, None).
+    """
+
+    def __init__(self, file_path, customer_name, customer_address, items, tax_rate=0):
+        self.file_path = file_path
+        self.queue = queue.Queue()
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(customer_name, customer_address, items, tax_rate),
+                                       name="pdf-export", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def _progress(self, done, total):
+        if self.cancelled.is_set():
+            raise ExportCancelled
+        self.queue.put(("progress", done, total))
+
+    def _run(self, customer_name, customer_address, items, tax_rate):
+        try:
+            write_invoice_pdf(self.file_path, customer_name, customer_address, items, tax_rate, progress=self._progress)
+        except ExportCancelled:
+            self.queue.put(("cancelled", None, None))
+        except Exception as e:
+            traceback.print_exc()
+            self.queue.put(("error", str(e), None))
+        else:
+            self.queue.put(("done", self.file_path, None))
+
+
+def write_invoice_pdf(file_path, customer_name, customer_address, items, tax_rate=0, progress=None):
+    """
+    Render the invoice with PDF_RENDERER to file_path. Never touches Tk, so it can run on any thread.
+    progress(pages_done, pages_total) is called after each page; raising from it aborts the
+    export before anything is written.
+    """
+    return PDF_RENDERER.render(customer_name, customer_address, items, tax_rate, out=file_path, progress=progress)
+
 
 if __name__ == "__main__":
     app = InvoiceApp()
@@ -1,50 +1,131 @@
-from flask import Flask, render_template, request, send_file, abort
-from io import BytesIO
+from flask import Flask, g, jsonify, render_template, request, send_file, abort, url_for
+from datetime import datetime
+from werkzeug.exceptions import HTTPException
+from werkzeug.wsgi import ClosingIterator
 import os, json, sys
-from invoice_core import generate_invoice_pdf
+from time import perf_counter
+from invoice_core import InvoiceRenderer, _invoice_filename, invoice_spec_fields, spool_invoices_batch
+from invoice_bulk import BulkInvoiceReader
+from invoice_cache import PdfCache, invoice_cache_key
+from invoice_items import LineItems
+from invoice_parser import format_errors, read_item_lines, read_txt_invoice
+from invoice_metrics import METRICS, StageTimer, log
+from invoice_jobs import DONE, JobQueue
+from invoice_store import PAGE_SIZE, InvoiceStore
+from invoice_totals import to_cents, to_tax_rate
 
 app = Flask(__name__)
+pdf_cache = PdfCache()
 
-def parse_dummy_file(file_storage):
+def invoice_from_form(form, upload=None):
     """
-    Parse TXT like:
-      Customer Name: John Doe
-      Customer Address: 123 Main St
-      Items:
-      Item A, 2, 10.5
-      Item B, 1, 99
+    The invoice in a /generate submission; shared by the Flask view and asgi.py.
+    form: mapping of the form fields
+    upload: binary stream of the uploaded TXT file (dummy_file), which wins over the form's
+            customer and items fields, or None
+    return: (customer_name, customer_address, items as LineItems, tax_rate)
+    raises ValueError with the message for a 400 response
     """
-    if not file_storage:
-        return None, None, []
-    data = file_storage.read()
-    # robust decode
     try:
-        text = data.decode("utf-8")
-    except UnicodeDecodeError:
-        text = data.decode("latin-1", errors="ignore")
-
-    items = []
-    name = address = ""
-    items_section = False
-    for raw in text.splitlines():
-        line = raw.strip()
-        if not line:
-            continue
-        if line.startswith("Customer Name:"):
-            name = line.replace("Customer Name:", "").strip()
-        elif line.startswith("Customer Address:"):
-            address = line.replace("Customer Address:", "").strip()
-        elif line.startswith("Items:"):
-            items_section = True
-        elif items_section:
-            parts = [p.strip() for p in line.split(",")]
-            if len(parts) == 3:
-                desc, qty, price = parts
-                try:
-                    items.append({"desc": desc, "qty": int(qty), "price": float(price)})
-                except Exception:
-                    continue
-    return name, address, items
+        tax_rate = to_tax_rate(form.get("tax_rate"))
+    except ValueError:
+        raise ValueError("Invalid tax rate.")
+    if upload is not None:
+        customer_name, customer_address, items, errors = read_txt_invoice(upload)
+        if errors:
+            raise ValueError("Invalid lines in uploaded file:\n" + format_errors(errors))
+    else:
+        customer_name = (form.get("customer_name") or "").strip()
+        customer_address = (form.get("customer_address") or "").strip()
+        if form.get("items_mode", "csv") == "json":
+            try:
+                items = json.loads(form.get("items_json") or "[]")
+            except json.JSONDecodeError:
+                raise ValueError("Invalid JSON for items.")
+            if not isinstance(items, list):
+                raise ValueError("Items must be a JSON array.")
+            try:
+                items = LineItems(items)
+            except ValueError as e:
+                raise ValueError(f"Invalid items: {e}.")
+        else:
+            items, errors = read_item_lines((form.get("items_csv") or "").splitlines())
+            if errors:
+                raise ValueError("Invalid item lines:\n" + format_errors(errors))
+    if not customer_name or not customer_address or not items:
+        raise ValueError("Missing customer info or items.")
+    return customer_name, customer_address, items, tax_rate
+
+def watermark_path():
+    wm_path = os.path.join(app.static_folder or "static", "watermark.png")
+    return wm_path if os.path.exists(wm_path) else None
+
+invoice_renderer = InvoiceRenderer(watermark_path=watermark_path())
+# saved invoices are re-exported after edits, so their unchanged pages come from the page cache
+stored_renderer = InvoiceRenderer(watermark_path=watermark_path(), cache_pages=True)
+job_queue = JobQueue(renderer=invoice_renderer)
+invoice_store = InvoiceStore()
+
+def iter_batch_specs(req):
+    """
+    Invoice specs from a batch request body: a JSON array, NDJSON (one invoice
+    object per line) or the bulk CSV of invoice_bulk (one row per line item).
+    NDJSON and CSV are read line by line from the stream.
+    """
+    if req.mimetype == "text/csv":
+        reader = BulkInvoiceReader(req.stream, "csv")
+        for invoice in reader:
+            if reader.errors:
+                break
+            yield invoice._asdict()
+        if reader.errors:
+            raise ValueError("Invalid CSV rows:\n" + format_errors(reader.errors))
+    elif req.mimetype in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        for n, raw in enumerate(req.stream, 1):
+            line = raw.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                raise ValueError(f"Invalid JSON on line {n}.")
+    else:
+        specs = req.get_json(silent=True)
+        if not isinstance(specs, list):
+            raise ValueError("Expected a JSON array of invoices.")
+        yield from specs
+
+@app.before_request
+def start_timer():
+    g.timer = StageTimer()
+
+@app.after_request
+def finish_timer(response):
+    """Server-Timing header now; latency metrics and a JSON log line once the body is sent."""
+    timer = g.get("timer")
+    if timer is None or request.endpoint in (None, "static", "metrics"):
+        return response
+    response.headers["Server-Timing"] = timer.server_timing()
+    # the route pattern (/jobs/<job_id>), not the URL, so ids do not each add a metrics series
+    endpoint, path, status = request.url_rule.rule, request.path, response.status_code
+    sent = perf_counter()
+
+    def done():
+        timer.add("send", perf_counter() - sent)
+        METRICS.observe(endpoint, status, perf_counter() - timer.started, timer)
+        if timer.stages:
+            log(timer.log_line("request", path=path, status=status))
+
+    if response.direct_passthrough:
+        # send_file responses bypass call_on_close, so hook the body iterator instead
+        response.response = ClosingIterator(response.response, done)
+    else:
+        response.call_on_close(done)
+    return response
+
+@app.get("/metrics")
+def metrics():
+    return app.response_class(METRICS.render(), mimetype="text/plain; version=0.0.4")
 
 @app.get("/")
 def index():
@@ -52,61 +133,186 @@ def index():
 
 @app.post("/generate")
 def generate():
+    timer = g.timer
     try:
+        t0 = perf_counter()
         # Prefer dummy file if provided
         dummy_file = request.files.get("dummy_file")
-        if dummy_file and dummy_file.filename:
-            customer_name, customer_address, items = parse_dummy_file(dummy_file)
-            tax_rate = float(request.form.get("tax_rate") or "0")
-        else:
-            # Fall back to form inputs
-            customer_name = (request.form.get("customer_name") or "").strip()
-            customer_address = (request.form.get("customer_address") or "").strip()
-            tax_rate = float(request.form.get("tax_rate") or "0")
-
-            mode = request.form.get("items_mode", "csv")
-            if mode == "json":
-                try:
-                    items = json.loads(request.form.get("items_json") or "[]")
-                except json.JSONDecodeError:
-                    return abort(400, "Invalid JSON for items.")
-            else:
-                items = []
-                for line in (request.form.get("items_csv") or "").splitlines():
-                    parts = [p.strip() for p in line.split(",")]
-                    if len(parts) == 3:
-                        desc, qty, price = parts
-                        try:
-                            items.append({"desc": desc, "qty": int(qty), "price": float(price)})
-                        except Exception:
-                            pass
-
-        if not customer_name or not customer_address or not items:
-            return abort(400, "Missing customer info or items.")
-
-        wm_path = os.path.join(app.static_folder or "static", "watermark.png")
-        if not os.path.exists(wm_path):
-            wm_path = None
-
-        pdf_bytes = generate_invoice_pdf(
-            customer_name=customer_name,
-            customer_address=customer_address,
-            items=items,
-            tax_rate=tax_rate,
-            watermark_path=wm_path
-        )
-
-        fname = f"{customer_name.replace(' ', '_')}_Invoice.pdf" or "Invoice.pdf"
-        return send_file(BytesIO(pdf_bytes),
-                         mimetype="application/pdf",
-                         as_attachment=True,
-                         download_name=fname)
+        upload = dummy_file.stream if dummy_file and dummy_file.filename else None
+        try:
+            customer_name, customer_address, items, tax_rate = invoice_from_form(request.form, upload)
+        except ValueError as e:
+            return abort(400, str(e))
+        timer.add("parse", perf_counter() - t0)
+        return send_invoice_pdf(customer_name, customer_address, items, tax_rate, timer)
 
+    except HTTPException:
+        # abort(400, ...) above, not a server error
+        raise
     except Exception as e:
         # log full stack to Render logs
         print("ERROR /generate:", e, file=sys.stderr)
         import traceback; traceback.print_exc()
         return abort(500, "Server error while generating invoice.")
 
+def send_invoice_pdf(customer_name, customer_address, items, tax_rate, timer, renderer=invoice_renderer):
+    """
+    PDF download response for one invoice. Repeat requests for the same invoice
+    are served from the PDF cache, or answered 304 when the client already has this version.
+    """
+    t0 = perf_counter()
+    try:
+        etag = invoice_cache_key(customer_name, customer_address, items, tax_rate,
+                                 renderer.watermark_path, renderer.renderer, renderer.layout)
+    except (KeyError, TypeError, ValueError):
+        return abort(400, "Invalid items.")
+    if request.if_none_match.contains(etag):
+        resp = app.response_class(status=304)
+        resp.set_etag(etag)
+        return resp
+
+    pdf = pdf_cache.open(etag)
+    timer.add("cache", perf_counter() - t0)
+    if pdf is None:
+        # render into a spooled temp file and move it into the cache, which hands back
+        # the stored PDF to send (send_file closes it)
+        spool = renderer.spool(customer_name, customer_address, items, tax_rate, timings=timer)
+        pdf = pdf_cache.store(etag, spool)
+
+    return send_file(pdf,
+                     mimetype="application/pdf",
+                     as_attachment=True,
+                     download_name=_invoice_filename(customer_name),
+                     etag=etag)
+
+@app.post("/generate/batch")
+def generate_batch():
+    """
+    Body: JSON array or NDJSON of {customer_name, customer_address, items, tax_rate},
+    or a bulk CSV (text/csv, see invoice_bulk).
+    ?format=zip (default) returns a ZIP of PDFs, ?format=pdf one merged PDF.
+    """
+    fmt = request.args.get("format", "zip")
+    if fmt not in ("zip", "pdf"):
+        return abort(400, "format must be zip or pdf.")
+    try:
+        # spooled to a temp file and streamed from there (send_file closes it)
+        spool = spool_invoices_batch(iter_batch_specs(request),
+                                     renderer=invoice_renderer,
+                                     merge=(fmt == "pdf"),
+                                     timings=g.timer)
+    except ValueError as e:
+        return abort(400, str(e))
+    except Exception as e:
+        print("ERROR /generate/batch:", e, file=sys.stderr)
+        import traceback; traceback.print_exc()
+        return abort(500, "Server error while generating invoices.")
+
+    if fmt == "pdf":
+        return send_file(spool, mimetype="application/pdf",
+                         as_attachment=True, download_name="Invoices.pdf")
+    return send_file(spool, mimetype="application/zip",
+                     as_attachment=True, download_name="Invoices.zip")
+
+@app.post("/jobs")
+def create_job():
+    """
+    Queue one invoice ({customer_name, customer_address, items, tax_rate} as JSON)
+    for background rendering; returns 202 with the job id right away.
+    """
+    spec = request.get_json(silent=True)
+    try:
+        job_id = job_queue.submit(spec)
+    except ValueError as e:
+        return abort(400, str(e))
+    body = {"id": job_id, "status": "queued",
+            "status_url": url_for("job_status", job_id=job_id),
+            "pdf_url": url_for("job_pdf", job_id=job_id)}
+    return jsonify(body), 202, {"Location": body["status_url"]}
+
+@app.get("/jobs/<job_id>")
+def job_status(job_id):
+    job = job_queue.status(job_id)
+    if job is None:
+        return abort(404, "No such job.")
+    return jsonify(job)
+
+@app.get("/jobs/<job_id>/pdf")
+def job_pdf(job_id):
+    job = job_queue.status(job_id)
+    if job is None:
+        return abort(404, "No such job.")
+    path = job_queue.pdf_path(job_id) if job["status"] == DONE else None
+    if path is None:
+        return abort(409, f"Job is {job['status']}.")
+    return send_file(path, mimetype="application/pdf", as_attachment=True,
+                     download_name=_invoice_filename(job["customer_name"]))
+
+def _date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        abort(400, f"{name} must be an ISO date, e.g. 2024-05-31.")
+
+def _money_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return to_cents(value)
+    except ValueError:
+        abort(400, f"{name} must be an amount.")
+
+@app.post("/invoices")
+def save_invoice():
+    """Save one invoice ({customer_name, customer_address, items, tax_rate} as JSON); returns 201 with its id."""
+    try:
+        name, address, items, tax_rate = invoice_spec_fields(0, request.get_json(silent=True))
+        invoice_id = invoice_store.save(name, address, items, tax_rate)
+    except ValueError as e:
+        return abort(400, str(e))
+    url = url_for("get_invoice", invoice_id=invoice_id)
+    return jsonify({"id": invoice_id, "url": url, "pdf_url": url_for("invoice_pdf", invoice_id=invoice_id)}), \
+        201, {"Location": url}
+
+@app.get("/invoices")
+def list_invoices():
+    """
+    Saved invoices, newest first. Query: q (start of customer name or address),
+    customer, address, since/until (ISO dates), min_total/max_total (dollars),
+    order (created|updated|total|customer), desc (1|0), limit, offset.
+    Amounts in the response are in cents.
+    """
+    args = request.args
+    filters = {"text": args.get("q"), "customer": args.get("customer"), "address": args.get("address"),
+               "since": _date_arg("since"), "until": _date_arg("until"),
+               "min_total": _money_arg("min_total"), "max_total": _money_arg("max_total")}
+    try:
+        limit = min(max(int(args.get("limit", PAGE_SIZE)), 1), 500)
+        offset = max(int(args.get("offset", 0)), 0)
+        invoices = invoice_store.search(**filters, order=args.get("order", "created"),
+                                        descending=args.get("desc", "1") != "0", limit=limit, offset=offset)
+    except ValueError as e:
+        return abort(400, str(e))
+    return jsonify({"invoices": invoices, "total": invoice_store.count(**filters), "limit": limit, "offset": offset})
+
+@app.get("/invoices/<int:invoice_id>")
+def get_invoice(invoice_id):
+    invoice = invoice_store.get(invoice_id)
+    if invoice is None:
+        return abort(404, "No such invoice.")
+    return jsonify(invoice)
+
+@app.get("/invoices/<int:invoice_id>/pdf")
+def invoice_pdf(invoice_id):
+    invoice = invoice_store.get(invoice_id)
+    if invoice is None:
+        return abort(404, "No such invoice.")
+    return send_invoice_pdf(invoice["customer_name"], invoice["customer_address"], invoice["items"],
+                            invoice["tax_rate"], g.timer, stored_renderer)
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8080)
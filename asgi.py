@@ -0,0 +1,343 @@
+# asgi.py
+# Async serving mode, alongside the sync `gunicorn app:app`:
+#
+#   uvicorn asgi:app --host 0.0.0.0 --port 8080
+#   gunicorn asgi:app -k uvicorn.workers.UvicornWorker
+#
+# POST /generate runs on the event loop: the form (or the uploaded TXT file) is
+# read as it arrives and the PDF is sent back in chunks, so slow clients hold a
+# coroutine instead of a worker. Rendering goes to a RenderPool of warm worker
+# processes; once INVOICE_RENDER_QUEUE renders are queued or running, further
+# ones get 503 with Retry-After right away. Every other route is the Flask app,
+# called on a thread pool with its request body already buffered.
+import asyncio
+import os
+import sys
+import tempfile
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from time import perf_counter
+from urllib.parse import parse_qsl, quote
+
+from werkzeug.http import parse_etags, parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+from app import app as flask_app, invoice_from_form, invoice_renderer, pdf_cache
+from invoice_cache import invoice_cache_key
+from invoice_core import RenderPool, RenderPoolFull, _invoice_filename
+from invoice_metrics import METRICS, StageTimer, log
+
+RENDER_WORKERS = int(os.environ.get("INVOICE_RENDER_WORKERS") or os.cpu_count() or 1)
+# renders queued or running before /generate answers 503
+RENDER_QUEUE = int(os.environ.get("INVOICE_RENDER_QUEUE") or RENDER_WORKERS * 4)
+# threads running the Flask routes
+WSGI_THREADS = int(os.environ.get("INVOICE_WSGI_THREADS", "16"))
+MAX_BODY = int(os.environ.get("INVOICE_MAX_BODY_MB", "32")) * 1024 * 1024
+# request bodies (and uploads) bigger than this are buffered on disk
+SPOOL_MAX_MEMORY = 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+RETRY_AFTER = 1
+
+
+class HttpError(Exception):
+    def __init__(self, status, message, headers=()):
+        super().__init__(message)
+        self.status = status
+        self.headers = list(headers)
+
+
+def _header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def read_body(receive, out, limit=MAX_BODY):
+    """Copy the request body into the binary file out; raises HttpError 413 past limit."""
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise HttpError(499, "Client disconnected.")
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > limit:
+            raise HttpError(413, "Request body too large.")
+        out.write(chunk)
+        if not message.get("more_body", False):
+            out.seek(0)
+            return size
+
+
+async def read_form(scope, receive, upload_field, limit=MAX_BODY):
+    """
+    Parse an urlencoded or multipart form while it is received.
+    return: (fields dict, upload) where upload is a rewound binary file with the
+            contents of upload_field, or None when no file was sent in it
+    """
+    mimetype, options = parse_options_header(_header(scope, b"content-type") or "")
+    if mimetype != "multipart/form-data":
+        body = BytesIO()
+        await read_body(receive, body, limit)
+        fields = {}
+        for name, value in parse_qsl(body.getvalue().decode("utf-8", "replace"), keep_blank_values=True):
+            fields.setdefault(name, value)
+        return fields, None
+    if "boundary" not in options:
+        raise HttpError(400, "Missing multipart boundary.")
+
+    decoder = MultipartDecoder(options["boundary"].encode("latin-1"), max_form_memory_size=limit)
+    fields, upload = {}, None
+    name, value, target = None, None, None
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise HttpError(499, "Client disconnected.")
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > limit:
+            raise HttpError(413, "Request body too large.")
+        more = message.get("more_body", False)
+        try:
+            decoder.receive_data(chunk)
+            if not more:
+                decoder.receive_data(None)
+            event = decoder.next_event()
+            while not isinstance(event, (NeedData, Epilogue)):
+                if isinstance(event, File):
+                    # only the upload is kept; any other file parts are skipped
+                    name, value, target = None, None, None
+                    if event.name == upload_field and event.filename and upload is None:
+                        target = upload = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+                elif isinstance(event, Field):
+                    name, value, target = event.name, bytearray(), None
+                elif isinstance(event, Data):
+                    if target is not None:
+                        target.write(event.data)
+                    elif value is not None:
+                        value += event.data
+                    if not event.more_data:
+                        if value is not None:
+                            fields.setdefault(name, value.decode("utf-8", "replace"))
+                        name, value, target = None, None, None
+                event = decoder.next_event()
+        except ValueError as e:
+            raise HttpError(400, f"Invalid form data: {e}")
+        if not more:
+            break
+    if upload is not None:
+        upload.seek(0)
+    return fields, upload
+
+
+def _prepare(form, upload):
+    # parse + cache key: CPU work proportional to the item count, so kept off the event loop
+    name, address, items, tax_rate = invoice_from_form(form, upload)
+    etag = invoice_cache_key(name, address, items, tax_rate, invoice_renderer.watermark_path,
+                             invoice_renderer.renderer, invoice_renderer.layout)
+    return name, address, items, tax_rate, etag
+
+
+def wsgi_environ(scope, body, length):
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_PROTOCOL": "HTTP/" + scope.get("http_version", "1.1"),
+        "CONTENT_LENGTH": str(length),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+        "wsgi.input_terminated": True,
+    }
+    server = scope.get("server") or ("localhost", 80)
+    environ["SERVER_NAME"], environ["SERVER_PORT"] = server[0], str(server[1] or 80)
+    if scope.get("client"):
+        environ["REMOTE_ADDR"], environ["REMOTE_PORT"] = scope["client"][0], str(scope["client"][1])
+    for key, value in scope["headers"]:
+        key, value = key.decode("latin-1").upper().replace("-", "_"), value.decode("latin-1")
+        if key == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif key != "CONTENT_LENGTH":
+            key = "HTTP_" + key
+            environ[key] = environ[key] + "," + value if key in environ else value
+    return environ
+
+
+class InvoiceASGI:
+    """
+    ASGI application: POST /generate natively, everything else through the WSGI app.
+    render_pool: RenderPool used for /generate (started at lifespan startup when the
+                 server sends one, otherwise on the first render)
+    """
+
+    def __init__(self, wsgi_app, render_pool, wsgi_threads=WSGI_THREADS, max_body=MAX_BODY):
+        self.wsgi_app = wsgi_app
+        self.render_pool = render_pool
+        self.max_body = max_body
+        self.threads = ThreadPoolExecutor(max_workers=wsgi_threads, thread_name_prefix="wsgi")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] != "http":
+            return
+        elif scope["path"] == "/generate" and scope["method"] == "POST":
+            await self.generate(scope, receive, send)
+        else:
+            await self.call_wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.render_pool.start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.render_pool.shutdown(wait=False)
+                self.threads.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def generate(self, scope, receive, send):
+        timer = StageTimer()
+        body = None
+        try:
+            status, headers, body = await self._generate(scope, receive, timer)
+        except HttpError as e:
+            status, headers, body = e.status, e.headers, BytesIO(str(e).encode("utf-8"))
+            headers.append(("Content-Type", "text/plain; charset=utf-8"))
+        except Exception as e:
+            print("ERROR /generate:", e, file=sys.stderr)
+            traceback.print_exc()
+            status, body = 500, BytesIO(b"Server error while generating invoice.")
+            headers = [("Content-Type", "text/plain; charset=utf-8")]
+        try:
+            if status != 499:
+                await self._send_file(send, status, headers, body, timer)
+        finally:
+            if body is not None:
+                body.close()
+        METRICS.observe("/generate", status, perf_counter() - timer.started, timer)
+        if timer.stages:
+            log(timer.log_line("request", path="/generate", status=status))
+
+    async def _generate(self, scope, receive, timer):
+        """return: (status, headers, readable binary file with the body)"""
+        t0 = perf_counter()
+        form, upload = await read_form(scope, receive, "dummy_file", self.max_body)
+        try:
+            name, address, items, tax_rate, etag = await asyncio.to_thread(_prepare, form, upload)
+        except ValueError as e:
+            raise HttpError(400, str(e))
+        finally:
+            if upload is not None:
+                upload.close()
+        timer.add("parse", perf_counter() - t0)
+
+        headers = [("ETag", f'"{etag}"')]
+        if parse_etags(_header(scope, b"if-none-match")).contains(etag):
+            return 304, headers, BytesIO()
+
+        t0 = perf_counter()
+        pdf = pdf_cache.open(etag)
+        timer.add("cache", perf_counter() - t0)
+        if pdf is None:
+            t0 = perf_counter()
+            data = await self._render(name, address, items, tax_rate)
+            timer.add("render", perf_counter() - t0)
+            pdf = await asyncio.to_thread(pdf_cache.store, etag, BytesIO(data))
+
+        fname = _invoice_filename(name)  # letters, digits and _ only: nothing that could break the header
+        headers += [("Content-Type", "application/pdf"),
+                    ("Content-Disposition", f"attachment; filename=\"{fname}\"; filename*=UTF-8''{quote(fname)}")]
+        return 200, headers, pdf
+
+    async def _render(self, name, address, items, tax_rate):
+        """PDF bytes from the render pool; raises HttpError 503 when it is full or keeps breaking."""
+        for attempt in (1, 2):
+            try:
+                future = self.render_pool.submit(name, address, items, tax_rate)
+                return await asyncio.wrap_future(future)
+            except RenderPoolFull:
+                raise HttpError(503, "Server busy, try again shortly.", [("Retry-After", str(RETRY_AFTER))])
+            except BrokenProcessPool:
+                # a render process died (maybe rendering another request); the pool starts new ones
+                print("WARNING /generate: render process died, pool restarted", file=sys.stderr)
+        raise HttpError(503, "Renderer restarting, try again shortly.", [("Retry-After", str(RETRY_AFTER))])
+
+    @staticmethod
+    async def _send_file(send, status, headers, body, timer):
+        body.seek(0, os.SEEK_END)
+        length = body.tell()
+        body.seek(0)
+        headers = headers + [("Content-Length", str(length)), ("Server-Timing", timer.server_timing())]
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]})
+        sent = perf_counter()
+        while True:
+            chunk = body.read(CHUNK_SIZE)
+            more = body.tell() < length
+            await send({"type": "http.response.body", "body": chunk, "more_body": more})
+            if not more:
+                break
+        timer.add("send", perf_counter() - sent)
+
+    async def call_wsgi(self, scope, receive, send):
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        try:
+            try:
+                length = await read_body(receive, body, self.max_body)
+            except HttpError as e:
+                if e.status != 499:
+                    await send({"type": "http.response.start", "status": e.status,
+                                "headers": [(b"content-type", b"text/plain; charset=utf-8")]})
+                    await send({"type": "http.response.body", "body": str(e).encode("utf-8")})
+                return
+            environ = wsgi_environ(scope, body, length)
+            loop = asyncio.get_running_loop()
+
+            def deliver(message):
+                # called from the WSGI thread: hand one message to the server and wait until it is sent
+                asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+            await loop.run_in_executor(self.threads, self._run_wsgi, environ, deliver)
+        finally:
+            body.close()
+
+    def _run_wsgi(self, environ, deliver):
+        response = {}  # status and headers until they are sent
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response.get("sent"):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+            return write
+
+        def write(data, more_body=True):
+            if not response.get("sent"):
+                deliver({"type": "http.response.start", "status": response["status"], "headers": response["headers"]})
+                response["sent"] = True
+            if data or not more_body:
+                deliver({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in result:
+                write(chunk)
+            write(b"", more_body=False)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+
+app = InvoiceASGI(flask_app, RenderPool(RENDER_WORKERS, RENDER_QUEUE, renderer=invoice_renderer))
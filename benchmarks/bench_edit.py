@@ -0,0 +1,64 @@
+# benchmarks/bench_edit.py
+# Edit-and-re-export: render a long invoice, change one quantity, render it again.
+# Compares a renderer without the page cache against one with it, where only the
+# edited page and the totals page are redrawn, and checks both give the same PDF.
+#
+#   python benchmarks/bench_edit.py --rows 2300 --renderer fast
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from reportlab import rl_config  # noqa: E402
+from invoice_core import InvoiceRenderer  # noqa: E402
+from invoice_metrics import StageTimer  # noqa: E402
+from invoice_page_cache import PAGE_CACHE  # noqa: E402
+
+WATERMARK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "static", "watermark.png")
+
+
+def make_items(n):
+    return [{"desc": f"Item {i}", "qty": i % 7 + 1, "price": round(0.05 + (i % 400) * 1.37, 2)} for i in range(n)]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="re-render after a one-line edit, with and without the page cache")
+    ap.add_argument("--rows", type=int, default=2300, help="line items (2300 is about 100 pages)")
+    ap.add_argument("--renderer", default="table", choices=("table", "fast"))
+    ap.add_argument("--profile", default="default", choices=("default", "optimized"))
+    ap.add_argument("--edits", type=int, default=5, help="edit/re-render cycles, best is kept")
+    args = ap.parse_args()
+    rl_config.invariant = 1  # no timestamps or document ids, so PDFs can be compared byte for byte
+
+    items = make_items(args.rows)
+    engines = {cached: InvoiceRenderer(watermark_path=WATERMARK, renderer=args.renderer, profile=args.profile,
+                                       cache_pages=cached) for cached in (False, True)}
+    for engine in engines.values():
+        engine.render("Warm Up", "-", make_items(1))
+    PAGE_CACHE.clear()
+    for engine in engines.values():
+        engine.render("Bench Customer", "1 Main St", items, 8.25)  # the first export
+
+    best = {}
+    pdfs = {}
+    pages = {}
+    for n in range(args.edits):
+        items[(n * 997) % len(items)]["qty"] += 1  # one quantity, somewhere in the middle
+        for cached, engine in engines.items():
+            timer = StageTimer()
+            t0 = time.perf_counter()
+            pdfs[cached] = engine.render("Bench Customer", "1 Main St", items, 8.25, timings=timer)
+            elapsed = time.perf_counter() - t0
+            best[cached] = min(best.get(cached, elapsed), elapsed)
+            pages[cached] = (timer.counts["pages"], timer.counts.get("cached_pages", 0))
+
+    print(f"{args.rows} rows, {pages[False][0]} pages, {args.renderer} renderer, {args.profile} profile")
+    print(f"  re-render without page cache  {best[False]:.3f} s")
+    print(f"  re-render with page cache     {best[True]:.3f} s  ({pages[True][1]} pages reused,"
+          f" {best[False] / best[True]:.1f}x faster)")
+    print(f"  identical PDFs: {pdfs[False] == pdfs[True]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# benchmarks/bench_items.py
+# Memory held by an invoice's line items: a list of dicts (the old shape) vs a
+# list of LineItem records vs the columnar LineItems, built from the same parsed
+# values, plus the time to build each.
+#
+#   python benchmarks/bench_items.py --rows 1000 100000
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from invoice_items import LineItem, LineItems  # noqa: E402
+
+
+def make_rows(n):
+    # what a parser sees: one (desc, qty, price) per line, as text
+    return [(f"Item {i}", str(i % 7 + 1), f"{0.05 + (i % 400) * 1.37:.2f}") for i in range(n)]
+
+
+def as_dicts(rows):
+    return [{"desc": d, "qty": int(q), "price": float(p)} for d, q, p in rows]
+
+
+def as_records(rows):
+    return [LineItem.parse(d, q, p) for d, q, p in rows]
+
+
+def as_columns(rows):
+    return LineItems(rows)
+
+
+def measure(build, rows):
+    """return: (seconds to build, bytes still allocated by the result)"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        t0 = time.perf_counter()
+        result = build(rows)
+        elapsed = time.perf_counter() - t0
+        held = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del result
+    return elapsed, held
+
+
+def main():
+    ap = argparse.ArgumentParser(description="line item memory: dicts vs LineItem vs LineItems")
+    ap.add_argument("--rows", type=int, nargs="+", default=[1000, 100000])
+    args = ap.parse_args()
+
+    print(f"{'rows':>7} {'model':<16} {'seconds':>8} {'MB':>8} {'bytes/row':>10}")
+    for n in args.rows:
+        rows = make_rows(n)
+        for name, build in (("dicts", as_dicts), ("LineItem list", as_records), ("LineItems", as_columns)):
+            elapsed, held = measure(build, rows)
+            print(f"{n:>7} {name:<16} {elapsed:>8.3f} {held / (1024 * 1024):>8.2f} {held / n:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
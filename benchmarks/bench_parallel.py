@@ -0,0 +1,47 @@
+# benchmarks/bench_parallel.py
+# Invoices/sec of invoice_core.render_many() for a range of worker counts.
+#
+#   python benchmarks/bench_parallel.py --invoices 400 --items 50 --workers 1 2 4 8 16
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from invoice_core import render_many  # noqa: E402
+
+WATERMARK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "static", "watermark.png")
+
+
+def make_specs(n_invoices, n_items):
+    for n in range(n_invoices):
+        yield {
+            "customer_name": f"Customer {n}",
+            "customer_address": f"{n} Main St, Springfield",
+            "items": [{"desc": f"Item {i}", "qty": i % 7 + 1, "price": 10.5 + i} for i in range(n_items)],
+            "tax_rate": 8.25,
+        }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="render_many() throughput vs worker count")
+    ap.add_argument("--invoices", type=int, default=200)
+    ap.add_argument("--items", type=int, default=50)
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = ap.parse_args()
+
+    print(f"{args.invoices} invoices x {args.items} items, {os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'seconds':>9} {'inv/s':>9} {'speedup':>8}")
+    base = None
+    for workers in args.workers:
+        t0 = time.perf_counter()
+        count = sum(1 for _ in render_many(make_specs(args.invoices, args.items),
+                                           workers=workers, watermark_path=WATERMARK))
+        elapsed = time.perf_counter() - t0
+        rate = count / elapsed
+        base = base or rate
+        print(f"{workers:>8} {elapsed:>9.2f} {rate:>9.1f} {rate / base:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
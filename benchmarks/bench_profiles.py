@@ -0,0 +1,60 @@
+# benchmarks/bench_profiles.py
+# PDF size and render time of the "default" vs "optimized" output profile, on the
+# Dummy.txt sample and on synthetic invoices of the given sizes.
+#
+#   python benchmarks/bench_profiles.py --rows 5000 --renderer fast
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from invoice_core import PROFILES, InvoiceRenderer  # noqa: E402
+from invoice_parser import read_txt_invoice  # noqa: E402
+
+WATERMARK = os.path.join(ROOT, "static", "watermark.png")
+
+
+def make_items(n):
+    return [{"desc": f"Item {i}", "qty": i % 7 + 1, "price": round(0.05 + (i % 400) * 1.37, 2)} for i in range(n)]
+
+
+def best_of(repeat, fn):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    ap = argparse.ArgumentParser(description="default vs optimized output profile")
+    ap.add_argument("--rows", type=int, nargs="+", default=[5000], help="synthetic invoices besides Dummy.txt")
+    ap.add_argument("--renderer", default="table", choices=("table", "fast"))
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    with open(os.path.join(ROOT, "Dummy.txt"), "rb") as f:
+        name, address, items, errors = read_txt_invoice(f)
+    cases = [("Dummy.txt", name, address, items)]
+    cases += [(f"x{n}", "Bench Customer", "1 Main St, Springfield", make_items(n)) for n in args.rows]
+    engines = {profile: InvoiceRenderer(watermark_path=WATERMARK, renderer=args.renderer, profile=profile)
+               for profile in PROFILES}
+    for engine in engines.values():
+        engine.render("Warm Up", "-", make_items(1))  # watermark encodings, fonts
+
+    print(f"{'invoice':<10} {'profile':<10} {'seconds':>8} {'KB':>9} {'size':>7} {'time':>7}")
+    for label, name, address, items in cases:
+        base = None
+        for profile, engine in engines.items():
+            seconds, pdf = best_of(args.repeat, lambda: engine.render(name, address, items, 8.25))
+            base = base or (seconds, len(pdf))
+            print(f"{label:<10} {profile:<10} {seconds:>8.3f} {len(pdf) / 1024:>9.1f}"
+                  f" {len(pdf) / base[1] - 1:>+7.0%} {seconds / base[0] - 1:>+7.0%}")
+
+
+if __name__ == "__main__":
+    main()
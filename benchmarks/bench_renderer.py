@@ -0,0 +1,50 @@
+# benchmarks/bench_renderer.py
+# generate_invoice_pdf() wall time with the platypus "table" renderer vs the "fast" direct-draw one.
+#
+#   python benchmarks/bench_renderer.py --rows 50 1000 10000
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from invoice_core import generate_invoice_pdf  # noqa: E402
+
+WATERMARK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "static", "watermark.png")
+
+
+def make_items(n):
+    return [{"desc": f"Item {i}", "qty": i % 7 + 1, "price": 10.5 + i} for i in range(n)]
+
+
+def best_of(repeat, fn):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    ap = argparse.ArgumentParser(description="table vs fast renderer")
+    ap.add_argument("--rows", type=int, nargs="+", default=[50, 1000, 10000])
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    print(f"{'rows':>7} {'table s':>9} {'fast s':>9} {'speedup':>8} {'table KB':>9} {'fast KB':>9}")
+    for n in args.rows:
+        items = make_items(n)
+        times = {}
+        sizes = {}
+        for renderer in ("table", "fast"):
+            times[renderer], pdf = best_of(args.repeat, lambda: generate_invoice_pdf(
+                "Bench Customer", "1 Main St", items, 8.25, WATERMARK, renderer=renderer))
+            sizes[renderer] = len(pdf) / 1024
+        print(f"{n:>7} {times['table']:>9.3f} {times['fast']:>9.3f} {times['table'] / times['fast']:>7.2f}x"
+              f" {sizes['table']:>9.1f} {sizes['fast']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# benchmarks/bench_startup.py
+# Import cost of the web app and the desktop client, measured in fresh interpreters
+# with -X importtime. Fails if the PDF machinery is imported eagerly again.
+#
+#   python benchmarks/bench_startup.py --module app Invoice --top 10
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# loaded lazily by invoice_core.load_reportlab(); reportlab.lib.pagesizes is cheap and fine
+HEAVY = ("reportlab.pdfgen", "reportlab.platypus", "reportlab.lib.utils", "PIL")
+
+
+def import_times(module):
+    """return: [(module name, nesting depth, self us, cumulative us)] in import order"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode:
+        raise SystemExit(proc.stderr)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description="import time of the web app and desktop client")
+    ap.add_argument("--module", nargs="+", default=["app", "Invoice"])
+    ap.add_argument("--top", type=int, default=8)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    failed = False
+    for module in args.module:
+        runs = [import_times(module) for _ in range(args.repeat)]
+        best = min(runs, key=lambda rows: sum(r[2] for r in rows))
+        total = sum(r[2] for r in best)
+        print(f"{module}: {total / 1000:.1f} ms total, {len(best)} modules")
+        # direct imports of the module itself (depth 1), biggest first
+        direct = [r for r in best if r[1] == 1]
+        for name, _, _, cumulative in sorted(direct, key=lambda r: -r[3])[:args.top]:
+            print(f"  {cumulative / 1000:>8.1f} ms  {name}")
+        eager = sorted({r[0] for r in best if r[0].startswith(HEAVY)})
+        if eager:
+            failed = True
+            print(f"  imported eagerly: {', '.join(eager[:5])}{' ...' if len(eager) > 5 else ''}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
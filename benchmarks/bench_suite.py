@@ -0,0 +1,202 @@
+# benchmarks/bench_suite.py
+# Throughput/regression suite: generate_invoice_pdf() on synthetic invoices of
+# increasing size, and end-to-end POST /generate through the Flask test client
+# for each input mode (csv, json, file upload). Results are written as JSON, and
+# a later run can be compared against a saved baseline.
+#
+#   python benchmarks/bench_suite.py --save benchmarks/baselines/local.json
+#   python benchmarks/bench_suite.py --compare benchmarks/baselines/local.json --threshold 0.2
+#   python benchmarks/bench_suite.py --rows 1 50 1000 --requests 50 --repeat 5
+#
+# Exit status is 1 when --compare finds a regression. The full default run takes a
+# few minutes, most of it the 100k-line case under tracemalloc; benchmarks/baselines/
+# holds the numbers from a one-CPU machine, so re-save a baseline on your own box first.
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from invoice_core import generate_invoice_pdf  # noqa: E402
+
+WATERMARK = os.path.join(ROOT, "static", "watermark.png")
+ROWS = [1, 50, 1000, 10000, 100000]
+REQUEST_ROWS = [50, 1000]
+MODES = ("csv", "json", "upload")
+# metrics compared against a baseline; all of them are "lower is better"
+COMPARED = ("seconds", "peak_mb", "bytes")
+# differences below this are timer noise on millisecond cases, whatever the percentage
+NOISE_SECONDS = 0.002
+
+
+def make_items(n):
+    return [{"desc": f"Item {i}", "qty": i % 7 + 1, "price": round(0.05 + (i % 400) * 1.37, 2)} for i in range(n)]
+
+
+def best_of(repeat, fn):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def peak_traced(fn):
+    """return: peak Python heap allocated while fn runs, in MB (tracemalloc; slows fn down, so timed separately)"""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+
+
+def bench_render(n, repeat, renderer):
+    items = make_items(n)
+    pages = []
+
+    def render():
+        return generate_invoice_pdf("Bench Customer", "1 Main St, Springfield", items, 8.25, WATERMARK,
+                                    renderer=renderer, progress=lambda done, total: pages.append(total))
+
+    # the biggest invoices take long enough that one run is already a stable number
+    seconds, pdf = best_of(1 if n >= 10000 else repeat, render)
+    return {
+        "seconds": round(seconds, 4),
+        "peak_mb": round(peak_traced(render), 2),
+        "bytes": len(pdf),
+        "pages": pages[-1],
+        "pages_per_s": round(pages[-1] / seconds, 1),
+    }
+
+
+def request_data(mode, items, n):
+    # a different customer per request and case, so the PDF cache never answers
+    name, address = f"Bench Customer {mode} {len(items)} #{n}", "1 Main St, Springfield"
+    if mode == "csv":
+        csv = "\n".join(f"{it['desc']}, {it['qty']}, {it['price']}" for it in items)
+        return {"customer_name": name, "customer_address": address, "items_mode": "csv", "items_csv": csv,
+                "tax_rate": "8.25"}
+    if mode == "json":
+        return {"customer_name": name, "customer_address": address, "items_mode": "json",
+                "items_json": json.dumps(items), "tax_rate": "8.25"}
+    txt = "\n".join([f"Customer Name: {name}", f"Customer Address: {address}", "Items:"] +
+                    [f"{it['desc']}, {it['qty']}, {it['price']}" for it in items])
+    return {"tax_rate": "8.25", "dummy_file": (BytesIO(txt.encode("utf-8")), "invoice.txt")}
+
+
+def bench_requests(client, mode, n_items, n_requests):
+    items = make_items(n_items)
+    latencies = []
+    size = 0
+    for n in range(n_requests):
+        data = request_data(mode, items, n)
+        t0 = time.perf_counter()
+        resp = client.post("/generate", data=data, content_type="multipart/form-data")
+        body = resp.get_data()
+        latencies.append(time.perf_counter() - t0)
+        if resp.status_code != 200:
+            raise SystemExit(f"/generate {mode} x{n_items}: HTTP {resp.status_code} {body[:200]!r}")
+        size = len(body)
+    latencies.sort()
+    return {
+        "seconds": round(latencies[len(latencies) // 2], 4),
+        "p95_seconds": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 4),
+        "bytes": size,
+        "requests": n_requests,
+    }
+
+
+def run(args):
+    results = {}
+    print(f"{'case':<28} {'seconds':>9} {'peak MB':>8} {'KB':>9} {'pages/s':>9}")
+    for n in args.rows:
+        r = results[f"render/{args.renderer}/{n}"] = bench_render(n, args.repeat, args.renderer)
+        print(f"{'render ' + args.renderer + ' x' + str(n):<28} {r['seconds']:>9.3f} {r['peak_mb']:>8.1f}"
+              f" {r['bytes'] / 1024:>9.1f} {r['pages_per_s']:>9.1f}")
+
+    if args.requests:
+        # isolated cache/job/store locations, so the suite never touches (or is helped by) real data
+        scratch = tempfile.mkdtemp(prefix="invoice_bench_")
+        os.environ["INVOICE_CACHE_DIR"] = os.path.join(scratch, "cache")
+        os.environ["INVOICE_JOBS_DIR"] = os.path.join(scratch, "jobs")
+        os.environ["INVOICE_STORE_PATH"] = os.path.join(scratch, "invoices.sqlite3")
+        cwd = os.getcwd()
+        os.chdir(ROOT)
+        try:
+            from app import app
+        finally:
+            os.chdir(cwd)
+        client = app.test_client()
+        client.post("/generate", data=request_data("csv", make_items(1), -1))  # watermark load, first-request setup
+        for n_items in args.request_rows:
+            for mode in MODES:
+                r = results[f"generate/{mode}/{n_items}"] = bench_requests(client, mode, n_items, args.requests)
+                print(f"{'/generate ' + mode + ' x' + str(n_items):<28} {r['seconds']:>9.3f} {'':>8}"
+                      f" {r['bytes'] / 1024:>9.1f}   p95 {r['p95_seconds']:.3f}")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    return: list of (case, metric, baseline value, new value) that got worse by more than threshold
+    Cases missing from either side are skipped, and so are timing differences under NOISE_SECONDS.
+    """
+    regressions = []
+    for case, base in baseline.items():
+        new = results.get(case)
+        if new is None:
+            continue
+        for metric in COMPARED:
+            if metric not in base or metric not in new or not base[metric]:
+                continue
+            if metric == "seconds" and new[metric] - base[metric] < NOISE_SECONDS:
+                continue
+            if new[metric] > base[metric] * (1 + threshold):
+                regressions.append((case, metric, base[metric], new[metric]))
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="invoice generation benchmark and regression suite")
+    ap.add_argument("--rows", type=int, nargs="+", default=ROWS, help="line items per rendered invoice")
+    ap.add_argument("--renderer", default="table", choices=("table", "fast"))
+    ap.add_argument("--repeat", type=int, default=3, help="runs per render case, best is kept")
+    ap.add_argument("--requests", type=int, default=20, help="POST /generate per case (0 skips them)")
+    ap.add_argument("--request-rows", type=int, nargs="+", default=REQUEST_ROWS)
+    ap.add_argument("--save", metavar="JSON", help="write the results here (e.g. as a new baseline)")
+    ap.add_argument("--compare", metavar="JSON", help="baseline to compare against")
+    ap.add_argument("--threshold", type=float, default=0.15,
+                    help="allowed slowdown/growth before it counts as a regression (default: %(default)s)")
+    args = ap.parse_args()
+
+    results = run(args)
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+                       "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}, f, indent=2)
+            f.write("\n")
+        print(f"saved {len(results)} cases to {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for case, metric, old, new in regressions:
+            print(f"REGRESSION {case} {metric}: {old} -> {new} (+{(new / old - 1) * 100:.0f}%)")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions beyond {args.threshold * 100:.0f}% against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# benchmarks/bench_totals.py
+# Old per-dict float loop vs invoice_totals (from dicts, and from ready-made columns).
+#
+#   python benchmarks/bench_totals.py --rows 1000 100000
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from invoice_totals import compute_totals, item_columns, totals_for_items  # noqa: E402
+
+
+def make_items(n):
+    return [{"desc": f"Item {i}", "qty": i % 7 + 1, "price": round(0.05 + (i % 400) * 1.37, 2)} for i in range(n)]
+
+
+def float_loop(items, tax_rate):
+    # what generate_invoice_pdf did before invoice_totals
+    subtotal = 0.0
+    for it in items:
+        line_total = float(it['qty']) * float(it['price'])
+        subtotal += line_total
+    tax_amount = subtotal * (float(tax_rate) / 100.0)
+    return subtotal, tax_amount, subtotal + tax_amount
+
+
+def best_of(repeat, fn):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    ap = argparse.ArgumentParser(description="float loop vs integer-cent totals engine")
+    ap.add_argument("--rows", type=int, nargs="+", default=[1000, 100000])
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    tax_rate = 8.25
+    print(f"{'rows':>7} {'float ms':>9} {'dicts ms':>9} {'columns ms':>11}  penny drift (float - exact)")
+    for n in args.rows:
+        items = make_items(n)
+        columns = item_columns(items)
+        t_float, (f_sub, _, _) = best_of(args.repeat, lambda: float_loop(items, tax_rate))
+        t_dicts, totals = best_of(args.repeat, lambda: totals_for_items(items, tax_rate))
+        t_cols, _ = best_of(args.repeat, lambda: compute_totals(*columns, tax_rate))
+        drift = f_sub - totals.subtotal / 100
+        print(f"{n:>7} {t_float * 1e3:>9.2f} {t_dicts * 1e3:>9.2f} {t_cols * 1e3:>11.2f}  {drift:+.10f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# benchmarks/load_generate.py
+# Load test for POST /generate: sustained requests/sec and latency percentiles,
+# optionally with slow clients that trickle their upload and hold a connection.
+# Point it at a running server, or let it start the sync and async deployments
+# one after the other and compare them:
+#
+#   python benchmarks/load_generate.py --url http://127.0.0.1:8080 --concurrency 16 --duration 20
+#   python benchmarks/load_generate.py --spawn sync async --slow-clients 8 --workers 2
+#
+# sync is `gunicorn app:app` (sync workers), async is `uvicorn asgi:app`. Every
+# request is for a different customer, so the PDF cache never answers.
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from urllib.parse import urlencode, urlsplit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def form_body(n, items):
+    csv = "\n".join(f"Item {i}, {i % 7 + 1}, {10.5 + i}" for i in range(items))
+    return urlencode({"customer_name": f"Load Customer {n}", "customer_address": "1 Main St, Springfield",
+                      "items_mode": "csv", "items_csv": csv, "tax_rate": "8.25"}).encode("ascii")
+
+
+async def post(host, port, body, trickle=0.0):
+    """
+    One POST /generate on its own connection; with trickle > 0 the body is sent
+    in pieces spread over that many seconds. return: (status, seconds)
+    """
+    t0 = time.perf_counter()
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(f"POST /generate HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n"
+                     f"Content-Type: application/x-www-form-urlencoded\r\nContent-Length: {len(body)}\r\n\r\n"
+                     .encode("ascii"))
+        if trickle:
+            pieces = 10
+            step = -(-len(body) // pieces)
+            for i in range(0, len(body), step):
+                writer.write(body[i:i + step])
+                await writer.drain()
+                await asyncio.sleep(trickle / pieces)
+        else:
+            writer.write(body)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        while await reader.read(65536):
+            pass
+    finally:
+        writer.close()
+    return status, time.perf_counter() - t0
+
+
+async def run_load(url, concurrency, duration, items, slow_clients, slow_seconds):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    stop = time.perf_counter() + duration
+    latencies, statuses = [], Counter()
+    counter = iter(range(10 ** 9))
+
+    async def fast():
+        while time.perf_counter() < stop:
+            try:
+                status, seconds = await post(host, port, form_body(next(counter), items))
+            except OSError:
+                status, seconds = "conn error", 0.0
+            statuses[status] += 1
+            if status == 200:
+                latencies.append(seconds)
+
+    async def slow():
+        while time.perf_counter() < stop:
+            try:
+                await post(host, port, form_body(next(counter), items), trickle=slow_seconds)
+            except OSError:
+                pass
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[fast() for _ in range(concurrency)], *[slow() for _ in range(slow_clients)])
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else float("nan")
+
+    return {"ok": len(latencies), "rps": len(latencies) / elapsed, "p50_ms": pct(0.50), "p99_ms": pct(0.99),
+            "statuses": dict(statuses)}
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"server on port {port} did not come up")
+
+
+def spawn(mode, port, workers):
+    scratch = tempfile.mkdtemp(prefix="invoice_load_")
+    env = dict(os.environ, INVOICE_CACHE_DIR=os.path.join(scratch, "cache"),
+               INVOICE_JOBS_DIR=os.path.join(scratch, "jobs"),
+               INVOICE_STORE_PATH=os.path.join(scratch, "invoices.sqlite3"),
+               INVOICE_RENDER_WORKERS=str(workers))
+    if mode == "sync":
+        cmd = [sys.executable, "-m", "gunicorn", "app:app", "-b", f"127.0.0.1:{port}", "-w", str(workers)]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(port), "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(port)
+    time.sleep(2)  # let the workers finish warming up
+    return proc
+
+
+def report(name, r):
+    statuses = ", ".join(f"{k}: {v}" for k, v in sorted(r["statuses"].items(), key=str))
+    print(f"{name:<8} {r['ok']:>6} {r['rps']:>8.1f} {r['p50_ms']:>9.0f} {r['p99_ms']:>9.0f}   {statuses}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="POST /generate load test")
+    ap.add_argument("--url", help="server to test, e.g. http://127.0.0.1:8080")
+    ap.add_argument("--spawn", nargs="+", choices=("sync", "async"), help="start these deployments and test each")
+    ap.add_argument("--workers", type=int, default=2, help="sync workers / async render processes when spawning")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--concurrency", type=int, default=8, help="clients sending requests back to back")
+    ap.add_argument("--duration", type=float, default=15, help="seconds")
+    ap.add_argument("--items", type=int, default=20, help="line items per invoice")
+    ap.add_argument("--slow-clients", type=int, default=0, help="extra clients that trickle their uploads")
+    ap.add_argument("--slow-seconds", type=float, default=5, help="how long each slow upload takes")
+    args = ap.parse_args()
+    if not args.url and not args.spawn:
+        ap.error("give --url or --spawn")
+
+    print(f"{args.concurrency} clients, {args.slow_clients} slow clients, {args.items} items, {args.duration:.0f} s")
+    print(f"{'server':<8} {'ok':>6} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9}   statuses")
+    if args.url:
+        report("url", asyncio.run(run_load(args.url, args.concurrency, args.duration, args.items,
+                                           args.slow_clients, args.slow_seconds)))
+    for mode in args.spawn or ():
+        proc = spawn(mode, args.port, args.workers)
+        try:
+            report(mode, asyncio.run(run_load(f"http://127.0.0.1:{args.port}", args.concurrency, args.duration,
+                                              args.items, args.slow_clients, args.slow_seconds)))
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+# gunicorn.conf.py
+# Picked up automatically by `gunicorn app:app` (Procfile / render.yaml).
+import os
+import threading
+
+WATERMARK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "watermark.png")
+
+
+def post_fork(server, worker):
+    # Load ReportLab, the watermark and font metrics in the background right after
+    # the fork: the worker starts serving immediately and the first render is warm.
+    import invoice_core
+    threading.Thread(target=invoice_core.warm_up, args=(WATERMARK,), daemon=True).start()
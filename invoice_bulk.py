@@ -0,0 +1,292 @@
+# invoice_bulk.py
+# Bulk input: many invoices in one file, read as a stream so an ERP export of
+# tens of thousands of invoices never has to fit in memory. Two layouts:
+#
+# CSV, one row per line item, the rows of an invoice next to each other; the
+# customer columns (and tax_rate) only need filling in on an invoice's first row:
+#
+#   invoice_id,customer_name,customer_address,tax_rate,desc,qty,price
+#   INV-1001,John Doe,"123 Main St, Springfield",8.25,Base Cabinet,2,175.00
+#   INV-1001,,,,Wall Cabinet,3,120.00
+#   INV-1002,Jane Roe,9 Elm St,0,Countertop,1,300
+#
+# NDJSON, one invoice object per line, as for POST /generate/batch:
+#
+#   {"invoice_id": "INV-1001", "customer_name": "John Doe", "customer_address": "...",
+#    "tax_rate": 8.25, "items": [{"desc": "Base Cabinet", "qty": 2, "price": 175.0}]}
+#
+# Command line: render every invoice of such a file into a directory, one PDF each,
+# with at most a few invoices in memory at a time:
+#
+#   python -m invoice_bulk invoices.csv --out pdfs --workers 4
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import sys
+import time
+from collections import namedtuple
+
+from invoice_items import LineItem, LineItems
+from invoice_parser import ParseError, decode_line, format_errors
+from invoice_totals import to_tax_rate
+
+FORMATS = ("csv", "ndjson")
+CSV_COLUMNS = ("invoice_id", "customer_name", "customer_address", "tax_rate", "desc", "qty", "price")
+CSV_REQUIRED = ("invoice_id", "desc", "qty", "price")
+
+# One invoice of a bulk file. line_no is the (1-based) line it starts on;
+# _asdict() is a spec for generate_invoices_batch / render_many.
+BulkInvoice = namedtuple("BulkInvoice", "invoice_id line_no customer_name customer_address items tax_rate")
+
+
+def detect_format(path):
+    """"csv" or "ndjson" from the file extension; raises ValueError for anything else."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return "csv"
+    if ext in (".ndjson", ".jsonl", ".json"):
+        return "ndjson"
+    raise ValueError(f"Cannot tell the bulk format of {path!r}; expected .csv or .ndjson")
+
+
+class BulkInvoiceReader:
+    """
+    Iterate over a binary stream of bulk invoices (fmt: "csv" or "ndjson"),
+    yielding one validated BulkInvoice at a time; only the invoice being read is
+    held in memory. Quantities, prices and tax rates are checked as their row is
+    read. An invoice with any bad row is skipped as a whole and its problems are
+    collected in errors (ParseError) instead of stopping the run.
+    A CSV invoice whose rows are split up (its id comes back later) has been
+    yielded, incomplete, by the time that is seen: its id goes into rejected and
+    the caller must drop what it made of it (render_bulk deletes the PDF,
+    POST /generate/batch fails on any error).
+    raises ValueError straight away when the CSV header lacks a required column
+    """
+
+    def __init__(self, stream, fmt="csv"):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown bulk format: {fmt!r}")
+        self.stream = stream
+        self.fmt = fmt
+        self.errors = []
+        self.skipped = 0
+        self.rejected = set()  # ids of CSV invoices yielded before their rows turned out split up
+        self._seen = set()  # invoice ids, to catch repeated or split-up invoices
+
+    def __iter__(self):
+        return self._read_csv() if self.fmt == "csv" else self._read_ndjson()
+
+    def _skip(self, line_no, message, text):
+        self.errors.append(ParseError(line_no, message, text))
+        self.skipped += 1
+
+    def _invoice_id(self, invoice_id, line_no, text):
+        """invoice_id if it has not been used before, else None (and an error)."""
+        if invoice_id in self._seen:
+            self.errors.append(ParseError(line_no, f"invoice {invoice_id}: id used more than once", text))
+            return None
+        self._seen.add(invoice_id)
+        return invoice_id
+
+    def _finish(self, invoice, line_no, text):
+        """invoice if it is complete, else None (and an error)."""
+        if not invoice.customer_name or not invoice.customer_address or not invoice.items:
+            self._skip(line_no, f"invoice {invoice.invoice_id}: missing customer info or items", text)
+            return None
+        return invoice
+
+    def _read_ndjson(self):
+        for line_no, raw in enumerate(self.stream, 1):
+            line = (decode_line(raw) if isinstance(raw, bytes) else raw).strip()
+            if not line:
+                continue
+            try:
+                spec = json.loads(line)
+            except json.JSONDecodeError:
+                self._skip(line_no, "invalid JSON", line)
+                continue
+            if not isinstance(spec, dict):
+                self._skip(line_no, "expected an invoice object", line)
+                continue
+            invoice_id = str(spec.get("invoice_id") or spec.get("id") or line_no)
+            text = line[:200]
+            if self._invoice_id(invoice_id, line_no, text) is None:
+                self.skipped += 1
+                continue
+            try:
+                items = spec.get("items") or []
+                if not isinstance(items, list):
+                    raise ValueError("items must be a list")
+                items = LineItems(items)
+                tax_rate = to_tax_rate(spec.get("tax_rate"))
+            except (TypeError, ValueError) as e:
+                self._skip(line_no, f"invoice {invoice_id}: {e}", text)
+                continue
+            invoice = self._finish(BulkInvoice(invoice_id, line_no, str(spec.get("customer_name") or "").strip(),
+                                               str(spec.get("customer_address") or "").strip(), items, tax_rate),
+                                   line_no, text)
+            if invoice is not None:
+                yield invoice
+
+    def _read_csv(self):
+        text_stream = self.stream
+        if not isinstance(text_stream, io.TextIOBase):
+            text_stream = io.TextIOWrapper(self.stream, encoding="utf-8-sig", errors="replace", newline="")
+        reader = csv.reader(text_stream)
+        header = [name.strip().lower() for name in next(reader, [])]
+        missing = [name for name in CSV_REQUIRED if name not in header]
+        if missing:
+            raise ValueError(f"CSV header is missing column(s): {', '.join(missing)}")
+        col = {name: header.index(name) for name in CSV_COLUMNS if name in header}
+        width = len(header)
+        current_id = first_text = None
+        current = None  # BulkInvoice being collected; None while skipping the rest of current_id's rows
+        for row in reader:
+            line_no = reader.line_num
+            if not any(cell.strip() for cell in row):
+                continue
+            text = ",".join(row)
+            if len(row) < width:
+                row += [""] * (width - len(row))
+            invoice_id = row[col["invoice_id"]].strip()
+            if current_id is None or invoice_id != current_id:
+                if current is not None:
+                    invoice = self._finish(current, current.line_no, first_text)
+                    if invoice is not None:
+                        yield invoice
+                current_id, current, first_text = invoice_id, None, text
+                if not invoice_id:
+                    self._skip(line_no, "missing invoice_id", text)
+                    continue
+                if invoice_id in self._seen:
+                    # the invoice was already yielded without these rows
+                    self.errors.append(ParseError(line_no, f"invoice {invoice_id}: rows are not next to each other,"
+                                                           " the whole invoice is rejected", text))
+                    if invoice_id not in self.rejected:
+                        self.rejected.add(invoice_id)
+                        self.skipped += 1
+                    continue
+                self._seen.add(invoice_id)
+                tax_rate = row[col["tax_rate"]].strip() if "tax_rate" in col else ""
+                try:
+                    tax_rate = to_tax_rate(tax_rate)
+                except ValueError:
+                    self._skip(line_no, f"invoice {invoice_id}: invalid tax_rate {tax_rate!r}", text)
+                    continue
+                current = BulkInvoice(invoice_id, line_no,
+                                      row[col["customer_name"]].strip() if "customer_name" in col else "",
+                                      row[col["customer_address"]].strip() if "customer_address" in col else "",
+                                      LineItems(), tax_rate)
+            if current is None:
+                continue
+            desc, qty, price = row[col["desc"]].strip(), row[col["qty"]].strip(), row[col["price"]].strip()
+            try:
+                if not desc:
+                    raise ValueError("empty description")
+                current.items.add(LineItem.parse(desc, qty, price))
+            except ValueError as e:
+                self._skip(line_no, f"invoice {invoice_id}: {e}", text)
+                current = None
+        if current is not None:
+            invoice = self._finish(current, current.line_no, first_text)
+            if invoice is not None:
+                yield invoice
+
+
+def read_bulk_invoices(path, fmt=None):
+    """
+    Yield the valid BulkInvoice records of the file at path (format from its
+    extension unless fmt is given). Errors are dropped, and a split-up CSV
+    invoice comes out incomplete; use BulkInvoiceReader when they matter.
+    """
+    with open(path, "rb") as f:
+        yield from BulkInvoiceReader(f, fmt or detect_format(path))
+
+
+def bulk_filename(invoice_id):
+    """File name for an invoice's PDF: its id with anything but letters, digits, - _ . replaced."""
+    return re.sub(r"[^A-Za-z0-9._-]", "_", invoice_id).lstrip(".") + ".pdf"
+
+
+def render_bulk(path, out_dir, fmt=None, workers=1, renderer="table", watermark_path=None, max_pending=None):
+    """
+    Render every valid invoice of a bulk file into out_dir as <invoice_id>.pdf.
+    Invoices are read, rendered and written one at a time (workers=1) or with
+    at most max_pending in flight across a render_many() process pool. The PDF
+    of an invoice the reader rejects afterwards (split-up CSV rows) is deleted,
+    and an invoice whose file name is taken by another id is skipped.
+    return: (number of PDFs written, the BulkInvoiceReader with its errors and skipped count)
+    """
+    from invoice_core import render_many
+
+    os.makedirs(out_dir, exist_ok=True)
+    names = {}    # render_many index -> (invoice id, file name), for the invoices in flight
+    used = {}     # file name -> invoice id, to catch two ids with the same file name
+    written = {}  # invoice id -> path of its PDF
+
+    def specs(invoices):
+        n = 0
+        for invoice in invoices:
+            name = bulk_filename(invoice.invoice_id)
+            if name in used:
+                reader.errors.append(ParseError(invoice.line_no, f"invoice {invoice.invoice_id}: same file name"
+                                                                 f" {name} as invoice {used[name]}",
+                                                invoice.invoice_id))
+                reader.skipped += 1
+                continue
+            used[name] = invoice.invoice_id
+            names[n] = (invoice.invoice_id, name)
+            n += 1
+            yield invoice._asdict()
+
+    with open(path, "rb") as f:
+        reader = BulkInvoiceReader(f, fmt or detect_format(path))
+        for n, pdf in render_many(specs(reader), workers=workers, watermark_path=watermark_path,
+                                  max_pending=max_pending, renderer=renderer):
+            invoice_id, name = names.pop(n)
+            if invoice_id in reader.rejected:
+                continue
+            target = os.path.join(out_dir, name)
+            with open(target + ".tmp", "wb") as out:
+                out.write(pdf)
+            os.replace(target + ".tmp", target)
+            written[invoice_id] = target
+    for invoice_id in reader.rejected & written.keys():
+        # written before the rest of its rows turned up: an incomplete invoice
+        os.remove(written.pop(invoice_id))
+    return len(written), reader
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m invoice_bulk",
+                                 description="Render every invoice of a bulk CSV/NDJSON file to its own PDF.")
+    ap.add_argument("input", help="bulk file (.csv, .ndjson or .jsonl)")
+    ap.add_argument("-o", "--out", default="invoices", help="output directory (default: %(default)s)")
+    ap.add_argument("--format", choices=FORMATS, help="input format, if the extension does not tell")
+    ap.add_argument("-w", "--workers", type=int, default=1, help="render processes (default: %(default)s)")
+    ap.add_argument("--renderer", default="table", choices=("table", "fast"))
+    ap.add_argument("--watermark", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                        "static", "watermark.png"),
+                    help="watermark image, '' for none")
+    args = ap.parse_args(argv)
+
+    t0 = time.perf_counter()
+    try:
+        written, reader = render_bulk(args.input, args.out, args.format, args.workers, args.renderer,
+                                      args.watermark or None)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    elapsed = time.perf_counter() - t0
+    if reader.errors:
+        print(format_errors(reader.errors, limit=50), file=sys.stderr)
+    print(f"{written} invoices written to {args.out}, {reader.skipped} skipped, "
+          f"{elapsed:.1f} s ({written / elapsed if elapsed else 0:.1f} invoices/s)")
+    return 1 if reader.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
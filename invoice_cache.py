@@ -0,0 +1,167 @@
+# invoice_cache.py
+# Content-addressed cache of rendered invoice PDFs: a small in-memory LRU in
+# front of a size-bounded directory that all workers of a host can share.
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from invoice_core import RENDERER_VERSION, watermark_digest
+from invoice_items import LineItems
+
+DEFAULT_DIR = os.environ.get("INVOICE_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "invoice_pdf_cache")
+DEFAULT_MAX_DISK = int(os.environ.get("INVOICE_CACHE_MAX_MB", "512")) * 1024 * 1024
+DEFAULT_MAX_MEMORY = 64 * 1024 * 1024
+# bigger PDFs are only kept on disk
+DEFAULT_MAX_MEMORY_ITEM = 1024 * 1024
+
+
+def invoice_cache_key(customer_name, customer_address, items, tax_rate=0.0, watermark_path=None, renderer="table",
+                      layout=None):
+    """
+    sha256 hex of everything that determines the rendered PDF. Values are
+    canonicalised the way they are rendered, so 10.5 and "10.50" hash the same.
+    layout: InvoiceRenderer.layout when branding/geometry are not the defaults
+    raises ValueError for items that would not render
+    """
+    items = LineItems.coerce(items)
+    canonical = {
+        "v": RENDERER_VERSION,
+        "renderer": renderer,
+        "name": customer_name,
+        "address": customer_address,
+        "items": [[desc, str(qty), price] for desc, qty, price in zip(items.descs, items.qtys, items.prices)],
+        "tax": repr(float(tax_rate)),
+        "wm": watermark_digest(watermark_path),
+    }
+    if layout is not None:
+        canonical["layout"] = layout
+    blob = json.dumps(canonical, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class PdfCache:
+    """
+    open(key) -> readable binary file or None; store(key, fileobj) -> readable binary file.
+    Disk entries are written atomically, so several processes can share the directory.
+    Least recently used entries are evicted from memory and disk once over budget.
+    """
+
+    def __init__(self, directory=DEFAULT_DIR, max_disk_bytes=DEFAULT_MAX_DISK,
+                 max_memory_bytes=DEFAULT_MAX_MEMORY, max_memory_item=DEFAULT_MAX_MEMORY_ITEM):
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self.max_memory_item = max_memory_item
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> bytes, oldest first
+        self._memory_bytes = 0
+        self._disk_bytes = None  # estimate, refreshed by _evict_disk
+        self.hits = self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".pdf")
+
+    def open(self, key):
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return BytesIO(data)
+        if self.directory:
+            path = self._path(key)
+            try:
+                f = open(path, "rb")
+            except OSError:
+                pass
+            else:
+                try:
+                    os.utime(path)  # mark as recently used for eviction
+                except OSError:
+                    pass
+                with self._lock:
+                    self.hits += 1
+                return f
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def store(self, key, fileobj):
+        """Copy fileobj (read from its current position) into the cache and close it."""
+        with fileobj:
+            if not self.directory:
+                data = fileobj.read()
+                self._remember(key, data)
+                return BytesIO(data)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    shutil.copyfileobj(fileobj, out)
+                size = os.path.getsize(tmp)
+                os.replace(tmp, self._path(key))
+            except BaseException:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+                raise
+        if size <= self.max_memory_item:
+            with open(self._path(key), "rb") as f:
+                self._remember(key, f.read())
+        self._account_disk(size)
+        return self.open(key)
+
+    def _remember(self, key, data):
+        if len(data) > self.max_memory_item:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= len(old)
+            self._memory[key] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.max_memory_bytes and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def _account_disk(self, size):
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += size
+                if self._disk_bytes <= self.max_disk_bytes:
+                    return
+        self._evict_disk()
+
+    def _evict_disk(self):
+        # other workers write here too, so re-measure the directory before evicting
+        entries = []
+        total = 0
+        for e in os.scandir(self.directory):
+            if not e.name.endswith(".pdf"):
+                continue
+            try:
+                st = e.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, e.path))
+            total += st.st_size
+        if total > self.max_disk_bytes:
+            # trim to 90% so eviction does not run on every store
+            target = self.max_disk_bytes * 0.9
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    os.unlink(path)
+                    total -= size
+                except OSError:
+                    pass
+        with self._lock:
+            self._disk_bytes = total
@@ -0,0 +1,181 @@
+# invoice_cli.py
+# Headless batch rendering, for cron jobs and servers without the desktop client:
+# every invoice file given (JSON saves like InProgress_*_Invoice.json, or TXT in
+# the Dummy.txt layout) becomes <name>.pdf in the output directory, rendered in
+# parallel. Inputs whose PDF is up to date are skipped, so nightly reruns only
+# redo the invoices that changed.
+#
+#   python -m invoice_core invoices/ "exports/*.json" --out pdfs --workers 4
+#   python -m invoice_core invoices/ --out pdfs --force --profile optimized
+#
+# Up to date means: the PDF still has the mtime recorded when it was written, and
+# the input bytes plus everything that changes the output (RENDERER_VERSION, layout,
+# renderer, watermark) hash to the value recorded with it, in MANIFEST in the
+# output directory.
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+
+from invoice_core import (PROFILES, RENDERER_VERSION, RENDERERS, InvoiceRenderer, invoice_spec_fields, render_many,
+                          watermark_digest)
+from invoice_parser import format_errors, read_txt_invoice
+
+INPUT_EXTENSIONS = (".json", ".txt")
+MANIFEST = ".invoice_render.json"
+DEFAULT_WATERMARK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "watermark.png")
+
+
+def find_inputs(sources):
+    """
+    Invoice files named by sources: files, directories (their *.json and *.txt)
+    or glob patterns. return: sorted list of paths, without duplicates
+    """
+    paths = set()
+    for source in sources:
+        if os.path.isdir(source):
+            matches = [os.path.join(source, name) for name in os.listdir(source)]
+        else:
+            matches = glob.glob(source) or [source]
+        for path in matches:
+            if os.path.splitext(path)[1].lower() in INPUT_EXTENSIONS and not os.path.isdir(path):
+                paths.add(os.path.normpath(path))
+    return sorted(paths)
+
+
+def read_invoice_file(path, data):
+    """
+    The invoice in one input file (data: its bytes), by extension.
+    return: spec dict for render_many
+    raises ValueError
+    """
+    if path.lower().endswith(".json"):
+        try:
+            spec = json.loads(data)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise ValueError("invalid JSON")
+        name, address, items, tax_rate = invoice_spec_fields(0, spec)
+    else:
+        name, address, items, errors = read_txt_invoice(data.splitlines())
+        if errors:
+            raise ValueError("invalid lines:\n" + format_errors(errors))
+        name, address, items, tax_rate = invoice_spec_fields(0, {"customer_name": name, "customer_address": address,
+                                                                 "items": items})
+    return {"customer_name": name, "customer_address": address, "items": items, "tax_rate": tax_rate}
+
+
+def output_name(path):
+    return os.path.splitext(os.path.basename(path))[0] + ".pdf"
+
+
+def load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        return manifest if isinstance(manifest, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def render_files(paths, out_dir, engine, workers=None, force=False, log=print):
+    """
+    Render each input file to out_dir/<its name>.pdf, skipping the ones that are up
+    to date (unless force). Unreadable or invalid inputs are reported through log
+    and counted, they do not stop the run.
+    return: dict of counts: rendered, unchanged, failed, and bytes written
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(out_dir)
+    config = json.dumps([RENDERER_VERSION, engine.renderer, engine.layout, watermark_digest(engine.watermark_path)],
+                        sort_keys=True).encode("utf-8")
+    stats = {"rendered": 0, "unchanged": 0, "failed": 0, "bytes": 0}
+    pending = {}  # render_many index -> (pdf name, input hash), for the invoices in flight
+    used = {}     # pdf name -> input path, to catch two inputs with the same name
+    queued = 0
+
+    def specs():
+        nonlocal queued
+        for path in paths:
+            name = output_name(path)
+            if name in used:
+                log(f"failed {path}: same output name as {used[name]}")
+                stats["failed"] += 1
+                continue
+            used[name] = path
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                digest = hashlib.sha256(config + b"\0" + data).hexdigest()
+                entry = manifest.get(name)
+                if not force and entry is not None and entry.get("hash") == digest:
+                    try:
+                        if os.stat(os.path.join(out_dir, name)).st_mtime_ns == entry.get("mtime_ns"):
+                            stats["unchanged"] += 1
+                            continue
+                    except OSError:
+                        pass  # PDF gone: render it again
+                spec = read_invoice_file(path, data)
+            except (OSError, ValueError) as e:
+                log(f"failed {path}: {e}")
+                stats["failed"] += 1
+                continue
+            pending[queued] = (name, digest)
+            queued += 1
+            yield spec
+
+    try:
+        for n, pdf in render_many(specs(), workers=workers, renderer=engine):
+            name, digest = pending.pop(n)
+            target = os.path.join(out_dir, name)
+            with open(target + ".tmp", "wb") as f:
+                f.write(pdf)
+            os.replace(target + ".tmp", target)
+            manifest[name] = {"hash": digest, "mtime_ns": os.stat(target).st_mtime_ns, "source": used[name]}
+            stats["rendered"] += 1
+            stats["bytes"] += len(pdf)
+    finally:
+        # also after an interrupted run, so what was finished is not redone
+        save_manifest(out_dir, manifest)
+    return stats
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m invoice_core",
+                                 description="Render invoice JSON/TXT files to PDFs, skipping unchanged ones.")
+    ap.add_argument("inputs", nargs="+", help="invoice files, directories or glob patterns")
+    ap.add_argument("-o", "--out", default="invoices", help="output directory (default: %(default)s)")
+    ap.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1,
+                    help="render processes (default: %(default)s)")
+    ap.add_argument("--force", action="store_true", help="render everything, even unchanged inputs")
+    ap.add_argument("--renderer", default="table", choices=RENDERERS)
+    ap.add_argument("--profile", choices=PROFILES, help="PDF output profile (default: INVOICE_PDF_PROFILE or default)")
+    ap.add_argument("--watermark", default=DEFAULT_WATERMARK, help="watermark image, '' for none")
+    args = ap.parse_args(argv)
+
+    paths = find_inputs(args.inputs)
+    if not paths:
+        print("no .json or .txt invoice files found", file=sys.stderr)
+        return 2
+    engine = InvoiceRenderer(watermark_path=args.watermark or None, renderer=args.renderer, profile=args.profile)
+
+    def log(message):
+        print(message, file=sys.stderr)
+
+    t0 = time.perf_counter()
+    stats = render_files(paths, args.out, engine, workers=args.workers, force=args.force, log=log)
+    elapsed = time.perf_counter() - t0
+    rate = stats["rendered"] / elapsed if elapsed else 0.0
+    print(f"{len(paths)} inputs: {stats['rendered']} rendered, {stats['unchanged']} unchanged, "
+          f"{stats['failed']} failed in {elapsed:.1f} s ({rate:.1f} invoices/s, "
+          f"{stats['bytes'] / (1024 * 1024):.1f} MB written to {args.out})")
+    return 1 if stats["failed"] else 0
@@ -1,148 +1,956 @@
 # invoice_core.py
+import hashlib
+import heapq
+import json
+import os
+import re
+import tempfile
+import threading
+import zipfile
+import zlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
 from io import BytesIO
+from time import perf_counter
 from reportlab.lib.pagesizes import letter, landscape
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
-from reportlab.platypus import Table, TableStyle
-from reportlab.lib import colors
-
-def generate_invoice_pdf(customer_name, customer_address, items, tax_rate=0.0, watermark_path=None):
-    """
-    items: list of dicts with keys: desc(str), qty(int), price(float)
-    tax_rate: e.g. 8.25 for 8.25%
-    return: bytes of the PDF file
-    """
-    buf = BytesIO()
-    c = canvas.Canvas(buf, pagesize=landscape(letter))
-    width, height = landscape(letter)
-
-    def draw_watermark():
-        if watermark_path:
-            try:
-                img = ImageReader(watermark_path)
-                img_width, img_height = img.getSize()
-                scale = min(width / img_width, height / img_height) * 0.7
-                wm_width = img_width * scale
-                wm_height = img_height * scale
-                wm_x = (width - wm_width) / 2
-                wm_y = (height - wm_height) / 2
-                c.saveState()
-                # alpha may not always be supported in some renderers; if not, just draw image.
-                try:
-                    c.setFillAlpha(0.15)
-                except Exception:
-                    pass
-                c.drawImage(img, wm_x, wm_y, width=wm_width, height=wm_height, mask='auto')
-                c.restoreState()
-            except Exception:
-                pass
-
-    # Table data
-    data = [['Description', 'Quantity', 'Unit Price', 'Total']]
-    subtotal = 0.0
-    for it in items:
-        line_total = float(it['qty']) * float(it['price'])
-        subtotal += line_total
-        data.append([
-            str(it['desc']),
-            str(it['qty']),
-            f"${float(it['price']):.2f}",
-            f"${line_total:.2f}",
-        ])
-
-    tax_amount = subtotal * (float(tax_rate) / 100.0)
-    grand_total_val = subtotal + tax_amount
-    data.append(['', '', 'Subtotal:', f"${subtotal:,.2f}"])
-    data.append(['', '', f"Tax ({tax_rate:.2f}%):", f"${tax_amount:,.2f}"])
-    data.append(['', '', 'Grand Total:', f"${grand_total_val:,.2f}"])
-
-    table_col_widths = [380, 100, 100, 120]
-    row_height = 24
-
-    # First page has header
-    y_start_first = height - 120
-    bottom_margin = 20
-    max_rows_first = int((y_start_first - bottom_margin) / row_height)
-
-    # Later pages: table starts higher
-    y_start_other = height - 10
-    max_rows_other = int((y_start_other - bottom_margin) / row_height)
-
-    # Split data: header + body rows
-    header = data[0]
-    body = data[1:-3]
-    totals = data[-3:]  # subtotal, tax, grand total
-
-    i = 0
-    first_page = True
-    while True:
-        c.setFont("Helvetica", 12)
-        draw_watermark()
-
-        if first_page:
-            # Company title
-            c.setFont("Times-Italic", 40)
-            company_name = "Custom Kitchen Cabinets"
-            company_name_width = c.stringWidth(company_name, "Times-Italic", 40)
-            c.drawString((width - company_name_width) / 2, height - 175, company_name)
+from invoice_items import LineItems
+from invoice_metrics import NULL_TIMER
+from invoice_page_cache import PAGE_CACHE
+from invoice_pagination import plan_pages
+from invoice_totals import format_cents, to_tax_rate
+
+# ReportLab's canvas/platypus/PIL stack dominates startup time, so it is imported
+# on first render (or by warm_up) instead of when this module is imported.
+canvas = ImageReader = stringWidth = Table = TableStyle = colors = pdfdoc = rl_config = None
+
+
+def load_reportlab():
+    """Import the ReportLab rendering modules into this module, once."""
+    global canvas, ImageReader, stringWidth, Table, TableStyle, colors, pdfdoc, rl_config
+    if Table is not None:
+        return
+    from reportlab import rl_config as _rl_config
+    from reportlab.pdfbase import pdfdoc as _pdfdoc
+    pdfdoc, rl_config = _pdfdoc, _rl_config
+    from reportlab.pdfgen import canvas as _canvas
+    from reportlab.lib.utils import ImageReader as _ImageReader
+    from reportlab.pdfbase.pdfmetrics import stringWidth as _stringWidth
+    from reportlab.platypus import TableStyle as _TableStyle
+    from reportlab.lib import colors as _colors
+    from reportlab.platypus import Table as _Table
+    canvas, ImageReader, stringWidth, TableStyle, colors = _canvas, _ImageReader, _stringWidth, _TableStyle, _colors
+    Table = _Table  # last: marks the set as complete
+
+
+def warm_up(watermark_path=None):
+    """
+    Pay the one-off costs before the first request: imports, the decoded
+    watermark and font metrics. Called from the gunicorn post_fork hook,
+    by render_many() pool workers and by the desktop app once its window is up.
+    """
+    load_reportlab()
+    load_watermark(watermark_path)
+    for font, size in (("Times-Italic", 40), ("Helvetica-Bold", 20), ("Helvetica", 14), ("Helvetica", 10)):
+        stringWidth("Custom Kitchen Cabinets INVOICE 0123456789$.,", font, size)
 
-            # INVOICE label
-            c.setFont("Helvetica-Bold", 20)
-            invoice_text = "INVOICE"
-            invoice_width = c.stringWidth(invoice_text, "Helvetica-Bold", 20)
-            c.drawString((width - invoice_width) / 2, height - 60, invoice_text)
 
-            # Customer lines
-            c.setFont("Helvetica", 14)
-            c.drawString(60, height - 110, f"Customer: {customer_name}")
-            c.drawString(60, height - 130, f"Address:  {customer_address}")
+# Decoded watermark images shared by every render in this process.
+# key: absolute path -> {"mtime": ..., "image": ImageReader, "size": (w, h), "digest": sha256 hex, ...}
+# ("compact" holds the optimized-profile encodings, see compact_watermark)
+_WATERMARK_CACHE = {}
+_WATERMARK_LOCK = threading.Lock()
+_WATERMARK_DIGESTS = {}  # absolute path -> (mtime, sha256 hex)
+WATERMARK_SCALE = 0.7
+WATERMARK_ALPHA = 0.15
+# resolution of the watermark in the "optimized" profile, at its drawn size
+WATERMARK_DPI = int(os.environ.get("INVOICE_WATERMARK_DPI", "100"))
 
-            y_start = y_start_first
-            max_rows = max_rows_first
+
+def watermark_digest(watermark_path):
+    """sha256 hex of the watermark file (None if missing), without decoding the image."""
+    if not watermark_path:
+        return None
+    path = os.path.abspath(watermark_path)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+        cached = _WATERMARK_DIGESTS.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+    _WATERMARK_DIGESTS[path] = (mtime, digest)
+    return digest
+
+
+def load_watermark(watermark_path):
+    """
+    Return the cached watermark entry for watermark_path, decoding the image
+    only the first time (or again after the file changes on disk).
+    return: dict or None if the file is missing/unreadable
+    """
+    if not watermark_path:
+        return None
+    path = os.path.abspath(watermark_path)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    with _WATERMARK_LOCK:
+        entry = _WATERMARK_CACHE.get(path)
+        if entry is not None and entry["mtime"] == mtime:
+            return entry
+        digest = watermark_digest(path)
+        if digest is None:
+            return None
+        load_reportlab()
+        try:
+            img = ImageReader(path)
+            # decode and compress now, so documents never pay for it
+            size = img.getSize()
+            xobject = _encode_image(img, "wm_" + digest[:16] + "_img")
+        except Exception:
+            return None
+        entry = {"mtime": mtime, "path": path, "image": img, "size": size, "placements": {}, "compact": {},
+                 "digest": digest, "form": "wm_" + digest[:16], "xobject": xobject}
+        _WATERMARK_CACHE[path] = entry
+        return entry
+
+
+def _encode_image(img, name):
+    """
+    Build the PDF image XObject (and soft mask) for img once per process.
+    canvas.drawImage would hash and zlib-compress the raw pixels again for every
+    document; _draw_encoded_image only registers copies of these in each one.
+    return: (image attributes, soft mask attributes or None)
+    """
+    obj = pdfdoc.PDFImageXObject(name, img, mask='auto')
+    smask = obj.__dict__.pop("_smask", None)
+    return dict(obj.__dict__), (dict(smask.__dict__) if smask is not None else None)
+
+
+# The "optimized" profile's encoding of a watermark at one placed size.
+#   name: image XObject name
+#   image, mask: (dictionary entries, Flate-compressed pixels) of the image and its soft mask
+CompactImage = namedtuple("CompactImage", "name image mask")
+
+
+def _encode_compact_image(path, name, width, height):
+    """
+    Encode the image at path for drawing at width x height points in the "optimized"
+    profile: resampled to WATERMARK_DPI, palette colours (Indexed) when it has at most
+    256, WATERMARK_ALPHA baked into an 8-bit soft mask (so pages need no ExtGState),
+    Flate without ReportLab's ASCII85 layer.
+    return: CompactImage
+    """
+    from PIL import Image
+    with Image.open(path) as src:
+        rgba = src.convert("RGBA")
+    size = (max(1, round(width / 72 * WATERMARK_DPI)), max(1, round(height / 72 * WATERMARK_DPI)))
+    if size[0] < rgba.width:
+        # nearest neighbour keeps the flat colours flat, which compresses far better than a smooth filter
+        rgba = rgba.resize(size, Image.NEAREST)
+    alpha = rgba.getchannel("A")
+    rgb = rgba.convert("RGB")
+    # whatever colour hides under fully transparent pixels is never seen; make it one colour
+    rgb.paste((255, 255, 255), mask=alpha.point(lambda v: 255 if v == 0 else 0))
+    mask = alpha.point(lambda v: round(v * WATERMARK_ALPHA))
+
+    entries = {"Type": "/XObject", "Subtype": "/Image", "Width": rgb.width, "Height": rgb.height,
+               "BitsPerComponent": 8, "Filter": "/FlateDecode"}
+    used = rgb.getcolors(256)
+    if used is not None:
+        palette = bytes(channel for _, color in used for channel in color)
+        palette_image = Image.new("P", (1, 1))
+        palette_image.putpalette(palette)
+        pixels = rgb.quantize(palette=palette_image, dither=Image.Dither.NONE).tobytes()
+        colorspace = "[/Indexed /DeviceRGB %d <%s>]" % (len(used) - 1, palette.hex())
+    else:
+        pixels = rgb.tobytes()
+        colorspace = "/DeviceRGB"
+    image = (dict(entries, ColorSpace=colorspace), zlib.compress(pixels, 9))
+    mask = (dict(entries, ColorSpace="/DeviceGray"), zlib.compress(mask.tobytes(), 9))
+    return CompactImage(name, image, mask)
+
+
+def _image_stream(entries, content):
+    stream = pdfdoc.PDFStream(pdfdoc.PDFDictionary(entries), content)
+    stream.__Comment__ = "image stream"
+    return stream
+
+
+def _draw_encoded_image(c, xobject, x, y, width, height):
+    """canvas.drawImage for an image encoded by _encode_image or _encode_compact_image."""
+    doc = c._doc
+    if isinstance(xobject, CompactImage):
+        name = xobject.name
+    else:
+        attrs, smask_attrs = xobject
+        name = attrs["name"]
+    reg_name = doc.getXObjectName(name)
+    if reg_name not in doc.idToObject:
+        # fresh objects per document: a registered PDFObject remembers its document name
+        if isinstance(xobject, CompactImage):
+            obj = _image_stream(*xobject.image)
+            obj.dictionary["SMask"] = doc.Reference(_image_stream(*xobject.mask), reg_name + "_mask")
         else:
-            y_start = y_start_other
-            max_rows = max_rows_other
-
-        # Leave 1 row for header + (max_rows - 1) for data; reserve 3 rows for totals on last page
-        rows_available_for_data = max_rows - 1
-        # If this is the last chunk, include totals too
-        remaining = len(body) - i
-        fits_with_totals = remaining <= (rows_available_for_data - 3)
-        take = min(remaining, rows_available_for_data - (3 if fits_with_totals else 0))
-
-        page_rows = body[i:i+take]
-        page_data = [header] + page_rows
-        if i + take >= len(body):
-            # last page -> add totals
-            page_data += totals
-
-        table = Table(page_data, colWidths=table_col_widths, hAlign='CENTER')
-        style = [
+            obj = pdfdoc.PDFImageXObject.__new__(pdfdoc.PDFImageXObject)
+            obj.__dict__.update(attrs)
+            if smask_attrs is not None:
+                smask = pdfdoc.PDFImageXObject.__new__(pdfdoc.PDFImageXObject)
+                smask.__dict__.update(smask_attrs)
+                obj.smask = doc.Reference(smask, doc.getXObjectName(smask.name))
+            c._setXObjects(obj)
+        doc.Reference(obj, reg_name)
+        doc.addForm(name, obj)
+    c.saveState()
+    c.translate(x, y)
+    c.scale(width, height)
+    c._code.append("/%s Do" % reg_name)
+    c.restoreState()
+    c._formsinuse.append(name)
+
+
+def watermark_placement(entry, width, height):
+    """(x, y, w, h) of the watermark centred on a width x height page, cached per page size."""
+    key = (width, height)
+    placement = entry["placements"].get(key)
+    if placement is None:
+        img_width, img_height = entry["size"]
+        scale = min(width / img_width, height / img_height) * WATERMARK_SCALE
+        wm_width = img_width * scale
+        wm_height = img_height * scale
+        placement = ((width - wm_width) / 2, (height - wm_height) / 2, wm_width, wm_height)
+        entry["placements"][key] = placement
+    return placement
+
+
+def compact_watermark(entry, width, height):
+    """The watermark's CompactImage for a width x height page, encoded once per page size."""
+    key = (width, height)
+    compact = entry["compact"].get(key)
+    if compact is None:
+        with _WATERMARK_LOCK:
+            compact = entry["compact"].get(key)
+            if compact is None:
+                wm_width, wm_height = watermark_placement(entry, width, height)[2:]
+                name = "%s_%dx%d_img" % (entry["form"], width, height)
+                compact = _encode_compact_image(entry["path"], name, wm_width, wm_height)
+                entry["compact"][key] = compact
+    return compact
+
+
+def draw_watermark(c, entry, width, height, compact=False):
+    """
+    Draw a cached watermark on the current page of canvas c.
+    The placed image is captured once per document in a form XObject, so
+    every page just references the same embedded object.
+    compact: use the "optimized" profile's image (compact_watermark), whose soft mask
+             already carries WATERMARK_ALPHA, so the page only references the form
+    """
+    if entry is None:
+        return
+    name = "%s_%dx%d" % (entry["form"], width, height)
+    if compact:
+        name += "_c"
+    if not c.hasForm(name):
+        wm_x, wm_y, wm_width, wm_height = watermark_placement(entry, width, height)
+        xobject = compact_watermark(entry, width, height) if compact else entry["xobject"]
+        c.beginForm(name)
+        _draw_encoded_image(c, xobject, wm_x, wm_y, wm_width, wm_height)
+        c.endForm()
+    if compact:
+        # the soft mask needs PDF 1.4; a table replayed from the page cache does not ask for it
+        c._doc.ensureMinPdfVersion("transparency")
+        c.doForm(name)
+        return
+    c.saveState()
+    # alpha may not always be supported in some renderers; if not, just draw image.
+    # (set on the page, not inside the form: forms do not carry ExtGState resources)
+    try:
+        c.setFillAlpha(WATERMARK_ALPHA)
+    except Exception:
+        pass
+    c.doForm(name)
+    c.restoreState()
+
+
+# Bump whenever the rendered output changes, so cached PDFs (invoice_cache) are not reused.
+RENDERER_VERSION = 2
+
+# Table styles are identical for every invoice; build them once per process
+# (on first use, since they need ReportLab).
+_TABLE_STYLES = {}  # (rows on page, with totals) -> TableStyle
+
+
+def _table_style(n_rows, with_totals):
+    key = (n_rows, True) if with_totals else (0, False)
+    style = _TABLE_STYLES.get(key)
+    if style is None:
+        cmds = [
             ('GRID', (0,0), (-1,-1), 1, colors.black),
             ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
             ('ALIGN', (1,1), (-1,-1), 'RIGHT'),
             ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
         ]
-        if i + take >= len(body):
+        if with_totals:
             # bold totals
-            last_rows = len(page_data) - 3, len(page_data) - 2, len(page_data) - 1
-            for r in last_rows:
-                style.append(('FONTNAME', (0,r), (-1,r), 'Helvetica-Bold'))
-                style.append(('BACKGROUND', (0,r), (-1,r), colors.whitesmoke))
-        table.setStyle(TableStyle(style))
-
-        table_height = row_height * len(page_data)
-        total_table_width = sum(table_col_widths)
-        x_center = (width - total_table_width) / 2
-        table.wrapOn(c, width, height)
-        table.drawOn(c, x_center, y_start - table_height)
-
-        i += take
-        if i >= len(body):
-            break
-        first_page = False
-        c.showPage()
-
-    c.save()
-    buf.seek(0)
-    return buf.getvalue()
+            for r in (n_rows - 3, n_rows - 2, n_rows - 1):
+                cmds.append(('FONTNAME', (0,r), (-1,r), 'Helvetica-Bold'))
+                cmds.append(('BACKGROUND', (0,r), (-1,r), colors.whitesmoke))
+        style = _TABLE_STYLES[key] = TableStyle(cmds)
+    return style
+
+
+RENDERERS = ("table", "fast")
+
+# Cell metrics of the default platypus TableStyle that draw_table_fast reproduces.
+_CELL_FONT_SIZE = 10
+_CELL_LEADING = 12
+_CELL_ROW_HEIGHT = 18  # leading + 3pt top/bottom padding
+_CELL_BASELINE = 5     # bottom padding + leading - font size
+_CELL_PAD_X = 6
+
+
+def draw_table_fast(c, x, y, page_data, col_widths, with_totals):
+    """
+    Draw page_data straight onto the canvas, looking the same as the platypus
+    Table built with _table_style(): grey bold header, left-aligned descriptions,
+    right-aligned numbers, bold shaded totals rows when with_totals, 1pt grid.
+    (x, y) is the bottom-left corner, as for Table.drawOn.
+    """
+    load_reportlab()
+    n = len(page_data)
+    rh = _CELL_ROW_HEIGHT
+    col_x = [x]
+    for w in col_widths:
+        col_x.append(col_x[-1] + w)
+    right = col_x[-1]
+    top = y + n * rh
+    totals_from = n - 3 if with_totals else n
+
+    c.saveState()
+    c.setFillColor(colors.lightgrey)
+    c.rect(x, top, right - x, -rh, stroke=0, fill=1)
+    if with_totals:
+        c.setFillColor(colors.whitesmoke)
+        for r in range(totals_from, n):
+            c.rect(x, top - r * rh, right - x, -rh, stroke=0, fill=1)
+
+    text = c.beginText(x, top)
+    text.setFillColor(colors.black)
+    font = None
+    # relative Td moves are much cheaper to format than a full Tm per cell
+    cur_x, cur_y = x, top
+    for r, row in enumerate(page_data):
+        fontname = 'Helvetica-Bold' if r == 0 or r >= totals_from else 'Helvetica'
+        if fontname != font:
+            text.setFont(fontname, _CELL_FONT_SIZE, _CELL_LEADING)
+            font = fontname
+        baseline = top - (r + 1) * rh + _CELL_BASELINE
+        for col, val in enumerate(row):
+            if not val:
+                continue
+            if r == 0 or col == 0:
+                tx = col_x[col] + _CELL_PAD_X
+            else:
+                tx = col_x[col + 1] - _CELL_PAD_X - stringWidth(val, fontname, _CELL_FONT_SIZE)
+            text.moveCursor(tx - cur_x, cur_y - baseline)
+            cur_x, cur_y = tx, baseline
+            text.textOut(val)
+    c.drawText(text)
+
+    c.setStrokeColor(colors.black)
+    c.setLineWidth(1)
+    c.setLineCap(1)
+    c.setLineJoin(1)
+    lines = [(x, top - r * rh, right, top - r * rh) for r in range(n + 1)]
+    lines += [(cx, top, cx, y) for cx in col_x]
+    c.lines(lines)
+    c.restoreState()
+
+
+# PDFs up to this size stay in RAM when spooled; bigger ones go to a temp file.
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+# Output profiles:
+#   default    ReportLab's canvas settings (ASCII85 + Flate streams, resources per page)
+#   optimized  smallest file: compact_watermark, Flate-only streams, one resource
+#              dictionary shared by all pages, no page transition/rotation entries
+PROFILES = ("default", "optimized")
+PDF_PROFILE = os.environ.get("INVOICE_PDF_PROFILE") or "default"
+
+
+def _share_page_resources(c, resources):
+    """
+    For "optimized" canvases, on each new page: point the page just added at the
+    document's shared resource dictionary (an indirect object, written once)
+    instead of its own copy, and drop its empty /Trans and default /Rotate.
+    resources: PDFResourceDictionary of this document, merged into as pages come
+    """
+    page = c._doc.Pages.pages[-1]
+    page.Trans = None
+    page.Rotate = None
+    if page.ExtGState or page._colorsUsed or page._shadingUsed:
+        return  # nothing this renderer draws; such a page keeps its own resources
+    if page.XObjects:
+        resources.XObject.update(page.XObjects.dict)
+    page.Resources = c._doc.Reference(resources)
+
+
+def _encode_page_stream(c):
+    """
+    For canvases of renderers with cache_pages, on each new page: compress the
+    page just added right away, with the filters save() would use, taking the
+    result from PAGE_CACHE when an identical page was rendered before.
+    """
+    page = c._doc.Pages.pages[-1]
+    if page.compression:
+        filters = [pdfdoc.PDFBase85Encode, pdfdoc.PDFZCompress] if rl_config.useA85 else [pdfdoc.PDFZCompress]
+    else:
+        filters = c._doc.defaultStreamFilters
+    if not filters or not page.stream:
+        return
+    names = [f.pdfname for f in filters]
+    key = "stream:" + hashlib.blake2b(" ".join(names + [page.stream]).encode("utf-8", "surrogatepass"),
+                                      digest_size=20).hexdigest()
+    content = PAGE_CACHE.get(key)
+    if content is None:
+        content = page.stream
+        for f in reversed(filters):
+            content = f.encode(content)
+        PAGE_CACHE.put(key, content)
+    stream = pdfdoc.PDFStream(pdfdoc.PDFDictionary({"Filter": pdfdoc.PDFArray(list(map(pdfdoc.PDFName, names)))}),
+                              content)
+    stream.__Comment__ = "page stream"
+    page.Contents = stream
+
+
+# Default branding and geometry; InvoiceRenderer takes overrides.
+COMPANY_NAME = "Custom Kitchen Cabinets"
+COL_WIDTHS = (380, 100, 100, 120)  # Description, Quantity, Unit Price, Total
+PAGE_SIZE = landscape(letter)
+
+# Everything about the page that does not depend on the invoice, worked out once per layout:
+#   title_form: name of the form XObject holding the company name and INVOICE label
+#   company_x, invoice_x: x of those two centred strings
+#   table_x: left edge of the centred table
+Template = namedtuple("Template", "title_form company_x invoice_x table_x")
+
+
+class InvoiceRenderer:
+    """
+    The invoice layout, shared by the web app, the job queue and the desktop client.
+    Branding, column widths, page size, watermark and table renderer are fixed
+    per instance; render()/spool()/draw() can then be called for any number of
+    invoices, from any thread. The decoded watermark, font metrics, table
+    styles and finished pages are cached process-wide.
+    company_name: title on the first page
+    col_widths: Description, Quantity, Unit Price, Total
+    pagesize: (width, height) in points
+    watermark_path: image drawn faintly behind every page, or None
+    renderer: "table" (platypus Table) or "fast" (draw_table_fast, same look)
+    profile: "default" or "optimized" (smaller files, see PROFILES); INVOICE_PDF_PROFILE if None
+    cache_pages: reuse finished tables and page streams from invoice_page_cache.PAGE_CACHE,
+                 so re-rendering an edited invoice only redraws the pages that changed.
+                 Off by default: for invoices rendered once, the hashing costs more than it saves
+    """
+
+    def __init__(self, company_name=COMPANY_NAME, col_widths=COL_WIDTHS, pagesize=PAGE_SIZE,
+                 watermark_path=None, renderer="table", profile=None, cache_pages=False):
+        if renderer not in RENDERERS:
+            raise ValueError(f"Unknown renderer: {renderer!r}")
+        profile = profile or PDF_PROFILE
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown profile: {profile!r}")
+        if len(col_widths) != 4:
+            raise ValueError("col_widths needs 4 widths: description, quantity, unit price, total")
+        self.company_name = company_name
+        self.col_widths = list(col_widths)
+        self.pagesize = tuple(pagesize)
+        self.watermark_path = watermark_path
+        self.renderer = renderer
+        self.profile = profile
+        self.cache_pages = cache_pages
+        self._template = None
+
+    @property
+    def layout(self):
+        """Everything besides the invoice data and watermark that changes the output (for cache keys)."""
+        return {"company": self.company_name, "cols": self.col_widths, "page": list(self.pagesize),
+                "profile": self.profile}
+
+    def template(self):
+        """The compiled Template of this layout (measured on first use)."""
+        if self._template is None:
+            load_reportlab()
+            width, height = self.pagesize
+            key = hashlib.sha256(json.dumps(self.layout, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+            self._template = Template(
+                title_form="title_" + key,
+                company_x=(width - stringWidth(self.company_name, "Times-Italic", 40)) / 2,
+                invoice_x=(width - stringWidth("INVOICE", "Helvetica-Bold", 20)) / 2,
+                table_x=(width - sum(self.col_widths)) / 2,
+            )
+        return self._template
+
+    def draw_title(self, c):
+        """
+        Company name and INVOICE label of the first page. They are captured once per
+        document in a form XObject, so every further invoice in a merged PDF
+        only references it.
+        """
+        template = self.template()
+        if not c.hasForm(template.title_form):
+            height = self.pagesize[1]
+            c.beginForm(template.title_form)
+            c.setFont("Times-Italic", 40)
+            c.drawString(template.company_x, height - 175, self.company_name)
+            c.setFont("Helvetica-Bold", 20)
+            c.drawString(template.invoice_x, height - 60, "INVOICE")
+            c.endForm()
+        c.doForm(template.title_form)
+
+    def watermark(self):
+        """Decoded watermark entry from the process-wide cache, or None."""
+        return load_watermark(self.watermark_path)
+
+    def canvas(self, target):
+        """New canvas of this page size and profile writing to target (path or binary file)."""
+        load_reportlab()
+        if self.profile == "default":
+            c = canvas.Canvas(target, pagesize=self.pagesize)
+            resources = None
+        else:
+            # page and form streams get Flate from the document default instead of
+            # ReportLab's ASCII85 + Flate, which is a quarter bigger
+            c = canvas.Canvas(target, pagesize=self.pagesize, pageCompression=0)
+            c._doc.defaultStreamFilters = [pdfdoc.PDFZCompress]
+            resources = pdfdoc.PDFResourceDictionary()
+            resources.basicFonts()
+            resources.allProcs()
+        cache_pages = self.cache_pages and PAGE_CACHE.max_bytes > 0
+
+        def on_page(page_number):
+            if resources is not None:
+                _share_page_resources(c, resources)
+            if cache_pages:
+                _encode_page_stream(c)
+
+        if resources is not None or cache_pages:
+            c.setPageCallBack(on_page)
+        return c
+
+    def _table_key(self, c, plan, page_data):
+        """PAGE_CACHE key of the table drawn for plan with page_data on canvas c."""
+        doc = c._doc
+        # font resource names are handed out per document, in order of first use
+        fonts = [doc.getInternalFontName(font) for font in ("Helvetica", "Helvetica-Bold")]
+        blob = json.dumps([RENDERER_VERSION, self.renderer, self.profile, self.col_widths, self.pagesize,
+                           self.template().table_x, plan.table_y, plan.with_totals, fonts, page_data],
+                          ensure_ascii=False)
+        return "table:" + hashlib.blake2b(blob.encode("utf-8"), digest_size=20).hexdigest()
+
+    def render(self, customer_name, customer_address, items, tax_rate=0.0, out=None, timings=None, progress=None):
+        """
+        items: LineItems, or a list of dicts with keys: desc(str), qty(int), price(float)
+        tax_rate: e.g. 8.25 for 8.25%
+        out: optional path or writable binary file-like; the PDF is written straight into it
+        timings: optional invoice_metrics.StageTimer to record per-stage durations in
+        progress: optional callback(pages_done, pages_total), see draw
+        return: bytes of the PDF file, or out when given
+        """
+        timer = timings or NULL_TIMER
+        target = out if out is not None else BytesIO()
+        c = self.canvas(target)
+        self.draw(c, customer_name, customer_address, items, tax_rate, timings, progress)
+        with timer.stage("serialize"):
+            c.save()
+        if out is not None:
+            return out
+        return target.getvalue()
+
+    def spool(self, customer_name, customer_address, items, tax_rate=0.0, max_memory=SPOOL_MAX_MEMORY,
+              timings=None, progress=None):
+        """
+        Render into a SpooledTemporaryFile rewound to the start, so large invoices
+        end up on disk instead of as extra copies in worker memory.
+        The caller owns the file and must close it.
+        """
+        spool = tempfile.SpooledTemporaryFile(max_size=max_memory)
+        try:
+            self.render(customer_name, customer_address, items, tax_rate, out=spool,
+                        timings=timings, progress=progress)
+        except Exception:
+            spool.close()
+            raise
+        spool.seek(0)
+        return spool
+
+    def draw(self, c, customer_name, customer_address, items, tax_rate=0.0, timings=None, progress=None):
+        """
+        Draw one invoice onto canvas c, starting on the current page.
+        The last page is left open so callers can append more or save.
+        timings: optional invoice_metrics.StageTimer (stages: totals, pagination, watermark, table)
+        progress: optional callback(pages_done, pages_total), called after each page;
+                  an exception raised from it aborts the render (e.g. to cancel)
+        """
+        timer = timings or NULL_TIMER
+        load_reportlab()
+        width, height = self.pagesize
+        tax_rate = float(tax_rate)
+        with timer.stage("watermark"):
+            watermark = self.watermark()
+
+        # Table data
+        with timer.stage("totals"):
+            items = LineItems.coerce(items)
+            totals = items.totals(tax_rate)
+        t0 = perf_counter()
+        data = [['Description', 'Quantity', 'Unit Price', 'Total']]
+        data += map(list, zip(items.descs, map(str, items.qtys), map(format_cents, items.prices),
+                              map(format_cents, totals.line_totals)))
+
+        data.append(['', '', 'Subtotal:', format_cents(totals.subtotal, grouping=True)])
+        data.append(['', '', f"Tax ({tax_rate:.2f}%):", format_cents(totals.tax, grouping=True)])
+        data.append(['', '', 'Grand Total:', format_cents(totals.grand_total, grouping=True)])
+
+        table_col_widths = self.col_widths
+        template = self.template()
+
+        # Split data: header + body rows
+        header = data[0]
+        body = data[1:-3]
+        totals = data[-3:]  # subtotal, tax, grand total
+
+        timer.add("table", perf_counter() - t0)
+
+        with timer.stage("pagination"):
+            plans = plan_pages(len(body), totals_rows=len(totals), page_height=height)
+        timer.count("rows", len(body))
+        timer.count("pages", len(plans))
+
+        for plan in plans:
+            if plan.number:
+                c.showPage()
+            with timer.stage("watermark"):
+                draw_watermark(c, watermark, width, height, compact=self.profile == "optimized")
+
+            if plan.first_page:
+                self.draw_title(c)
+
+                # Customer lines
+                c.setFont("Helvetica", 14)
+                c.drawString(60, height - 110, f"Customer: {customer_name}")
+                c.drawString(60, height - 130, f"Address:  {customer_address}")
+
+            page_data = [header]
+            page_data += body[plan.start:plan.stop]
+            if plan.with_totals:
+                page_data += totals
+
+            with timer.stage("table"):
+                key = code = None
+                if self.cache_pages and PAGE_CACHE.max_bytes:
+                    key = self._table_key(c, plan, page_data)
+                    code = PAGE_CACHE.get(key)
+                if code is not None:
+                    # this page's rows were drawn before: replay the finished code
+                    c._code.append(code)
+                    timer.count("cached_pages", 1)
+                else:
+                    start = len(c._code)
+                    if self.renderer == "fast":
+                        draw_table_fast(c, template.table_x, plan.table_y, page_data, table_col_widths,
+                                        plan.with_totals)
+                    else:
+                        table = Table(page_data, colWidths=table_col_widths, hAlign='CENTER')
+                        table.setStyle(_table_style(len(page_data), plan.with_totals))
+                        table.wrapOn(c, width, height)
+                        table.drawOn(c, template.table_x, plan.table_y)
+                    if key is not None:
+                        PAGE_CACHE.put(key, "\n".join(c._code[start:]))
+            if progress is not None:
+                progress(plan.number + 1, len(plans))
+
+
+def _engine(renderer, watermark_path):
+    # the module-level helpers take either a renderer name or a ready InvoiceRenderer
+    if isinstance(renderer, InvoiceRenderer):
+        return renderer
+    return InvoiceRenderer(watermark_path=watermark_path, renderer=renderer)
+
+
+def generate_invoice_pdf(customer_name, customer_address, items, tax_rate=0.0, watermark_path=None, out=None,
+                         renderer="table", timings=None, progress=None):
+    """
+    InvoiceRenderer.render with the default layout.
+    renderer: "table", "fast" or an InvoiceRenderer (then watermark_path is ignored)
+    return: bytes of the PDF file, or out when given
+    """
+    return _engine(renderer, watermark_path).render(customer_name, customer_address, items, tax_rate, out=out,
+                                                    timings=timings, progress=progress)
+
+
+def spool_invoice_pdf(customer_name, customer_address, items, tax_rate=0.0, watermark_path=None,
+                      max_memory=SPOOL_MAX_MEMORY, renderer="table", timings=None, progress=None):
+    """InvoiceRenderer.spool with the default layout; renderer as for generate_invoice_pdf."""
+    return _engine(renderer, watermark_path).spool(customer_name, customer_address, items, tax_rate,
+                                                   max_memory=max_memory, timings=timings, progress=progress)
+
+
+def _invoice_filename(customer_name):
+    # only letters, digits and _ (as InvoiceApp.sanitize_filename), so a name cannot carry a path
+    name = re.sub(r"[^a-zA-Z0-9_]", "", customer_name.replace(" ", "_"))
+    return f"{name}_Invoice.pdf" if name else "Invoice.pdf"
+
+
+def generate_invoices_batch(specs, watermark_path=None, merge=False, renderer="table", timings=None, out=None):
+    """
+    Render many invoices in one call, sharing the watermark, fonts and table styles.
+    specs: iterable of dicts with keys: customer_name, customer_address, items,
+           and optionally tax_rate (defaults to 0). Consumed lazily, so a generator works.
+    merge: False -> ZIP with one PDF per invoice; True -> one PDF with all invoices
+    renderer: "table", "fast" or an InvoiceRenderer (then watermark_path is ignored)
+    timings: optional invoice_metrics.StageTimer, summed over all invoices
+    out: optional writable, seekable binary file; the ZIP or PDF is written straight into it
+    return: bytes of the ZIP or merged PDF, or out when given
+    raises ValueError naming the first invalid spec
+    """
+    timer = timings or NULL_TIMER
+    engine = _engine(renderer, watermark_path)
+    target = out if out is not None else BytesIO()
+    if merge:
+        c = engine.canvas(target)
+        first = True
+        for n, spec in enumerate(specs):
+            name, address, items, tax_rate = invoice_spec_fields(n, spec)
+            if not first:
+                c.showPage()
+            engine.draw(c, name, address, items, tax_rate, timings)
+            first = False
+        if first:
+            raise ValueError("Batch contains no invoices.")
+        with timer.stage("serialize"):
+            c.save()
+    else:
+        count = 0
+        seen = set()
+        with zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as zf:
+            for n, spec in enumerate(specs):
+                name, address, items, tax_rate = invoice_spec_fields(n, spec)
+                pdf = engine.render(name, address, items, tax_rate, timings=timings)
+                fname = _invoice_filename(name)
+                if fname in seen:
+                    fname = f"{n + 1:05d}_{fname}"
+                seen.add(fname)
+                zf.writestr(fname, pdf)
+                count += 1
+        if not count:
+            raise ValueError("Batch contains no invoices.")
+    if out is not None:
+        return out
+    return target.getvalue()
+
+
+def spool_invoices_batch(specs, watermark_path=None, merge=False, renderer="table", timings=None,
+                         max_memory=SPOOL_MAX_MEMORY):
+    """
+    generate_invoices_batch into a SpooledTemporaryFile rewound to the start, so a
+    batch of thousands of invoices ends up on disk instead of in worker memory.
+    The caller owns the file and must close it.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    try:
+        generate_invoices_batch(specs, watermark_path, merge, renderer, timings, out=spool)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def invoice_spec_fields(n, spec):
+    """
+    Validate one invoice spec dict (n is its 0-based position, for messages).
+    return: (customer_name, customer_address, items as LineItems, tax_rate)
+    raises ValueError
+    """
+    if not isinstance(spec, dict):
+        raise ValueError(f"Invoice #{n + 1}: expected an object.")
+    name = str(spec.get("customer_name") or "").strip()
+    address = str(spec.get("customer_address") or "").strip()
+    items = spec.get("items") or []
+    if not name or not address or not items:
+        raise ValueError(f"Invoice #{n + 1}: missing customer info or items.")
+    if not isinstance(items, (list, LineItems)):
+        raise ValueError(f"Invoice #{n + 1}: items must be a list.")
+    try:
+        items = LineItems.coerce(items)
+    except ValueError as e:
+        raise ValueError(f"Invoice #{n + 1}: {e}.")
+    try:
+        tax_rate = to_tax_rate(spec.get("tax_rate"))
+    except ValueError:
+        raise ValueError(f"Invoice #{n + 1}: invalid tax_rate.")
+    return name, address, items, tax_rate
+
+
+# Per-process InvoiceRenderer of render_many() pool workers, set up once by _render_worker_init.
+_WORKER_ENGINE = None
+
+
+def _render_worker_init(engine):
+    global _WORKER_ENGINE
+    warm_up(engine.watermark_path)
+    _WORKER_ENGINE = engine
+
+
+def _render_one(job):
+    n, name, address, items, tax_rate = job
+    return n, _WORKER_ENGINE.render(name, address, items, tax_rate)
+
+
+def _render_pdf(name, address, items, tax_rate):
+    return _WORKER_ENGINE.render(name, address, items, tax_rate)
+
+
+def render_many(specs, workers=None, watermark_path=None, ordered=False, max_pending=None, renderer="table"):
+    """
+    Render invoice specs in parallel on a pool of warm worker processes.
+    specs: iterable of dicts as for generate_invoices_batch (consumed lazily)
+    workers: process count (default: os.cpu_count()); 1 renders in this process
+    ordered: False -> yield as invoices finish; True -> yield in input order
+    max_pending: cap on invoices in flight (default 4 per worker) to bound memory
+    renderer: "table", "fast" or an InvoiceRenderer (then watermark_path is ignored)
+    yields: (index, pdf_bytes), index being the position in specs
+    """
+    workers = workers or os.cpu_count() or 1
+    engine = _engine(renderer, watermark_path)
+    jobs = ((n,) + invoice_spec_fields(n, spec) for n, spec in enumerate(specs))
+    if workers == 1:
+        # in this process: render with engine directly, leaving _WORKER_ENGINE to the pool workers
+        warm_up(engine.watermark_path)
+        for n, name, address, items, tax_rate in jobs:
+            yield n, engine.render(name, address, items, tax_rate)
+        return
+
+    max_pending = max_pending or workers * 4
+    next_index = 0
+    done_heap = []  # finished results waiting for their turn when ordered
+    with ProcessPoolExecutor(max_workers=workers, initializer=_render_worker_init,
+                             initargs=(engine,)) as pool:
+        pending = set()
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) + len(done_heap) < max_pending:
+                job = next(jobs, None)
+                if job is None:
+                    exhausted = True
+                else:
+                    pending.add(pool.submit(_render_one, job))
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                result = fut.result()
+                if not ordered:
+                    yield result
+                    continue
+                heapq.heappush(done_heap, result)
+            while done_heap and done_heap[0][0] == next_index:
+                yield heapq.heappop(done_heap)
+                next_index += 1
+
+
+class RenderPoolFull(Exception):
+    """RenderPool.submit while max_pending renders are already queued or running."""
+
+
+class RenderPool:
+    """
+    Warm worker processes for one render at a time from request handlers
+    (render_many is for batches). At most max_pending renders may be queued or
+    running; submit() refuses more instead of letting the queue grow.
+    When a worker process dies (OOM kill, crash) the executor is broken for good:
+    its renders fail with BrokenProcessPool and the next submit starts a new one.
+    renderer: "table", "fast" or an InvoiceRenderer (then watermark_path is ignored)
+    """
+
+    def __init__(self, workers=None, max_pending=None, watermark_path=None, renderer="table"):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 4
+        self.engine = _engine(renderer, watermark_path)
+        self.pending = 0
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def start(self):
+        """Start the workers now (they warm up right away) instead of on the first submit."""
+        self._executor()
+        return self
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_render_worker_init,
+                                                 initargs=(self.engine,))
+                # the first task makes the executor start its processes
+                self._pool.submit(os.getpid)
+            return self._pool
+
+    def submit(self, customer_name, customer_address, items, tax_rate=0.0):
+        """
+        return: concurrent.futures.Future of the PDF bytes
+        raises RenderPoolFull when at max_pending, BrokenProcessPool when a new
+        executor breaks straight away too
+        """
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise RenderPoolFull(f"{self.pending} renders already pending")
+            self.pending += 1
+        try:
+            for attempt in (1, 2):
+                pool = self._executor()
+                try:
+                    fut = pool.submit(_render_pdf, customer_name, customer_address, items, tax_rate)
+                    break
+                except BrokenProcessPool:
+                    self._discard(pool)
+                    if attempt == 2:
+                        raise
+        except BaseException:
+            self._done(None)
+            raise
+        fut.add_done_callback(lambda fut: self._done(fut, pool))
+        return fut
+
+    def _done(self, fut, pool=None):
+        with self._lock:
+            self.pending -= 1
+        if fut is not None and not fut.cancelled() and isinstance(fut.exception(), BrokenProcessPool):
+            self._discard(pool)
+
+    def _discard(self, pool):
+        """Drop a broken executor, so the next submit builds a new one."""
+        with self._lock:
+            if self._pool is not pool:
+                return  # already replaced
+            self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    # python -m invoice_core: the headless batch renderer. It lives in invoice_cli, which
+    # imports this module by name, so pool workers and pickled renderers never refer to __main__.
+    import sys
+    from invoice_cli import main
+    sys.exit(main())
@@ -0,0 +1,130 @@
+# invoice_descriptions.py
+# Item descriptions used so far, for the desktop autocomplete: ranked by how often
+# (then how recently) each was used, with the last unit price entered for it.
+# Lookups run against an in-memory sorted key list; every use is written through
+# to SQLite as a single upsert, so nothing is ever rewritten in bulk.
+import bisect
+import heapq
+import json
+import sqlite3
+import time
+
+SUGGESTIONS = 20
+# substring matches are only looked for once the text is this long
+MIN_SUBSTRING = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS descriptions (
+    key TEXT PRIMARY KEY,
+    description TEXT NOT NULL,
+    uses INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    last_price REAL
+);
+"""
+
+_UPSERT = """
+INSERT INTO descriptions (key, description, uses, last_used, last_price) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET description = excluded.description, uses = descriptions.uses + excluded.uses,
+    last_used = excluded.last_used, last_price = coalesce(excluded.last_price, descriptions.last_price)
+"""
+
+
+def _key(text):
+    return " ".join(str(text).split()).casefold()
+
+
+class DescriptionIndex:
+    """
+    record(description, price) after an item is added; suggest(text) -> descriptions
+    for the dropdown, best first; last_price(description) -> float or None.
+    Not thread-safe: meant for the Tk main thread.
+    """
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self.entries = {}  # key -> [description as last typed, last_price]
+        self.ranks = {}    # key -> (uses, last_used), larger is better
+        for key, desc, uses, last_used, price in self._db.execute(
+                "SELECT key, description, uses, last_used, last_price FROM descriptions"):
+            self.entries[key] = [desc, price]
+            self.ranks[key] = (uses, last_used)
+        self.keys = sorted(self.entries)
+        self._top = None  # suggest("") result keys, kept up to date by record()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def close(self):
+        self._db.close()
+
+    def record(self, description, price=None, uses=1):
+        key = _key(description)
+        if not key:
+            return
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = [description, None]
+            bisect.insort(self.keys, key)
+        entry[0] = description
+        if price is not None:
+            entry[1] = price
+        self.ranks[key] = (self.ranks.get(key, (0, 0))[0] + uses, now)
+        if self._top is not None:
+            # only this key's rank went up, so the top list just needs it merged in
+            self._top = heapq.nlargest(SUGGESTIONS, set(self._top) | {key}, key=self.ranks.__getitem__)
+        self._db.execute(_UPSERT, (key, description, uses, now, price))
+
+    def import_json(self, path):
+        """
+        Merge a desc_history.json list (the old format) in one transaction.
+        return: number of descriptions that were new
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            history = json.load(f)
+        now = time.time()
+        rows = []
+        for description in history:
+            key = _key(description)
+            if key and key not in self.entries:
+                self.entries[key] = [str(description), None]
+                self.ranks[key] = (1, now)
+                rows.append((key, str(description), 1, now, None))
+        if rows:
+            self.keys = sorted(self.entries)
+            self._top = None
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(_UPSERT, rows)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def suggest(self, text="", limit=SUGGESTIONS):
+        """
+        Descriptions starting with text, most used first; if that gives fewer than
+        limit, descriptions containing text follow. Case and spacing are ignored.
+        """
+        key = _key(text)
+        rank = self.ranks.__getitem__
+        if not key and limit == SUGGESTIONS:
+            if self._top is None:
+                self._top = heapq.nlargest(SUGGESTIONS, self.keys, key=rank)
+            best = self._top
+        else:
+            lo = bisect.bisect_left(self.keys, key)
+            hi = bisect.bisect_left(self.keys, key + "\U0010ffff", lo)
+            best = heapq.nlargest(limit, self.keys[lo:hi], key=rank)
+        if len(best) < limit and len(key) >= MIN_SUBSTRING:
+            inside = [k for k in self.keys if key in k and not k.startswith(key)]
+            best = best + heapq.nlargest(limit - len(best), inside, key=rank)
+        return [self.entries[k][0] for k in best]
+
+    def last_price(self, description):
+        entry = self.entries.get(_key(description))
+        return entry[1] if entry is not None else None
@@ -0,0 +1,185 @@
+# invoice_items.py
+# Line items as they travel from the parsers to the totals and the renderers.
+# Quantities and prices are validated and converted once, when an item is added:
+# a quantity is an int (or a Decimal when fractional), a price is int cents.
+#
+#   LineItem   one item, a __slots__ record
+#   LineItems  a whole invoice's items as columns: descriptions in a list,
+#              quantities and prices in array('q') instead of a dict per row
+from array import array
+
+from invoice_totals import compute_totals, format_cents, to_cents, to_quantity
+
+# Largest quantity, price and line total (in cents, $10 trillion) an item may have. Well
+# inside array('q'), so thousands of such lines still sum to a total that fits the store's
+# INTEGER columns, and nothing overflows later instead of failing validation here.
+MAX_AMOUNT = 10 ** 15
+
+
+def check_range(qty, price):
+    """qty as from to_quantity, price in int cents; raises ValueError past MAX_AMOUNT."""
+    if abs(qty) > MAX_AMOUNT:
+        raise ValueError(f"Quantity out of range: {qty}")
+    if abs(price) > MAX_AMOUNT:
+        raise ValueError(f"Unit price out of range: {format_cents(price)}")
+    if abs(qty * price) > MAX_AMOUNT:
+        raise ValueError(f"Line total out of range: {qty} x {format_cents(price)}")
+
+
+class LineItem:
+    """desc: str; qty: int or Decimal; price: int cents. Build with LineItem.parse to validate."""
+
+    __slots__ = ("desc", "qty", "price")
+
+    def __init__(self, desc, qty, price):
+        self.desc = desc
+        self.qty = qty
+        self.price = price
+
+    @classmethod
+    def parse(cls, desc, qty, price):
+        """Raw values (price in dollars, any of int/float/str/Decimal) -> LineItem; raises ValueError."""
+        item = cls(str(desc), to_quantity(qty), to_cents(price))
+        check_range(item.qty, item.price)
+        return item
+
+    @classmethod
+    def from_dict(cls, item):
+        """{"desc", "qty", "price"} -> LineItem; other keys (e.g. a stale "total") are ignored."""
+        if not isinstance(item, dict) or "desc" not in item or "qty" not in item or "price" not in item:
+            raise ValueError("expected an object with desc, qty and price")
+        return cls.parse(item["desc"], item["qty"], item["price"])
+
+    def as_dict(self):
+        """JSON-friendly dict with the price back in dollars."""
+        qty = self.qty if type(self.qty) is int else float(self.qty)
+        return {"desc": self.desc, "qty": qty, "price": self.price / 100}
+
+    def __repr__(self):
+        return f"LineItem({self.desc!r}, {self.qty!r}, {self.price!r})"
+
+    def __eq__(self, other):
+        if not isinstance(other, LineItem):
+            return NotImplemented
+        return (self.desc, self.qty, self.price) == (other.desc, other.qty, other.price)
+
+
+class LineItems:
+    """
+    Sequence of LineItem, stored column-wise: descs (list of str), qtys
+    (array('q') while every quantity is whole, else a list), prices (array('q')
+    of cents). Indexing and iteration hand out LineItem records; the renderers
+    read the columns directly.
+    items: iterable of dicts, LineItem, (desc, qty, price) tuples or another LineItems
+    raises ValueError naming the first bad item (1-based)
+    """
+
+    __slots__ = ("descs", "qtys", "prices")
+
+    def __init__(self, items=()):
+        if isinstance(items, LineItems):
+            self.descs = list(items.descs)
+            self.qtys = items.qtys[:]
+            self.prices = items.prices[:]
+            return
+        self.descs = []
+        self.qtys = array('q')
+        self.prices = array('q')
+        self.extend(items)
+
+    @classmethod
+    def coerce(cls, items):
+        """items itself when it already is a LineItems, else LineItems(items)."""
+        return items if isinstance(items, cls) else cls(items)
+
+    @staticmethod
+    def _item(value):
+        if isinstance(value, dict):
+            return LineItem.from_dict(value)
+        if isinstance(value, LineItem):
+            # built directly, or changed after parse: check it like a parsed one
+            check_range(value.qty, value.price)
+            return value
+        if isinstance(value, (tuple, list)) and len(value) == 3:
+            return LineItem.parse(*value)
+        raise ValueError("expected an object with desc, qty and price")
+
+    def _set_qty(self, index, qty):
+        if type(qty) is not int and isinstance(self.qtys, array):
+            self.qtys = list(self.qtys)
+        if index is None:
+            self.qtys.append(qty)
+        else:
+            self.qtys[index] = qty
+
+    def append(self, desc, qty, price):
+        """Add one item from raw values (price in dollars); raises ValueError."""
+        self.add(LineItem.parse(desc, qty, price))
+
+    def add(self, item):
+        """Add a LineItem (already validated, e.g. from LineItem.parse)."""
+        if type(item.qty) is int or type(self.qtys) is list:
+            self.qtys.append(item.qty)
+        else:
+            self._set_qty(None, item.qty)
+        self.descs.append(item.desc)
+        self.prices.append(item.price)
+
+    def extend(self, items):
+        for n, value in enumerate(items, len(self.descs) + 1):
+            try:
+                item = self._item(value)
+            except ValueError as e:
+                raise ValueError(f"item {n}: {e}")
+            self.add(item)
+
+    def __len__(self):
+        return len(self.descs)
+
+    def __bool__(self):
+        return bool(self.descs)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            part = LineItems()
+            part.descs = self.descs[index]
+            part.qtys = self.qtys[index]
+            part.prices = self.prices[index]
+            return part
+        return LineItem(self.descs[index], self.qtys[index], self.prices[index])
+
+    def __setitem__(self, index, value):
+        item = self._item(value)
+        self._set_qty(index, item.qty)
+        self.descs[index] = item.desc
+        self.prices[index] = item.price
+
+    def __delitem__(self, index):
+        del self.descs[index]
+        del self.qtys[index]
+        del self.prices[index]
+
+    def __iter__(self):
+        return map(LineItem, self.descs, self.qtys, self.prices)
+
+    def __eq__(self, other):
+        if not isinstance(other, LineItems):
+            return NotImplemented
+        return (self.descs, list(self.qtys), self.prices) == (other.descs, list(other.qtys), other.prices)
+
+    def __repr__(self):
+        return f"<LineItems: {len(self)} items>"
+
+    def clear(self):
+        self.descs = []
+        self.qtys = array('q')
+        self.prices = array('q')
+
+    def totals(self, tax_rate=0):
+        """invoice_totals.Totals for these items."""
+        return compute_totals(self.qtys, self.prices, tax_rate)
+
+    def to_dicts(self):
+        """[{"desc", "qty", "price"}] for JSON (prices in dollars)."""
+        return [item.as_dict() for item in self]
+
@@ -0,0 +1,213 @@
+# invoice_jobs.py
+# Background rendering jobs: specs are queued in SQLite, rendered by a small
+# pool of threads in each web worker, and the PDFs are kept on disk until expiry.
+# No broker: every gunicorn worker opens the same SQLite file, so any of them
+# can answer status/download requests and pick up queued work.
+#
+# A running job is leased to the process rendering it (owner: a token made once
+# per process, so a reused PID is never mistaken for it), and a heartbeat thread
+# keeps extending the lease. Jobs whose lease ran out, because their process died
+# or hung, are queued again by whichever worker polls next.
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+
+from invoice_core import InvoiceRenderer, invoice_spec_fields
+from invoice_store import DATA_DIR, create_private_file
+
+DEFAULT_DIR = os.environ.get("INVOICE_JOBS_DIR") or os.path.join(DATA_DIR, "jobs")
+DEFAULT_WORKERS = int(os.environ.get("INVOICE_JOB_WORKERS", "2"))
+JOB_TTL = 24 * 3600     # finished jobs (and their PDFs) are deleted after this many seconds
+POLL_INTERVAL = 0.5     # how often idle workers look for jobs queued by other processes
+LEASE = int(os.environ.get("INVOICE_JOB_LEASE", "30"))  # seconds a running job stays claimed without a heartbeat
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    customer_name TEXT NOT NULL,
+    spec TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    owner TEXT,
+    lease REAL,
+    pages_done INTEGER NOT NULL DEFAULT 0,
+    pages_total INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created);
+"""
+
+
+class JobQueue:
+    """
+    submit(spec) -> job id; status(id) -> dict or None; pdf_path(id) -> path of a finished PDF.
+    Worker threads start lazily on the first submit in each process.
+    renderer: InvoiceRenderer to render with (default layout with watermark_path if None)
+    """
+
+    def __init__(self, directory=DEFAULT_DIR, workers=DEFAULT_WORKERS, watermark_path=None, renderer=None):
+        self.directory = directory
+        self.workers = workers
+        self.renderer = renderer or InvoiceRenderer(watermark_path=watermark_path)
+        self.db_path = os.path.join(directory, "jobs.sqlite3")
+        create_private_file(self.db_path)
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        with self._db() as db:
+            db.executescript(_SCHEMA)
+            if "lease" not in [row["name"] for row in db.execute("PRAGMA table_info(jobs)")]:
+                db.execute("ALTER TABLE jobs ADD COLUMN lease REAL")  # queue files from before leases
+
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    @contextmanager
+    def _db(self):
+        db = self._connect()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def _pdf_path(self, job_id):
+        return os.path.join(self.directory, job_id + ".pdf")
+
+    def submit(self, spec):
+        """Validate and queue one invoice spec. raises ValueError for bad specs."""
+        name, address, items, tax_rate = invoice_spec_fields(0, spec)
+        job_id = uuid.uuid4().hex
+        clean = {"customer_name": name, "customer_address": address, "items": items.to_dicts(), "tax_rate": tax_rate}
+        with self._db() as db:
+            db.execute("INSERT INTO jobs (id, status, customer_name, spec, rows, created) VALUES (?, ?, ?, ?, ?, ?)",
+                       (job_id, QUEUED, name, json.dumps(clean), len(items), time.time()))
+        self._expire()
+        self.start()
+        self._wake.set()
+        return job_id
+
+    def status(self, job_id):
+        with self._db() as db:
+            row = db.execute("SELECT id, status, customer_name, rows, created, started, finished, pages_done, pages_total, error "
+                             "FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def pdf_path(self, job_id):
+        path = self._pdf_path(job_id)
+        return path if os.path.exists(path) else None
+
+    def start(self):
+        with self._lock:
+            if self._threads and self._threads[0].is_alive():
+                return
+            # none yet, or started before a fork: this process needs its own
+            self._threads = [threading.Thread(target=self._heartbeat, name="invoice-job-lease", daemon=True)]
+            self._threads += [threading.Thread(target=self._work, name=f"invoice-job-{n}", daemon=True)
+                              for n in range(self.workers)]
+            for t in self._threads:
+                t.start()
+
+    def _heartbeat(self):
+        # extend the leases of this process's running jobs, however long a render takes
+        db = self._connect()
+        while True:
+            time.sleep(LEASE / 3)
+            try:
+                db.execute("UPDATE jobs SET lease = ? WHERE status = ? AND owner = ?",
+                           (time.time() + LEASE, RUNNING, _owner()))
+            except sqlite3.Error:
+                traceback.print_exc()
+
+    def _claim(self, db):
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            # jobs whose process died or hung (no heartbeat) go back to the queue
+            db.execute("UPDATE jobs SET status = ?, owner = NULL, lease = NULL, pages_done = 0 "
+                       "WHERE status = ? AND (lease IS NULL OR lease < ?)", (QUEUED, RUNNING, now))
+            row = db.execute("SELECT id, spec FROM jobs WHERE status = ? ORDER BY created LIMIT 1",
+                             (QUEUED,)).fetchone()
+            if row is not None:
+                db.execute("UPDATE jobs SET status = ?, started = ?, owner = ?, lease = ? WHERE id = ?",
+                           (RUNNING, now, _owner(), now + LEASE, row["id"]))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return row
+
+    def _work(self):
+        db = self._connect()
+        while True:
+            try:
+                row = self._claim(db)
+            except sqlite3.Error:
+                traceback.print_exc()
+                row = None
+            if row is None:
+                self._wake.wait(POLL_INTERVAL)
+                self._wake.clear()
+                continue
+            self._run(db, row["id"], json.loads(row["spec"]))
+
+    def _run(self, db, job_id, spec):
+        # every update checks the owner: after a lost lease the job may be another process's now
+        owner = _owner()
+
+        def progress(done, total):
+            db.execute("UPDATE jobs SET pages_done = ?, pages_total = ? WHERE id = ? AND owner = ?",
+                       (done, total, job_id, owner))
+
+        path = self._pdf_path(job_id)
+        tmp = f"{path}.{owner}.tmp"
+        try:
+            with open(tmp, "wb") as out:
+                self.renderer.render(spec["customer_name"], spec["customer_address"], spec["items"],
+                                     spec["tax_rate"], out=out, progress=progress)
+            os.replace(tmp, path)
+            db.execute("UPDATE jobs SET status = ?, finished = ? WHERE id = ? AND owner = ?",
+                       (DONE, time.time(), job_id, owner))
+        except Exception as e:
+            traceback.print_exc()
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            db.execute("UPDATE jobs SET status = ?, finished = ?, error = ? WHERE id = ? AND owner = ?",
+                       (FAILED, time.time(), str(e) or e.__class__.__name__, job_id, owner))
+
+    def _expire(self):
+        cutoff = time.time() - JOB_TTL
+        with self._db() as db:
+            old = [r["id"] for r in db.execute("SELECT id FROM jobs WHERE finished < ?", (cutoff,)).fetchall()]
+            for job_id in old:
+                try:
+                    os.unlink(self._pdf_path(job_id))
+                except OSError:
+                    pass
+            db.executemany("DELETE FROM jobs WHERE id = ?", [(j,) for j in old])
+
+
+_OWNER = (None, None)  # (pid, token) of this process
+
+
+def _owner():
+    """Token naming this process as a job's owner; a new one after a fork, never reused like a PID."""
+    global _OWNER
+    pid = os.getpid()
+    if _OWNER[0] != pid:
+        _OWNER = (pid, f"{pid}-{uuid.uuid4().hex}")
+    return _OWNER[1]
@@ -0,0 +1,146 @@
+# invoice_metrics.py
+# Per-stage render timings plus a tiny in-process Prometheus registry.
+# Metrics are per process: with several gunicorn workers each one reports its own.
+import json
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# stage names in pipeline order; anything else is reported after these
+STAGES = ("parse", "cache", "totals", "pagination", "watermark", "table", "serialize", "send")
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class StageTimer:
+    """
+    Collects how long each stage of one request/render took, plus counts
+    (rows, pages). Repeated stages (e.g. per page) and counts accumulate.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counts = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t0)
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count(self, name, value):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def ordered(self):
+        known = [(s, self.stages[s]) for s in STAGES if s in self.stages]
+        return known + [(s, d) for s, d in self.stages.items() if s not in STAGES]
+
+    def server_timing(self):
+        """Server-Timing header value, durations in ms."""
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.ordered()]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.2f}")
+        return ", ".join(parts)
+
+    def log_line(self, event, **fields):
+        record = {"event": event}
+        record.update(fields)
+        record["stages_ms"] = {name: round(seconds * 1000, 3) for name, seconds in self.ordered()}
+        record.update(self.counts)
+        record["total_ms"] = round((time.perf_counter() - self.started) * 1000, 3)
+        return json.dumps(record, sort_keys=False)
+
+
+class _NullTimer:
+    """Stand-in when no one is measuring, so the render code needs no branches."""
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def add(self, name, seconds):
+        pass
+
+    def count(self, name, value):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage_seconds = {}    # stage -> Histogram
+        self.request_seconds = {}  # (endpoint, status) -> Histogram
+        self.totals = {}           # counter name -> value
+
+    def observe(self, endpoint, status, seconds, timer=None):
+        with self._lock:
+            self.request_seconds.setdefault((endpoint, str(status)), Histogram()).observe(seconds)
+            if timer is not None:
+                for name, stage_seconds in timer.stages.items():
+                    self.stage_seconds.setdefault(name, Histogram()).observe(stage_seconds)
+                for name in ("rows", "pages"):
+                    if name in timer.counts:
+                        key = f"invoice_{name}_rendered_total"
+                        self.totals[key] = self.totals.get(key, 0) + timer.counts[name]
+
+    def render(self):
+        """Prometheus text exposition format."""
+        out = []
+        with self._lock:
+            out.append("# HELP invoice_request_seconds Request latency by endpoint and status.")
+            out.append("# TYPE invoice_request_seconds histogram")
+            for (endpoint, status), h in sorted(self.request_seconds.items()):
+                labels = f'endpoint="{_label(endpoint)}",status="{_label(status)}"'
+                _render_histogram(out, "invoice_request_seconds", labels, h)
+            out.append("# HELP invoice_stage_seconds Time spent per invoice generation stage.")
+            out.append("# TYPE invoice_stage_seconds histogram")
+            for stage, h in sorted(self.stage_seconds.items()):
+                _render_histogram(out, "invoice_stage_seconds", f'stage="{_label(stage)}"', h)
+            for name, value in sorted(self.totals.items()):
+                out.append(f"# TYPE {name} counter")
+                out.append(f"{name} {value}")
+        return "\n".join(out) + "\n"
+
+
+def _label(value):
+    # label values are quoted strings in the exposition format
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _render_histogram(out, name, labels, h):
+    cumulative = 0
+    for le, n in zip(BUCKETS, h.buckets):
+        cumulative += n
+        out.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+    out.append(f'{name}_bucket{{{labels},le="+Inf"}} {h.count}')
+    out.append(f"{name}_sum{{{labels}}} {h.sum:.6f}")
+    out.append(f"{name}_count{{{labels}}} {h.count}")
+
+
+METRICS = Metrics()
+
+
+def log(line):
+    # one JSON object per line on stderr, which ends up in the Render logs
+    print(line, file=sys.stderr, flush=True)
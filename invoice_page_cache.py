@@ -0,0 +1,62 @@
+# invoice_page_cache.py
+# Finished pieces of rendered pages, so re-rendering an edited invoice only redraws
+# the pages whose rows changed. InvoiceRenderer stores two kinds of entries here:
+#
+#   "table:<digest>"   the content-stream code that drew one page's table, keyed by
+#                      everything that draws it (rows, page plan, layout, font names)
+#   "stream:<digest>"  a whole page's compressed content stream, keyed by the page code
+#
+# Keys are content hashes, so entries never go stale; the cache is per process and
+# bounded in bytes, least recently used entries go first.
+import os
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = int(os.environ.get("INVOICE_PAGE_CACHE_MB", "32")) * 1024 * 1024
+
+
+class PageCache:
+    """get(key) -> value or None; put(key, value) with value a str or bytes."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> value, oldest first
+        self._bytes = 0
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = value
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# The cache shared by every InvoiceRenderer of this process.
+PAGE_CACHE = PageCache()
@@ -0,0 +1,68 @@
+# invoice_pagination.py
+from collections import namedtuple
+from reportlab.lib.pagesizes import letter, landscape
+
+# One page of an invoice table.
+#   number:      0-based page index
+#   start, stop: range of body rows on this page (items[start:stop])
+#   first_page:  page carries the company/customer header
+#   with_totals: totals rows follow the body rows on this page
+#   y_start:     top of the table area
+#   table_y:     bottom-left y passed to drawOn / draw_table_fast
+PagePlan = namedtuple("PagePlan", "number start stop first_page with_totals y_start table_y")
+
+PAGE_HEIGHT = landscape(letter)[1]
+ROW_HEIGHT = 24
+FIRST_PAGE_TOP = 120   # first page: table starts below the header block
+OTHER_PAGE_TOP = 10    # later pages: table starts higher
+BOTTOM_MARGIN = 20
+
+
+def rows_per_page(first_page, page_height=PAGE_HEIGHT, row_height=ROW_HEIGHT,
+                  first_page_top=FIRST_PAGE_TOP, other_page_top=OTHER_PAGE_TOP, bottom_margin=BOTTOM_MARGIN):
+    """Table rows (header row included) that fit on a page."""
+    y_start = page_height - (first_page_top if first_page else other_page_top)
+    return int((y_start - bottom_margin) / row_height)
+
+
+def plan_pages(n_rows, totals_rows=3, page_height=PAGE_HEIGHT, row_height=ROW_HEIGHT,
+               first_page_top=FIRST_PAGE_TOP, other_page_top=OTHER_PAGE_TOP, bottom_margin=BOTTOM_MARGIN):
+    """
+    Split n_rows body rows into pages in one pass.
+    Every page repeats the header row; the totals_rows go on the last page,
+    which always keeps at least one body row (unless there are none at all).
+    return: list of PagePlan
+    """
+    y_first = page_height - first_page_top
+    y_other = page_height - other_page_top
+    # 1 row for the header on every page
+    avail_first = int((y_first - bottom_margin) / row_height) - 1
+    avail_other = int((y_other - bottom_margin) / row_height) - 1
+    if avail_other < totals_rows + 1 or avail_first < 1:
+        raise ValueError("Page too small for the invoice table.")
+
+    plans = []
+    i = 0
+    while True:
+        first = not plans
+        y_start = y_first if first else y_other
+        avail = avail_first if first else avail_other
+        remaining = n_rows - i
+        if remaining <= avail - totals_rows:
+            rows = 1 + remaining + totals_rows
+            plans.append(PagePlan(len(plans), i, n_rows, first, True, y_start, y_start - row_height * rows))
+            return plans
+        # totals don't fit: fill the page, but carry at least one row over to the totals page
+        take = avail if remaining > avail else remaining - 1
+        if take > 0:
+            rows = 1 + take
+            plans.append(PagePlan(len(plans), i, i + take, first, False, y_start, y_start - row_height * rows))
+            i += take
+        elif first:
+            # header block leaves no room for a single row plus totals; start on the next page
+            plans.append(PagePlan(0, 0, 0, True, False, y_start, y_start - row_height))
+
+
+def page_count(n_rows, totals_rows=3, **geometry):
+    """Number of pages an invoice with n_rows items renders to, without rendering it."""
+    return len(plan_pages(n_rows, totals_rows, **geometry))
@@ -0,0 +1,108 @@
+# invoice_parser.py
+# Streaming reader for the TXT invoice format shared by the web upload and the desktop loader:
+#
+#   Customer Name: John Doe
+#   Customer Address: 123 Main St
+#   Items:
+#   Item A, 2, 10.5
+#   Item B, 1, 99
+from collections import namedtuple
+
+from invoice_items import LineItem, LineItems, check_range
+from invoice_totals import to_cents
+
+# line_no is 1-based, text is the offending line (stripped)
+ParseError = namedtuple("ParseError", "line_no message text")
+
+
+def decode_line(raw):
+    # robust decode, per line so one bad byte does not change how the rest of the file reads
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("latin-1", errors="ignore")
+
+
+def parse_item_line(line):
+    """'desc, qty, price' -> LineItem; raises ValueError with a readable message."""
+    parts = [p.strip() for p in line.split(",")]
+    if len(parts) != 3:
+        raise ValueError("expected 'description, quantity, unit price'")
+    desc, qty, price = parts
+    if not desc:
+        raise ValueError("empty description")
+    try:
+        qty = int(qty)
+    except ValueError:
+        raise ValueError(f"invalid quantity {qty!r}")
+    try:
+        price = to_cents(price)
+    except ValueError:
+        raise ValueError(f"invalid unit price {price!r}")
+    check_range(qty, price)
+    return LineItem(desc, qty, price)
+
+
+class TxtInvoiceReader:
+    """
+    Iterate over a binary stream one line at a time, yielding LineItem records.
+    customer_name / customer_address are filled in as their lines are read
+    (they come before Items: in practice); malformed item lines are collected
+    in errors instead of being dropped silently.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.customer_name = ""
+        self.customer_address = ""
+        self.errors = []
+
+    def __iter__(self):
+        items_section = False
+        for line_no, raw in enumerate(self.stream, 1):
+            line = decode_line(raw).strip() if isinstance(raw, bytes) else raw.strip()
+            if not line:
+                continue
+            if line.startswith("Customer Name:"):
+                self.customer_name = line.replace("Customer Name:", "").strip()
+            elif line.startswith("Customer Address:"):
+                self.customer_address = line.replace("Customer Address:", "").strip()
+            elif line.startswith("Items:"):
+                items_section = True
+            elif items_section:
+                try:
+                    yield parse_item_line(line)
+                except ValueError as e:
+                    self.errors.append(ParseError(line_no, str(e), line))
+
+
+def read_txt_invoice(stream):
+    """return: (customer_name, customer_address, items as LineItems, errors)"""
+    reader = TxtInvoiceReader(stream)
+    items = LineItems(reader)
+    return reader.customer_name, reader.customer_address, items, reader.errors
+
+
+def read_item_lines(lines):
+    """
+    Just the item lines ('desc, qty, price' per line, blank lines skipped),
+    e.g. the CSV box of the web form.
+    return: (items as LineItems, errors)
+    """
+    items, errors = LineItems(), []
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            items.add(parse_item_line(line))
+        except ValueError as e:
+            errors.append(ParseError(line_no, str(e), line))
+    return items, errors
+
+
+def format_errors(errors, limit=10):
+    lines = [f"line {e.line_no}: {e.message}: {e.text}" for e in errors[:limit]]
+    if len(errors) > limit:
+        lines.append(f"... and {len(errors) - limit} more")
+    return "\n".join(lines)
@@ -0,0 +1,98 @@
+# invoice_preview.py
+# Text of the desktop invoice preview, kept one formatted line per item with a
+# running subtotal, so an edit re-formats one row instead of the whole invoice.
+#
+#   INVOICE / Customer / Address / blank / Items: / column header / rule   (HEADER_LINES)
+#   one line per item
+#   rule / Subtotal / Tax / Grand Total                                     (FOOTER_LINES)
+from invoice_totals import format_cents, line_total_cents, tax_cents
+
+HEADER_LINES = 7
+FOOTER_LINES = 4
+RULE = "-" * 60
+ROW_FORMAT = "{:<20} {:<10} {:<12} {:<10}"
+
+
+def item_cells(item):
+    """
+    item: invoice_items.LineItem
+    return: ((description, quantity, unit price, total) as shown, line total in cents)
+    """
+    line_total = line_total_cents(item.qty, item.price)
+    return (item.desc, str(item.qty), f"{item.price / 100:.2f}", f"{line_total / 100:.2f}"), line_total
+
+
+def format_row(item):
+    """
+    item: invoice_items.LineItem
+    return: (preview line without newline, line total in cents)
+    """
+    cells, line_total = item_cells(item)
+    return ROW_FORMAT.format(*cells), line_total
+
+
+class InvoicePreview:
+    """
+    rows[i] is the preview line of item i, line_totals[i] its total in cents.
+    Every change is also recorded in ops, ("insert"|"update", index, line) or
+    ("delete", index, None), so a view can replay just those edits; take_ops()
+    hands them over. reset() records a single ("reset", None, None).
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.line_totals = []
+        self.subtotal = 0
+        self.ops = []
+
+    def reset(self, items):
+        rows, line_totals = [], []
+        for item in items:
+            line, cents = format_row(item)
+            rows.append(line)
+            line_totals.append(cents)
+        self.rows, self.line_totals, self.subtotal = rows, line_totals, sum(line_totals)
+        self.ops = [("reset", None, None)]
+
+    def insert(self, index, item):
+        line, cents = format_row(item)
+        self.rows.insert(index, line)
+        self.line_totals.insert(index, cents)
+        self.subtotal += cents
+        self.ops.append(("insert", index, line))
+
+    def append(self, item):
+        self.insert(len(self.rows), item)
+
+    def update(self, index, item):
+        line, cents = format_row(item)
+        self.subtotal += cents - self.line_totals[index]
+        self.rows[index] = line
+        self.line_totals[index] = cents
+        self.ops.append(("update", index, line))
+
+    def delete(self, index):
+        del self.rows[index]
+        self.subtotal -= self.line_totals.pop(index)
+        self.ops.append(("delete", index, None))
+
+    def take_ops(self):
+        ops, self.ops = self.ops, []
+        return ops
+
+    @staticmethod
+    def header_lines(customer_name, customer_address):
+        return ["INVOICE", f"Customer: {customer_name}", f"Address: {customer_address}", "", "Items:",
+                ROW_FORMAT.format('Description', 'Quantity', 'Unit Price', 'Total'), RULE]
+
+    def footer_lines(self, tax_rate=0, tax_label=None):
+        """tax_label: the rate as the user typed it, shown in the Tax line."""
+        tax = tax_cents(self.subtotal, tax_rate)
+        return [RULE,
+                f"Subtotal: {format_cents(self.subtotal)}",
+                f"Tax ({tax_rate if tax_label is None else tax_label}%): {format_cents(tax)}",
+                f"Grand Total: {format_cents(self.subtotal + tax)}"]
+
+    def text(self, customer_name, customer_address, tax_rate=0, tax_label=None):
+        lines = self.header_lines(customer_name, customer_address) + self.rows + self.footer_lines(tax_rate, tax_label)
+        return "\n".join(lines) + "\n"
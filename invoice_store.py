@@ -0,0 +1,289 @@
+# invoice_store.py
+# Saved invoices in one SQLite file, indexed for listing and search by customer,
+# address, date and total. Used by the desktop client (Save For Later / Load
+# Invoice) and the web app (/invoices). Older desktop saves, one
+# InProgress_*_Invoice.json file per invoice, can be pulled in with:
+#
+#   python invoice_store.py import C:\Invoices [--db invoices.sqlite3]
+#   python invoice_store.py search smith
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from invoice_items import LineItems
+from invoice_totals import to_tax_rate
+
+# application data next to the app, not the temp dir: tmp cleaners would delete saved invoices
+DATA_DIR = os.environ.get("INVOICE_DATA_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DEFAULT_PATH = os.environ.get("INVOICE_STORE_PATH") or os.path.join(DATA_DIR, "invoices.sqlite3")
+IMPORT_PATTERN = "InProgress_*_Invoice.json"
+PAGE_SIZE = 50
+
+# name_key/address_key are casefolded copies: prefix search becomes an index range scan
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices (
+    id INTEGER PRIMARY KEY,
+    customer_name TEXT NOT NULL,
+    customer_address TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    address_key TEXT NOT NULL,
+    tax_rate REAL NOT NULL,
+    item_count INTEGER NOT NULL,
+    subtotal INTEGER NOT NULL,
+    tax INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    items TEXT NOT NULL,
+    source TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS invoices_name ON invoices (name_key, created);
+CREATE INDEX IF NOT EXISTS invoices_address ON invoices (address_key, created);
+CREATE INDEX IF NOT EXISTS invoices_created ON invoices (created);
+CREATE INDEX IF NOT EXISTS invoices_total ON invoices (total);
+"""
+
+# columns of a search result; items are only loaded by get()
+SUMMARY_COLUMNS = ("id", "customer_name", "customer_address", "tax_rate", "item_count",
+                   "subtotal", "tax", "total", "created", "updated")
+ORDERS = {"created": "created", "updated": "updated", "total": "total", "customer": "name_key"}
+
+
+def _key(text):
+    return " ".join(str(text).split()).casefold()
+
+
+def _prefix_range(column, prefix, where, params):
+    # column >= prefix AND column < prefix + U+10FFFF, which SQLite answers from the index
+    where.append(f"{column} >= ? AND {column} < ?")
+    params += [prefix, prefix + "\U0010ffff"]
+
+
+def invoice_row(customer_name, customer_address, items, tax_rate=0.0, created=None, source=None):
+    """
+    Validate one invoice and compute what gets stored alongside it.
+    items: LineItems or a list of item dicts
+    return: dict of column values (without id)
+    raises ValueError for items that would not render
+    """
+    if not isinstance(items, (list, LineItems)):
+        raise ValueError("items must be a list.")
+    items = LineItems.coerce(items)
+    tax_rate = to_tax_rate(tax_rate)
+    totals = items.totals(tax_rate)
+    now = time.time()
+    return {
+        "customer_name": str(customer_name or ""),
+        "customer_address": str(customer_address or ""),
+        "name_key": _key(customer_name or ""),
+        "address_key": _key(customer_address or ""),
+        "tax_rate": tax_rate,
+        "item_count": len(items),
+        "subtotal": totals.subtotal,
+        "tax": totals.tax,
+        "total": totals.grand_total,
+        "created": now if created is None else created,
+        "updated": now,
+        "items": json.dumps(items.to_dicts(), ensure_ascii=False, separators=(",", ":")),
+        "source": source,
+    }
+
+
+_INSERT_COLUMNS = ("customer_name", "customer_address", "name_key", "address_key", "tax_rate", "item_count",
+                   "subtotal", "tax", "total", "created", "updated", "items", "source")
+_INSERT = "INSERT INTO invoices ({}) VALUES ({})".format(", ".join(_INSERT_COLUMNS),
+                                                         ", ".join("?" * len(_INSERT_COLUMNS)))
+# re-importing a file replaces what it imported last time
+_UPSERT = _INSERT + " ON CONFLICT (source) DO UPDATE SET {}".format(
+    ", ".join(f"{c} = excluded.{c}" for c in _INSERT_COLUMNS if c not in ("created", "source")))
+
+
+def create_private_file(path):
+    """
+    Create path (and its directory) readable by this user only, unless it exists.
+    SQLite gives its -wal and -shm files the database file's permissions.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), mode=0o700, exist_ok=True)
+    try:
+        os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+    except FileExistsError:
+        pass
+
+
+class InvoiceStore:
+    """
+    save(...) -> id; save_many(records) -> count; get(id) -> dict with items or None;
+    search(...) -> one page of summaries (amounts in cents, times as unix seconds);
+    count(...) -> matches for the same filters; delete(id).
+    A connection is opened per call, so one store can be shared between threads.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        create_private_file(path)
+        with self._db() as db:
+            db.executescript(_SCHEMA)
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    @contextmanager
+    def _db(self):
+        db = self._connect()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def save(self, customer_name, customer_address, items, tax_rate=0.0, invoice_id=None):
+        """Insert a new invoice, or replace invoice_id's contents (keeping its created time)."""
+        row = invoice_row(customer_name, customer_address, items, tax_rate)
+        with self._db() as db:
+            if invoice_id is not None:
+                updated = db.execute(
+                    "UPDATE invoices SET {} WHERE id = ?".format(
+                        ", ".join(f"{c} = ?" for c in _INSERT_COLUMNS if c not in ("created", "source"))),
+                    [row[c] for c in _INSERT_COLUMNS if c not in ("created", "source")] + [invoice_id])
+                if updated.rowcount:
+                    return invoice_id
+            return db.execute(_INSERT, [row[c] for c in _INSERT_COLUMNS]).lastrowid
+
+    def save_many(self, records):
+        """
+        Bulk insert in one transaction.
+        records: iterable of dicts as returned by invoice_row(); rows with a source
+                 already in the store replace it
+        return: number of rows written
+        """
+        with self._db() as db:
+            db.execute("BEGIN")
+            try:
+                n = db.executemany(_UPSERT, ([r[c] for c in _INSERT_COLUMNS] for r in records)).rowcount
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return n
+
+    def get(self, invoice_id):
+        with self._db() as db:
+            row = db.execute("SELECT {}, items FROM invoices WHERE id = ?".format(", ".join(SUMMARY_COLUMNS)),
+                             (invoice_id,)).fetchone()
+        if row is None:
+            return None
+        invoice = dict(row)
+        invoice["items"] = json.loads(invoice["items"])
+        return invoice
+
+    def delete(self, invoice_id):
+        with self._db() as db:
+            return db.execute("DELETE FROM invoices WHERE id = ?", (invoice_id,)).rowcount > 0
+
+    @staticmethod
+    def _where(text=None, customer=None, address=None, since=None, until=None, min_total=None, max_total=None):
+        """
+        text: prefix of the customer name or the address
+        customer / address: prefix of that field only
+        since / until: unix seconds, created in [since, until)
+        min_total / max_total: grand total in cents, inclusive
+        """
+        where, params = [], []
+        if text:
+            key = _key(text)
+            where.append("(name_key >= ? AND name_key < ? OR address_key >= ? AND address_key < ?)")
+            params += [key, key + "\U0010ffff"] * 2
+        if customer:
+            _prefix_range("name_key", _key(customer), where, params)
+        if address:
+            _prefix_range("address_key", _key(address), where, params)
+        if since is not None:
+            where.append("created >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("created < ?")
+            params.append(until)
+        if min_total is not None:
+            where.append("total >= ?")
+            params.append(min_total)
+        if max_total is not None:
+            where.append("total <= ?")
+            params.append(max_total)
+        return (" WHERE " + " AND ".join(where)) if where else "", params
+
+    def search(self, text=None, customer=None, address=None, since=None, until=None, min_total=None,
+               max_total=None, order="created", descending=True, limit=PAGE_SIZE, offset=0):
+        """
+        One page of invoice summaries, newest first by default; filters as for _where.
+        order: "created", "updated", "total" or "customer"
+        return: list of dicts with SUMMARY_COLUMNS
+        """
+        if order not in ORDERS:
+            raise ValueError(f"Unknown order: {order!r}")
+        where, params = self._where(text, customer, address, since, until, min_total, max_total)
+        sql = "SELECT {} FROM invoices{} ORDER BY {} {}, id {} LIMIT ? OFFSET ?".format(
+            ", ".join(SUMMARY_COLUMNS), where, ORDERS[order],
+            "DESC" if descending else "ASC", "DESC" if descending else "ASC")
+        with self._db() as db:
+            return [dict(r) for r in db.execute(sql, params + [int(limit), int(offset)])]
+
+    def count(self, text=None, customer=None, address=None, since=None, until=None, min_total=None, max_total=None):
+        where, params = self._where(text, customer, address, since, until, min_total, max_total)
+        with self._db() as db:
+            return db.execute("SELECT COUNT(*) FROM invoices" + where, params).fetchone()[0]
+
+    def import_json_files(self, directory, pattern=IMPORT_PATTERN):
+        """
+        Import desktop saves (customer_name, customer_address, items[, tax_rate]) from directory.
+        Each file is keyed by its path, so importing the same directory again updates
+        instead of duplicating; the file's mtime becomes the invoice date.
+        return: (imported, errors) with errors a list of (path, message)
+        """
+        records, errors = [], []
+        for path in sorted(glob.glob(os.path.join(directory, pattern))):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if not isinstance(data, dict):
+                    raise ValueError("expected an object")
+                records.append(invoice_row(data.get("customer_name"), data.get("customer_address"),
+                                           data.get("items") or [], data.get("tax_rate") or 0,
+                                           created=os.path.getmtime(path), source=os.path.abspath(path)))
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                errors.append((path, str(e)))
+        return self.save_many(records), errors
+
+
+def main():
+    ap = argparse.ArgumentParser(description="saved invoice store")
+    ap.add_argument("--db", default=DEFAULT_PATH, help="SQLite file (default: %(default)s)")
+    sub = ap.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help=f"import {IMPORT_PATTERN} files from a directory")
+    imp.add_argument("directory")
+    imp.add_argument("--pattern", default=IMPORT_PATTERN)
+    find = sub.add_parser("search", help="list invoices whose customer or address starts with text")
+    find.add_argument("text", nargs="?")
+    find.add_argument("--limit", type=int, default=PAGE_SIZE)
+    find.add_argument("--offset", type=int, default=0)
+    args = ap.parse_args()
+
+    store = InvoiceStore(args.db)
+    if args.command == "import":
+        imported, errors = store.import_json_files(args.directory, args.pattern)
+        for path, message in errors:
+            print(f"skipped {path}: {message}")
+        print(f"imported {imported} invoices into {args.db}")
+    else:
+        for inv in store.search(args.text, limit=args.limit, offset=args.offset):
+            date = time.strftime("%Y-%m-%d", time.localtime(inv["created"]))
+            print(f"{inv['id']:>6}  {date}  {inv['total'] / 100:>12.2f}  {inv['customer_name']}, {inv['customer_address']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# invoice_totals.py
+# Exact money math for invoices: amounts are integer cents, rounding is explicit.
+import math
+from array import array
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from functools import lru_cache
+from operator import mul
+
+# line_totals: array('q') of cents, one per item; the rest are int cents
+Totals = namedtuple("Totals", "line_totals subtotal tax grand_total")
+
+ROUNDING = ROUND_HALF_UP
+_CENTS = Decimal(100)
+
+
+def to_cents(value):
+    """
+    Money value (int, float, str or Decimal dollars) -> int cents, half-up.
+    Floats go through repr() so 10.05 means 10.05, not its binary approximation.
+    raises ValueError on anything that is not a number
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid amount: {value!r}")
+    if type(value) is int:
+        return value * 100
+    try:
+        return _to_cents(value)
+    except TypeError:
+        # unhashable
+        return _to_cents.__wrapped__(value)
+
+
+# Prices repeat a lot across line items and invoices, so conversions are memoised.
+@lru_cache(maxsize=65536, typed=True)
+def _to_cents(value):
+    text = repr(value) if isinstance(value, float) else str(value).strip()
+    try:
+        d = Decimal(text)
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"Invalid amount: {value!r}")
+    if not d.is_finite():
+        raise ValueError(f"Invalid amount: {value!r}")
+    return int((d * _CENTS).to_integral_value(rounding=ROUNDING))
+
+
+def to_quantity(value):
+    """Quantity -> int, or Decimal when it is fractional (e.g. 2.5 hours)."""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        # whole numbers are by far the common case in parsed text
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    try:
+        d = Decimal(repr(value) if isinstance(value, float) else str(value).strip())
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"Invalid quantity: {value!r}")
+    if not d.is_finite():
+        raise ValueError(f"Invalid quantity: {value!r}")
+    return int(d) if d == d.to_integral_value() else d
+
+
+def to_tax_rate(value):
+    """Tax rate in percent (number or str, empty for none) -> float; raises ValueError unless finite."""
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid tax rate: {value!r}")
+    try:
+        rate = float(value or 0)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid tax rate: {value!r}")
+    if not math.isfinite(rate):
+        raise ValueError(f"Invalid tax rate: {value!r}")
+    return rate
+
+
+def item_columns(items):
+    """
+    list of item dicts (desc, qty, price) -> (qtys, prices_cents) columns.
+    qtys is an array('q') when every quantity is whole, else a list.
+    """
+    qtys = [to_quantity(it['qty']) for it in items]
+    prices = array('q', map(to_cents, [it['price'] for it in items]))
+    if all(type(q) is int for q in qtys):
+        qtys = array('q', qtys)
+    return qtys, prices
+
+
+def line_total_cents(qty, price_cents):
+    """One line of compute_totals: qty from to_quantity, fractional results rounded half-up."""
+    if type(qty) is int:
+        return qty * price_cents
+    return int((qty * price_cents).to_integral_value(rounding=ROUNDING))
+
+
+def tax_cents(subtotal, tax_rate=0):
+    """subtotal: int cents; tax_rate: percent. return: tax in int cents, half-up."""
+    rate = Decimal(repr(tax_rate) if isinstance(tax_rate, float) else str(tax_rate))
+    return int((subtotal * rate / _CENTS).to_integral_value(rounding=ROUNDING))
+
+
+def compute_totals(qtys, prices_cents, tax_rate=0):
+    """
+    One batched pass over the columns.
+    qtys: ints (or Decimals for fractional quantities); prices_cents: ints
+    tax_rate: percent, e.g. 8.25
+    Line totals of fractional quantities and the tax are rounded half-up to the cent;
+    the subtotal is the exact sum of the rounded line totals.
+    return: Totals
+    """
+    if isinstance(qtys, array):
+        line_totals = array('q', map(mul, qtys, prices_cents))
+    else:
+        line_totals = array('q', map(line_total_cents, qtys, prices_cents))
+    subtotal = sum(line_totals)
+    tax = tax_cents(subtotal, tax_rate)
+    return Totals(line_totals, subtotal, tax, subtotal + tax)
+
+
+def totals_for_items(items, tax_rate=0):
+    """compute_totals for a list of item dicts."""
+    return compute_totals(*item_columns(items), tax_rate)
+
+
+def format_cents(cents, grouping=False):
+    """1234567 -> '$12345.67' (or '$12,345.67' with grouping); negatives as '$-5.00'."""
+    sign = "-" if cents < 0 else ""
+    dollars, rem = divmod(abs(cents), 100)
+    if grouping:
+        return f"${sign}{dollars:,}.{rem:02d}"
+    return f"${sign}{dollars}.{rem:02d}"
@@ -0,0 +1,16 @@
+# tests/conftest.py
+# The modules live at the repository root; the app's cache, job and store paths are
+# read from the environment at import time, so point them at a scratch directory first.
+import os
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+SCRATCH = tempfile.mkdtemp(prefix="invoice_tests_")
+os.environ.setdefault("INVOICE_CACHE_DIR", os.path.join(SCRATCH, "cache"))
+os.environ.setdefault("INVOICE_JOBS_DIR", os.path.join(SCRATCH, "jobs"))
+os.environ.setdefault("INVOICE_STORE_PATH", os.path.join(SCRATCH, "invoices.sqlite3"))
+
+WATERMARK = os.path.join(ROOT, "static", "watermark.png")
@@ -0,0 +1,62 @@
+import asyncio
+from urllib.parse import urlencode
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def asgi_app():
+    from asgi import InvoiceASGI
+    from app import app as flask_app, invoice_renderer
+    from invoice_core import RenderPool
+    pool = RenderPool(workers=1, max_pending=2, renderer=invoice_renderer)
+    app = InvoiceASGI(flask_app, pool, wsgi_threads=2)
+    yield app
+    pool.shutdown()
+    app.threads.shutdown()
+
+
+def post(app, path, body, content_type="application/x-www-form-urlencoded"):
+    """Run one request through the ASGI app. return: (status, headers dict, body bytes)"""
+    scope = {"type": "http", "method": "POST", "path": path, "query_string": b"", "http_version": "1.1",
+             "headers": [(b"content-type", content_type.encode("latin-1")),
+                         (b"content-length", str(len(body)).encode("latin-1"))]}
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = sent[0]
+    headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in start["headers"]}
+    return start["status"], headers, b"".join(m.get("body", b"") for m in sent[1:])
+
+
+def test_generate(asgi_app):
+    body = urlencode({"customer_name": "Asgi Test", "customer_address": "1 Main", "items_csv": "a, 1, 1"})
+    status, headers, pdf = post(asgi_app, "/generate", body.encode("utf-8"))
+    assert status == 200 and pdf.startswith(b"%PDF")
+    assert headers["content-length"] == str(len(pdf))
+    assert headers["content-disposition"] == \
+        "attachment; filename=\"Asgi_Test_Invoice.pdf\"; filename*=UTF-8''Asgi_Test_Invoice.pdf"
+
+
+def test_generate_filename_cannot_inject_headers(asgi_app):
+    body = urlencode({"customer_name": "Bob\r\nSet-Cookie: a=b/../x", "customer_address": "1 Main",
+                      "items_csv": "a, 1, 1"})
+    status, headers, _ = post(asgi_app, "/generate", body.encode("utf-8"))
+    assert status == 200
+    assert "set-cookie" not in headers
+    disposition = headers["content-disposition"]
+    assert "\r" not in disposition and "\n" not in disposition and "/" not in disposition
+    assert 'filename="BobSetCookie_abx_Invoice.pdf"' in disposition
+
+
+def test_generate_bad_input(asgi_app):
+    body = urlencode({"customer_name": "A", "customer_address": "1 Main", "items_csv": "a, 1, 1", "tax_rate": "nan"})
+    status, _, message = post(asgi_app, "/generate", body.encode("utf-8"))
+    assert status == 400 and message == b"Invalid tax rate."
@@ -0,0 +1,92 @@
+import io
+import os
+
+import pytest
+
+from invoice_bulk import BulkInvoiceReader, bulk_filename, detect_format, render_bulk
+
+HEADER = "invoice_id,customer_name,customer_address,tax_rate,desc,qty,price\n"
+
+
+def read(text, fmt="csv"):
+    reader = BulkInvoiceReader(io.BytesIO(text.encode("utf-8")), fmt)
+    return list(reader), reader
+
+
+def test_csv_groups_rows_by_invoice():
+    invoices, reader = read(HEADER + 'INV-1,John,"1 Main St, Springfield",8.25,A,2,175.00\n'
+                                     "INV-1,,,,B,3,120\n"
+                                     "INV-2,Jane,2 Elm St,,C,1,300\n")
+    assert [(i.invoice_id, i.line_no, len(i.items)) for i in invoices] == [("INV-1", 2, 2), ("INV-2", 4, 1)]
+    assert invoices[0].customer_address == "1 Main St, Springfield"
+    assert invoices[0].tax_rate == 8.25 and invoices[1].tax_rate == 0.0
+    assert not reader.errors and reader.skipped == 0
+
+
+def test_csv_bad_row_skips_whole_invoice():
+    invoices, reader = read(HEADER + "INV-1,John,1 Main,0,A,1,1\n"
+                                     "INV-1,,,,B,x,1\n"
+                                     "INV-1,,,,C,1,1\n"
+                                     "INV-2,Jane,2 Elm,0,D,1,1\n")
+    assert [i.invoice_id for i in invoices] == ["INV-2"]
+    assert [e.line_no for e in reader.errors] == [3]
+    assert reader.skipped == 1
+
+
+def test_csv_split_invoice_is_rejected():
+    invoices, reader = read(HEADER + "INV-1,John,1 Main,0,A,1,1\n"
+                                     "INV-2,Jane,2 Elm,0,B,1,1\n"
+                                     "INV-1,,,,C,1,1\n"
+                                     "INV-1,,,,D,1,1\n")
+    # INV-1 was yielded before its last rows turned up; the caller has to drop it
+    assert [i.invoice_id for i in invoices] == ["INV-1", "INV-2"]
+    assert reader.rejected == {"INV-1"}
+    assert [e.line_no for e in reader.errors] == [4]  # one error for the group of rows
+    assert reader.skipped == 1
+
+
+def test_csv_missing_column():
+    with pytest.raises(ValueError, match="price"):
+        read("invoice_id,desc,qty\nINV-1,A,1\n")
+
+
+def test_csv_invalid_tax_rate():
+    invoices, reader = read(HEADER + "INV-1,John,1 Main,nan,A,1,1\n")
+    assert invoices == [] and reader.skipped == 1
+
+
+def test_ndjson_duplicate_id_keeps_the_first():
+    line = ('{"invoice_id": "A", "customer_name": "%s", "customer_address": "x",'
+            ' "items": [{"desc": "d", "qty": 1, "price": 1}]}\n')
+    invoices, reader = read(line % "First" + "not json\n" + line % "Second", "ndjson")
+    assert [i.customer_name for i in invoices] == ["First"]
+    assert [e.line_no for e in reader.errors] == [2, 3]
+    assert reader.skipped == 2
+    assert not reader.rejected
+
+
+def test_detect_format():
+    assert detect_format("x.CSV") == "csv"
+    assert detect_format("x.jsonl") == "ndjson"
+    with pytest.raises(ValueError):
+        detect_format("x.txt")
+
+
+def test_bulk_filename():
+    assert bulk_filename("INV-1") == "INV-1.pdf"
+    assert bulk_filename("../A/1") == "_A_1.pdf"
+
+
+def test_render_bulk_drops_split_invoice_and_name_collisions(tmp_path):
+    src = tmp_path / "in.csv"
+    src.write_text(HEADER + "INV-1,John,1 Main,0,A,1,1\n"
+                            "INV-2,Jane,2 Elm,0,B,1,1\n"
+                            "INV-1,,,,C,1,1\n"
+                            "A/1,X,1 St,0,D,1,1\n"
+                            "A_1,Y,2 St,0,E,1,1\n")
+    out = tmp_path / "out"
+    written, reader = render_bulk(str(src), str(out), renderer="fast")
+    assert written == 2
+    assert sorted(os.listdir(out)) == ["A_1.pdf", "INV-2.pdf"]
+    assert [e.line_no for e in reader.errors] == [4, 6]
+    assert reader.skipped == 2
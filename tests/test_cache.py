@@ -0,0 +1,64 @@
+import os
+from io import BytesIO
+
+import pytest
+
+from invoice_cache import PdfCache, invoice_cache_key
+
+ITEMS = [{"desc": "Base Cabinet", "qty": 2, "price": 175}]
+
+
+def test_key_is_canonical():
+    key = invoice_cache_key("Jane", "1 Main", ITEMS, 8.25)
+    assert key == invoice_cache_key("Jane", "1 Main", [{"desc": "Base Cabinet", "qty": "2", "price": "175.00"}], 8.25)
+    assert key != invoice_cache_key("Jane", "1 Main", ITEMS, 8.0)
+    assert key != invoice_cache_key("Jane", "1 Main", ITEMS, 8.25, renderer="fast")
+
+
+def test_memory_only_eviction():
+    cache = PdfCache(directory=None, max_memory_bytes=10, max_memory_item=10)
+    for key in "abc":
+        cache.store(key, BytesIO(b"1234"))
+    assert cache.open("a") is None           # least recently used goes first
+    assert cache.open("c").read() == b"1234"
+    cache.store("big", BytesIO(b"x" * 11))  # over max_memory_item: not kept
+    assert cache.open("big") is None
+
+
+def test_disk_store_and_eviction(tmp_path):
+    cache = PdfCache(directory=str(tmp_path), max_disk_bytes=25, max_memory_bytes=0, max_memory_item=0)
+    with cache.store("a", BytesIO(b"x" * 10)) as f:
+        assert f.read() == b"x" * 10
+    os.utime(tmp_path / "a.pdf", (1, 1))  # oldest
+    cache.store("b", BytesIO(b"y" * 10)).close()
+    cache.store("c", BytesIO(b"z" * 10)).close()
+    assert sorted(os.listdir(tmp_path)) == ["b.pdf", "c.pdf"]
+    assert cache.open("a") is None
+    with cache.open("b") as f:
+        assert f.read() == b"y" * 10
+
+
+@pytest.fixture
+def client():
+    from app import app
+    return app.test_client()
+
+
+def test_generate_etag_and_304(client):
+    form = {"customer_name": "Etag Test", "customer_address": "1 Main", "items_csv": "a, 1, 1"}
+    first = client.post("/generate", data=form)
+    assert first.status_code == 200 and first.data.startswith(b"%PDF")
+    etag = first.headers["ETag"].strip('"')
+    first.close()
+
+    again = client.post("/generate", data=form)
+    assert again.headers["ETag"].strip('"') == etag and again.data.startswith(b"%PDF")
+    again.close()
+
+    cached = client.post("/generate", data=form, headers={"If-None-Match": f'"{etag}"'})
+    assert cached.status_code == 304 and cached.data == b""
+    cached.close()
+
+    changed = client.post("/generate", data=dict(form, items_csv="a, 2, 1"), headers={"If-None-Match": f'"{etag}"'})
+    assert changed.status_code == 200
+    changed.close()
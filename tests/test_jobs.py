@@ -0,0 +1,87 @@
+import json
+import sqlite3
+import time
+
+import pytest
+
+import invoice_jobs
+from invoice_core import InvoiceRenderer
+from invoice_jobs import DONE, RUNNING, JobQueue
+
+SPEC = {"customer_name": "Job Test", "customer_address": "1 Main St",
+        "items": [{"desc": "Base Cabinet", "qty": 2, "price": 175.0}], "tax_rate": 8.25}
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(directory=str(tmp_path), workers=1, renderer=InvoiceRenderer(renderer="fast"))
+
+
+def wait_for(queue, job_id, status=DONE, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.status(job_id)
+        if job["status"] == status:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} is {queue.status(job_id)['status']}, expected {status}")
+
+
+def insert_running(queue, job_id, owner, lease):
+    with queue._db() as db:
+        db.execute("INSERT INTO jobs (id, status, customer_name, spec, rows, created, started, owner, lease) "
+                   "VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?)",
+                   (job_id, RUNNING, SPEC["customer_name"], json.dumps(SPEC), time.time(), time.time(), owner, lease))
+
+
+def test_submit_renders(queue):
+    job_id = queue.submit(SPEC)
+    job = wait_for(queue, job_id)
+    assert job["pages_done"] == job["pages_total"] == 1
+    with open(queue.pdf_path(job_id), "rb") as f:
+        assert f.read(5) == b"%PDF-"
+
+
+def test_submit_rejects_bad_spec(queue):
+    with pytest.raises(ValueError):
+        queue.submit(dict(SPEC, tax_rate="inf"))
+
+
+def test_expired_lease_is_requeued_on_poll(queue):
+    # a job claimed by a process that died: its lease is over, whatever its owner token says
+    insert_running(queue, "dead", f"{invoice_jobs.os.getpid()}-gone", time.time() - 1)
+    insert_running(queue, "alive", "other-process", time.time() + 3600)
+    queue.start()
+    wait_for(queue, "dead")
+    assert queue.status("alive")["status"] == RUNNING
+
+
+def test_jobs_from_before_leases_are_requeued(queue):
+    # owner was a bare PID (here our own, as after a restart in a container) and there is no lease
+    insert_running(queue, "old", invoice_jobs.os.getpid(), None)
+    queue.start()
+    wait_for(queue, "old")
+
+
+def test_lost_lease_does_not_overwrite_the_new_owner(queue):
+    insert_running(queue, "taken", "other-process", time.time() + 3600)
+    with queue._db() as db:
+        queue._run(db, "taken", SPEC)  # finishes, but the job is no longer ours
+    assert queue.status("taken")["status"] == RUNNING
+
+
+def test_owner_token_is_per_process():
+    token = invoice_jobs._owner()
+    assert token == invoice_jobs._owner()
+    assert token.startswith(f"{invoice_jobs.os.getpid()}-") and not token.isdigit()
+
+
+def test_queue_file_without_lease_column_is_upgraded(tmp_path):
+    db = sqlite3.connect(str(tmp_path / "jobs.sqlite3"))
+    db.execute("CREATE TABLE jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, customer_name TEXT NOT NULL, "
+               "spec TEXT NOT NULL, rows INTEGER NOT NULL, created REAL NOT NULL, started REAL, finished REAL, "
+               "owner INTEGER, pages_done INTEGER NOT NULL DEFAULT 0, pages_total INTEGER NOT NULL DEFAULT 0, "
+               "error TEXT)")
+    db.close()
+    queue = JobQueue(directory=str(tmp_path), workers=1, renderer=InvoiceRenderer(renderer="fast"))
+    wait_for(queue, queue.submit(SPEC))
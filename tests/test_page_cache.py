@@ -0,0 +1,61 @@
+import pytest
+from reportlab import rl_config
+
+from conftest import WATERMARK
+from invoice_core import PROFILES, RENDERERS, InvoiceRenderer
+from invoice_page_cache import PAGE_CACHE, PageCache
+
+
+def make_items(n):
+    return [{"desc": f"Item {i}", "qty": i % 7 + 1, "price": round(0.05 + (i % 400) * 1.37, 2)} for i in range(n)]
+
+
+@pytest.fixture
+def invariant():
+    # no timestamps or document ids, so PDFs can be compared byte for byte
+    old = rl_config.invariant
+    rl_config.invariant = 1
+    PAGE_CACHE.clear()
+    yield
+    rl_config.invariant = old
+    PAGE_CACHE.clear()
+
+
+@pytest.mark.parametrize("renderer", RENDERERS)
+@pytest.mark.parametrize("profile", PROFILES)
+def test_cached_render_is_identical(invariant, profile, renderer):
+    items = make_items(120)
+    plain = InvoiceRenderer(watermark_path=WATERMARK, renderer=renderer, profile=profile)
+    cached = InvoiceRenderer(watermark_path=WATERMARK, renderer=renderer, profile=profile, cache_pages=True)
+    cached.render("Cache Test", "1 Main St", items, 8.25)  # fills the cache
+    for edit in (False, True):
+        if edit:
+            items[30]["qty"] += 1  # every other page still comes from the cache
+        expected = plain.render("Cache Test", "1 Main St", items, 8.25)
+        assert expected.startswith(b"%PDF-1.4")
+        assert cached.render("Cache Test", "1 Main St", items, 8.25) == expected
+
+
+def test_profiles_do_not_share_table_entries(invariant):
+    items = make_items(60)
+
+    def tables():
+        return sum(key.startswith("table:") for key in list(PAGE_CACHE._entries))
+
+    engines = [InvoiceRenderer(watermark_path=WATERMARK, profile=profile, cache_pages=True) for profile in PROFILES]
+    engines[0].render("Cache Test", "1 Main St", items)
+    per_profile = tables()
+    engines[1].render("Cache Test", "1 Main St", items)
+    assert per_profile > 0 and tables() == 2 * per_profile
+
+
+def test_page_cache_lru_bound():
+    cache = PageCache(max_bytes=10)
+    cache.put("a", b"1234")
+    cache.put("b", "1234")
+    cache.get("a")
+    cache.put("c", b"1234")  # over budget: b is the least recently used
+    assert cache.get("b") is None and cache.get("a") == b"1234" and cache.get("c") == b"1234"
+    cache.put("big", b"x" * 11)
+    assert cache.get("big") is None
+    assert (cache.hits, cache.misses) == (3, 2)
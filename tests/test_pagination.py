@@ -0,0 +1,74 @@
+import pytest
+
+from invoice_pagination import page_count, plan_pages, rows_per_page
+
+# letter landscape: 18 body rows fit under the first page's header, 23 on later pages
+FIRST, OTHER, TOTALS = 18, 23, 3
+
+
+def assert_covers(plans, n_rows):
+    """Pages are numbered in order, take the rows contiguously, and only the last has the totals."""
+    assert [p.number for p in plans] == list(range(len(plans)))
+    assert plans[0].start == 0 and plans[-1].stop == n_rows
+    for prev, page in zip(plans, plans[1:]):
+        assert page.start == prev.stop
+    assert [p.with_totals for p in plans] == [False] * (len(plans) - 1) + [True]
+    assert [p.first_page for p in plans] == [True] + [False] * (len(plans) - 1)
+
+
+def test_rows_per_page():
+    assert rows_per_page(True) == FIRST + 1    # header row included
+    assert rows_per_page(False) == OTHER + 1
+
+
+def test_no_rows():
+    plans = plan_pages(0)
+    assert len(plans) == 1
+    assert (plans[0].start, plans[0].stop, plans[0].with_totals) == (0, 0, True)
+
+
+@pytest.mark.parametrize("n_rows", [1, FIRST - TOTALS])
+def test_one_page(n_rows):
+    plans = plan_pages(n_rows)
+    assert len(plans) == 1
+    assert_covers(plans, n_rows)
+
+
+def test_totals_do_not_fit_carry_one_row_over():
+    n_rows = FIRST - TOTALS + 1
+    plans = plan_pages(n_rows)
+    assert [(p.start, p.stop) for p in plans] == [(0, n_rows - 1), (n_rows - 1, n_rows)]
+    assert_covers(plans, n_rows)
+
+
+def test_full_first_page():
+    n_rows = FIRST + 1
+    plans = plan_pages(n_rows)
+    assert [(p.start, p.stop) for p in plans] == [(0, FIRST), (FIRST, n_rows)]
+
+
+@pytest.mark.parametrize("n_rows", [50, 1000, 2300])
+def test_many_pages(n_rows):
+    plans = plan_pages(n_rows)
+    assert_covers(plans, n_rows)
+    assert all(p.stop - p.start <= (FIRST if p.first_page else OTHER) for p in plans)
+    assert plans[-1].stop - plans[-1].start >= 1
+    assert page_count(n_rows) == len(plans)
+
+
+def test_table_y_matches_row_count():
+    for p in plan_pages(100):
+        rows = 1 + (p.stop - p.start) + (TOTALS if p.with_totals else 0)
+        assert p.table_y == p.y_start - 24 * rows
+
+
+def test_header_leaves_no_room_on_first_page():
+    # a first page with room for one row only: the totals page still needs a row, so page 0 is empty
+    plans = plan_pages(1, first_page_top=544)
+    assert [(p.start, p.stop) for p in plans] == [(0, 0), (0, 1)]
+    assert_covers(plans, 1)
+
+
+def test_page_too_small():
+    with pytest.raises(ValueError):
+        plan_pages(10, page_height=100)
@@ -0,0 +1,71 @@
+from io import BytesIO
+
+import pytest
+
+from invoice_items import MAX_AMOUNT, LineItem, LineItems
+from invoice_parser import format_errors, parse_item_line, read_item_lines, read_txt_invoice
+
+TXT = b"""Customer Name: Jane Doe
+Customer Address: 123 Main St, Springfield
+Items:
+Base Cabinet, 2, 175.00
+
+Wall Cabinet, x, 120
+Sink Base
+Countertop, 1, 1e30
+Pantry, 1, 400
+"""
+
+
+def test_parse_item_line():
+    assert parse_item_line("Base Cabinet, 2, 10.5") == LineItem("Base Cabinet", 2, 1050)
+
+
+@pytest.mark.parametrize("line, message", [
+    ("a, 1", "expected 'description, quantity, unit price'"),
+    (", 1, 2", "empty description"),
+    ("a, two, 2", "invalid quantity 'two'"),
+    ("a, 2, $5", "invalid unit price '$5'"),
+    ("a, 1, 1e30", "Unit price out of range"),
+    (f"a, {MAX_AMOUNT}, 2", "Line total out of range"),
+])
+def test_parse_item_line_errors(line, message):
+    with pytest.raises(ValueError, match=message.replace("$", r"\$")):
+        parse_item_line(line)
+
+
+def test_read_txt_invoice_reports_bad_lines_with_numbers():
+    name, address, items, errors = read_txt_invoice(BytesIO(TXT))
+    assert (name, address) == ("Jane Doe", "123 Main St, Springfield")
+    assert [it.desc for it in items] == ["Base Cabinet", "Pantry"]
+    assert [(e.line_no, e.text) for e in errors] == [(6, "Wall Cabinet, x, 120"), (7, "Sink Base"),
+                                                     (8, "Countertop, 1, 1e30")]
+    report = format_errors(errors, limit=2)
+    assert report.splitlines() == ["line 6: invalid quantity 'x': Wall Cabinet, x, 120",
+                                   "line 7: expected 'description, quantity, unit price': Sink Base",
+                                   "... and 1 more"]
+
+
+def test_read_txt_invoice_bad_bytes():
+    name, _, items, errors = read_txt_invoice(BytesIO(b"Customer Name: Jos\xe9\nItems:\na, 1, 1\n"))
+    assert name == "Jos\xe9" and len(items) == 1 and not errors
+
+
+def test_read_item_lines():
+    items, errors = read_item_lines(["a, 1, 1", "", "b, 2"])
+    assert len(items) == 1
+    assert [(e.line_no, e.message) for e in errors] == [(3, "expected 'description, quantity, unit price'")]
+
+
+def test_line_items_reject_out_of_range():
+    with pytest.raises(ValueError, match="item 2"):
+        LineItems([{"desc": "a", "qty": 1, "price": 1}, {"desc": "b", "qty": 1, "price": 1e30}])
+
+
+def test_line_items_check_line_item_records():
+    items = LineItems([LineItem("a", 1, 100)])
+    with pytest.raises(ValueError, match="Quantity out of range"):
+        items[0] = LineItem("a", 10 ** 20, 100)
+    with pytest.raises(ValueError, match="Line total out of range"):
+        LineItems([LineItem("a", 10 ** 13, 100_000_000)])
+    assert items[0] == LineItem("a", 1, 100)
@@ -0,0 +1,25 @@
+import os
+import signal
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from invoice_core import RenderPool
+
+ITEMS = [{"desc": "a", "qty": 1, "price": 1}]
+
+
+def test_render_pool_recovers_from_dead_worker():
+    pool = RenderPool(workers=1, max_pending=2, renderer="fast").start()
+    try:
+        assert pool.submit("Pool Test", "1 Main", ITEMS).result(timeout=60).startswith(b"%PDF")
+        broken = pool._pool
+        for pid in list(broken._processes):
+            os.kill(pid, signal.SIGKILL)
+        with pytest.raises(BrokenProcessPool):
+            broken.submit(os.getpid).result(timeout=60)
+        # the dead executor is replaced on the next submit
+        assert pool.submit("Pool Test", "1 Main", ITEMS).result(timeout=60).startswith(b"%PDF")
+        assert pool._pool is not broken and pool.pending == 0
+    finally:
+        pool.shutdown()
@@ -0,0 +1,35 @@
+import os
+import stat
+
+import pytest
+
+import invoice_store
+from invoice_store import InvoiceStore
+
+ITEMS = [{"desc": "Base Cabinet", "qty": 2, "price": 175}, {"desc": "Sink Base", "qty": 1, "price": "190.50"}]
+
+
+@pytest.mark.skipif("INVOICE_DATA_DIR" in os.environ, reason="data directory overridden")
+def test_data_dir_is_next_to_the_app():
+    assert invoice_store.DATA_DIR == os.path.join(os.path.dirname(os.path.abspath(invoice_store.__file__)), "data")
+
+
+@pytest.mark.skipif(os.name != "posix", reason="POSIX permissions")
+def test_store_file_is_private(tmp_path):
+    path = tmp_path / "new" / "invoices.sqlite3"
+    InvoiceStore(str(path))
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(path.parent).st_mode) == 0o700
+
+
+def test_save_get_search(tmp_path):
+    store = InvoiceStore(str(tmp_path / "invoices.sqlite3"))
+    first = store.save("Jane Doe", "1 Main St", ITEMS, 8.25)
+    store.save("John Smith", "2 Elm St", ITEMS[:1])
+    invoice = store.get(first)
+    assert invoice["customer_name"] == "Jane Doe" and invoice["subtotal"] == 54050
+    assert invoice["total"] == 54050 + 4459  # 4459.125 rounds to the cent
+    assert [r["customer_name"] for r in store.search(text="jane")] == ["Jane Doe"]
+    assert store.count(min_total=40000) == 1
+    with pytest.raises(ValueError):
+        store.save("Bad", "x", ITEMS, "nan")
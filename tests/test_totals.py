@@ -0,0 +1,70 @@
+from decimal import Decimal
+
+import pytest
+
+from invoice_totals import compute_totals, format_cents, tax_cents, to_cents, to_quantity, to_tax_rate, \
+    totals_for_items
+
+
+@pytest.mark.parametrize("value, cents", [
+    (10, 1000),
+    (10.05, 1005),      # repr, not the binary approximation
+    ("10.50", 1050),
+    ("0.125", 13),      # half-up
+    ("0.124", 12),
+    ("-0.125", -13),    # half away from zero
+    (Decimal("1.005"), 101),
+])
+def test_to_cents(value, cents):
+    assert to_cents(value) == cents
+
+
+@pytest.mark.parametrize("value", ["abc", "", "nan", "inf", float("nan"), True, None])
+def test_to_cents_rejects(value):
+    with pytest.raises(ValueError):
+        to_cents(value)
+
+
+def test_to_quantity():
+    assert to_quantity("3") == 3
+    assert to_quantity(2.0) == 2
+    assert to_quantity("2.5") == Decimal("2.5")
+    for bad in ("x", "inf", True):
+        with pytest.raises(ValueError):
+            to_quantity(bad)
+
+
+def test_tax_cents_rounds_half_up():
+    assert tax_cents(1000, 8.25) == 83      # 82.5
+    assert tax_cents(1000, "8.24") == 82    # 82.4
+    assert tax_cents(1000, 0) == 0
+
+
+def test_compute_totals_rounds_fractional_lines():
+    totals = compute_totals([Decimal("0.5"), 3], [101, 250], 10)
+    assert list(totals.line_totals) == [51, 750]  # 50.5 rounds up
+    assert totals.subtotal == 801
+    assert totals.tax == 80
+    assert totals.grand_total == 881
+
+
+def test_totals_for_items():
+    totals = totals_for_items([{"desc": "a", "qty": 2, "price": "175.00"}, {"desc": "b", "qty": 3, "price": 120}],
+                              8.25)
+    assert (totals.subtotal, totals.tax, totals.grand_total) == (71000, 5858, 76858)
+
+
+def test_to_tax_rate():
+    assert to_tax_rate("8.25") == 8.25
+    assert to_tax_rate("") == 0.0
+    assert to_tax_rate(None) == 0.0
+    for bad in ("nan", "inf", "-inf", float("nan"), "abc", True):
+        with pytest.raises(ValueError):
+            to_tax_rate(bad)
+
+
+def test_format_cents():
+    assert format_cents(123456789) == "$1234567.89"
+    assert format_cents(123456789, grouping=True) == "$1,234,567.89"
+    assert format_cents(-500) == "$-5.00"
+    assert format_cents(7) == "$0.07"